@@ -0,0 +1,12 @@
+#!/bin/bash
+
+if [[ $# -lt 1 ]]; then
+  echo "usage: $0 config.yml[,config.yml...] [flags of benchmark_step_time.py]"
+  echo "e.g. $0 delta/config/han-cls-keras/han-cls.yml,delta/config/emotion-speech-cls/emotion-speech-cls.yml"
+  exit 1
+fi
+
+# step time with XLA and mixed precision on and off
+configs=$1
+shift
+python $(dirname $0)/benchmark_step_time.py --config $configs $@
@@ -0,0 +1,132 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+'''
+training step time of configs with XLA and mixed precision on and off
+
+  for each config and each variant of `solver.run_config`, builds the train
+  graph of the solver in a new graph, runs `warmup` steps, which include the
+  XLA compilation, then times `steps` steps. RawSolver (text) and
+  EstimatorSolver (speech) configs are supported.
+  prints a table of step time and speedup to the base variant.
+'''
+import time
+
+import numpy as np
+import tensorflow as tf
+from absl import app
+from absl import flags
+from absl import logging
+
+from delta import utils
+from delta.utils.register import registers
+from delta.utils.register import import_all_modules_for_register
+from delta.utils.solver.raw_solver import RawSolver
+from delta.utils.solver.estimator_solver import EstimatorSolver
+from delta.utils.solver.solver_utils import get_session_conf
+
+VARIANTS = {
+    'base': {},
+    'xla': {
+        'xla': True
+    },
+    'amp': {
+        'mixed_precision': True
+    },
+    'xla_amp': {
+        'xla': True,
+        'mixed_precision': True
+    },
+}
+
+flags.DEFINE_list('config', None, 'config paths')
+flags.DEFINE_list('variants', list(VARIANTS), 'variants to run')
+flags.DEFINE_integer('steps', 100, 'timed steps')
+flags.DEFINE_integer('warmup', 10, 'steps before timing')
+
+FLAGS = flags.FLAGS
+
+
+def build_train_graph(solver):
+  ''' (init ops, train op, loss) of the solver in the default graph '''
+  multitask = solver.config['solver']['optimizer']['multitask']
+  global_step = tf.train.get_or_create_global_step()
+  if isinstance(solver, RawSolver):
+    model = solver.build(utils.TRAIN)
+    loss = model.loss
+    train_op = solver.get_train_op(loss, multitask, global_step)
+    init_ops = [model.iterator.initializer]
+  elif isinstance(solver, EstimatorSolver):
+    dataset = solver.input_fn(utils.TRAIN)()
+    features, labels = dataset.make_one_shot_iterator().get_next()
+    spec = solver.model_fn()(features, labels, utils.TRAIN, None)
+    loss, train_op = spec.loss, spec.train_op
+    init_ops = []
+  else:
+    raise ValueError('Not support solver: {}'.format(type(solver).__name__))
+  init_ops = [tf.global_variables_initializer(),
+              tf.tables_initializer()] + init_ops
+  return init_ops, train_op, loss
+
+
+def step_times(config_path, variant, steps, warmup):
+  ''' seconds of each timed step of `config_path` with `variant` '''
+  config = utils.load_config(config_path)
+  config['solver']['run_config'].update(VARIANTS[variant])
+  with tf.Graph().as_default():
+    solver = registers.solver[config['solver']['name']](config)
+    init_ops, train_op, loss = build_train_graph(solver)
+    with tf.Session(config=get_session_conf(solver.config)) as sess:
+      sess.run(init_ops)
+      for _ in range(warmup):
+        sess.run(train_op)
+
+      times = np.zeros([steps])
+      for i in range(steps):
+        start = time.perf_counter()
+        _, out_loss = sess.run([train_op, loss])
+        times[i] = time.perf_counter() - start
+  logging.info('{} {}: last loss {:g}'.format(config_path, variant, out_loss))
+  return times
+
+
+def main(argv):
+  ''' benchmark all configs and variants '''
+  del argv
+  import_all_modules_for_register()
+
+  rows = []
+  for config_path in FLAGS.config:
+    base = None
+    for variant in FLAGS.variants:
+      times = step_times(config_path, variant, FLAGS.steps, FLAGS.warmup)
+      mean = times.mean()
+      base = base or mean
+      rows.append((config_path, variant, mean * 1000,
+                   np.median(times) * 1000, base / mean))
+
+  print('config\tvariant\tmean_ms\tmedian_ms\tspeedup')
+  for row in rows:
+    print('{}\t{}\t{:.2f}\t{:.2f}\t{:.2f}'.format(*row))
+
+
+if __name__ == '__main__':
+  logging.set_verbosity(logging.INFO)
+  flags.mark_flag_as_required('config')
+  flags.register_validator(
+      'variants',
+      lambda variants: set(variants) <= set(VARIANTS),
+      message='variants of {}'.format(list(VARIANTS)))
+  app.run(main)
@@ -0,0 +1,125 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+'''
+multi-worker training of a config with local processes on localhost
+
+  starts a chief, `num_workers - 1` workers, `num_ps` ps and optionally an
+  evaluator, each running `main.py --cmd train_and_eval` with its TF_CONFIG,
+  logs are written to `log_dir`/<type>-<index>.log.
+  the evaluator exits after the final export at `max_steps`, ps are stopped
+  after the other tasks are done. `solver.run_config.multi_worker.enable`
+  and `train_data_size` must be set.
+'''
+import os
+import sys
+import json
+import socket
+import subprocess
+
+from absl import app
+from absl import flags
+from absl import logging
+
+from delta import utils
+
+flags.DEFINE_string('config', None, 'config path')
+flags.DEFINE_integer('num_workers', 2, 'num of workers, including the chief')
+flags.DEFINE_integer('num_ps', 0, 'num of ps, for parameter_server strategy')
+flags.DEFINE_bool('evaluator', True, 'start an evaluator')
+flags.DEFINE_string('log_dir', 'exp/local_workers', 'dir of logs')
+
+FLAGS = flags.FLAGS
+
+
+def free_port():
+  ''' a free port of localhost '''
+  with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+    sock.bind(('localhost', 0))
+    return sock.getsockname()[1]
+
+
+def make_cluster(num_workers, num_ps, evaluator):
+  ''' cluster spec of local tasks '''
+  def _addresses(num):
+    return ['localhost:{}'.format(free_port()) for _ in range(num)]
+
+  cluster = {'chief': _addresses(1)}
+  if num_workers > 1:
+    cluster['worker'] = _addresses(num_workers - 1)
+  if num_ps:
+    cluster['ps'] = _addresses(num_ps)
+  if evaluator:
+    cluster['evaluator'] = _addresses(1)
+  return cluster
+
+
+def start_task(config_path, cluster, task_type, index, log_dir):
+  ''' start `main.py` of one task '''
+  tf_config = {'cluster': cluster, 'task': {'type': task_type, 'index': index}}
+  env = dict(os.environ, TF_CONFIG=json.dumps(tf_config))
+  main_path = os.path.join(os.path.dirname(__file__), os.pardir, 'main.py')
+  log_path = os.path.join(log_dir, '{}-{}.log'.format(task_type, index))
+  logging.info('start {}:{}, log: {}'.format(task_type, index, log_path))
+  with open(log_path, 'w') as log:
+    return subprocess.Popen(
+        [
+            sys.executable, main_path, '--config', config_path, '--cmd',
+            'train_and_eval'
+        ],
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT)
+
+
+def main(argv):
+  ''' start all tasks and wait for the training '''
+  del argv
+  config = utils.load_config(FLAGS.config)
+  multi_worker_conf = config['solver']['run_config'].get('multi_worker', {})
+  if not multi_worker_conf.get('enable', False):
+    raise ValueError('multi_worker not enabled in {}'.format(FLAGS.config))
+  if not multi_worker_conf.get('train_data_size'):
+    raise ValueError('multi_worker.train_data_size not set in {}'.format(
+        FLAGS.config))
+
+  os.makedirs(FLAGS.log_dir, exist_ok=True)
+  cluster = make_cluster(FLAGS.num_workers, FLAGS.num_ps, FLAGS.evaluator)
+  logging.info('cluster: {}'.format(cluster))
+  tasks = {(task_type, index):
+           start_task(FLAGS.config, cluster, task_type, index, FLAGS.log_dir)
+           for task_type, addresses in cluster.items()
+           for index in range(len(addresses))}
+
+  returncode = 0
+  for (task_type, index), proc in tasks.items():
+    if task_type != 'ps':
+      proc.wait()
+      logging.info('{}:{} exit {}'.format(task_type, index, proc.returncode))
+      returncode = returncode or proc.returncode
+
+  # ps serve forever
+  for (task_type, index), proc in tasks.items():
+    if task_type == 'ps':
+      proc.terminate()
+      proc.wait()
+      logging.info('{}:{} stopped'.format(task_type, index))
+  sys.exit(returncode)
+
+
+if __name__ == '__main__':
+  logging.set_verbosity(logging.INFO)
+  flags.mark_flag_as_required('config')
+  app.run(main)
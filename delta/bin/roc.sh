@@ -1,9 +1,11 @@
 #!/bin/bash
 
-if [[ $# != 1 ]]; then
-  echo "usage: $0 output/predict_score.txt"
+if [[ $# -lt 1 ]]; then
+  echo "usage: $0 output/predict_scores.txt [flags of roc_curve.py]"
   exit 1
 fi
 
-# score_file : `filename, .., score`
-python tools/roc_curve.py $1
+# score_file : `filename, clipid, label, score`
+score_file=$1
+shift
+python $(dirname $0)/roc_curve.py --score_file $score_file $@
@@ -13,127 +13,107 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ==============================================================================
-
-import sys
-import tensorflow as tf
-from sklearn import metrics
-
-import utils
-
-
-class tf_roc():
-
-  def __init__(self, predict_label_file, true_label_id, threshold_num,
-               save_dir):
-    '''
-        file format: dataid,predict_score,label
-        Args:
-          predict_score should be between [0, 1]
-          label should be {0 , 1}
-          threshold_num: number of threshold will plot
-        '''
-    self.threshold_num = threshold_num
-    self.true_label_id = true_label_id  # True exmaple label id, 0 or 1
-
-    self.trues = 0  #total of True labels
-    self.fpr = []  #false positive
-    self.tpr = []  #true positive
-    self.ths = []  #thresholds
-
-    self.save_dir = save_dir
-    self.writer = tf.summary.FileWriter(self.save_dir)
-
-    #load predict_label_file to predicts and labels
-    self.predicts = []
-    self.labels = []
-    self.total = 0
-    fd = open(predict_label_file)
-    fdl = fd.readline()
-    while len(fdl) > 0:
-      val = fdl.split(',')  # comma seperate
-      self.predicts.append(float(val[-1]))  # postive score
-      self.labels.append(
-          True if int(val[-2]) == self.true_label_id else False)  # True label
-      fdl = fd.readline()
-      self.total += 1
-    fd.close()
-
-  def roc_pr(self):
-    '''
-        tn, fp, fn, tp = metrics.confusion_matrix(self.labels, self.predicts)
-        fpr = tp / (fp + tn)
-        fnr = fn / (fn + tp)
-        utils.plot_det(fpr, fnr)
-        '''
-
-    # using True to replace POS exmaple
-    # ROC curve
-    self.fpr, self.tpr, self.ths = metrics.roc_curve(
-        y_true=self.labels, y_score=self.predicts, pos_label=1)
-    print('fpr', self.fpr)
-    print('tpr', self.tpr)
-    print('ths', self.ths)
-    self.auc = metrics.auc(self.fpr, self.tpr)
-    print('AUC', self.auc)
-
-    utils.plot_roc(
-        self.fpr, self.tpr, self.ths, self.auc, save_path='output/roc.png')
-
-    # PR-curve
-    self.precision, self.recall, thresholds = metrics.precision_recall_curve(
-        y_true=self.labels, probas_pred=self.predicts, pos_label=1)
-    print("precision len", len(self.precision))
-    print("recall len", len(self.recall))
-    print("thresholds len", len(thresholds))
-    utils.plot_pr(
-        self.precision, self.recall, thresholds, save_path='output/pr.png')
-
-  def calc(self):
-    for label in self.labels:
-      if label:
-        self.trues += 1
-    threshold_step = 1. / self.threshold_num
-    for t in range(self.threshold_num + 1):
-      th = 1 - threshold_step * t  # from high to low
-      tn, tp, fp, fpr, tpr = self._calc_once(th)
-      self.fpr.append(fpr)
-      self.tpr.append(tpr)
-      self.ths.append(th)
-      self._save(fpr, tpr)
-
-  def _save(self, fpr, tpr):
-    summt = tf.Summary()
-    summt.value.add(tag="roc", simple_value=tpr)
-    self.writer.add_summary(summt, fpr * 100)  #for tensorboard step drawable
-    self.writer.flush()
-
-  def _calc_once(self, t):
-    fp = 0
-    tp = 0
-    tn = 0
-
-    for i in range(self.total):
-      if not self.labels[i]:  # label False
-        if self.predicts[i] >= t:  # predict Postive
-          fp += 1
-        else:  # predict Negtive
-          tn += 1
-      elif self.predicts[i] >= t:  # label True
-        tp += 1  # predict Postive
-
-    print(tp, fp, tn)
-
-    tpr = tp / float(self.trues)
-    #fpr = fp / float(fp + tn) #precision
-    fpr = fp / float(fp + tp)  #detection
-    return tn, tp, fp, fpr, tpr
+'''
+ROC, PR and DET curves and EER of a score file
+
+  score file lines: `filepath, clipid, label, score[, score...]`,
+  one score column is the score of `pos_label`, otherwise one per class.
+  for each class writes under `output_dir`:
+    roc_<class>.tsv: curve table, at most `num_points` thresholds
+    metrics.txt: auc, average precision, eer of each class
+  and optionally TensorBoard summaries and plots.
+'''
+import os
+
+import numpy as np
+from absl import app
+from absl import flags
+from absl import logging
+
+from delta.utils.metrics import roc as roc_lib
+
+flags.DEFINE_string('score_file', None, 'score file of speech postprocess')
+flags.DEFINE_string('output_dir', 'output', 'dir of outputs')
+flags.DEFINE_integer('pos_label', 1, 'class of a single score column')
+flags.DEFINE_enum('file_agg', 'none', ['none', 'max', 'mean'],
+                  'aggregate clip scores of a file')
+flags.DEFINE_integer('num_points', 1000,
+                     'max thresholds written, 0 for all thresholds')
+flags.DEFINE_bool('tensorboard', False, 'write roc and pr as summaries')
+flags.DEFINE_bool('plot', False, 'plot roc and pr curves')
+
+FLAGS = flags.FLAGS
+
+
+def write_summaries(output_dir, name, table):
+  ''' roc and pr curves of a class as scalars, flushed once '''
+  # pylint: disable=import-outside-toplevel
+  import tensorflow as tf
+  writer = tf.summary.FileWriter(os.path.join(output_dir, name))
+  columns = {col: i for i, col in enumerate(roc_lib.CURVE_COLUMNS)}
+  for row in table:
+    # step of permille of fpr and recall, to be drawable on tensorboard
+    summ = tf.Summary()
+    summ.value.add(tag='roc', simple_value=row[columns['tpr']])
+    writer.add_summary(summ, int(row[columns['fpr']] * 1000))
+    summ = tf.Summary()
+    summ.value.add(tag='pr', simple_value=row[columns['precision']])
+    writer.add_summary(summ, int(row[columns['tpr']] * 1000))
+  writer.close()
+
+
+def main(_):
+  ''' main entrance '''
+  os.makedirs(FLAGS.output_dir, exist_ok=True)
+  with_files = FLAGS.file_agg != 'none'
+  data = roc_lib.load_scores(FLAGS.score_file, with_files=with_files)
+  labels, scores = data.labels, data.scores
+  logging.info('load {} scores of {}'.format(len(labels), FLAGS.score_file))
+  if with_files:
+    labels, scores = roc_lib.aggregate_files(
+        data.files, labels, scores, reduce=FLAGS.file_agg)
+    logging.info('aggregate to {} files by {}'.format(
+        len(labels), FLAGS.file_agg))
+
+  curves = roc_lib.class_curves(labels, scores, pos_label=FLAGS.pos_label)
+  with open(os.path.join(FLAGS.output_dir, 'metrics.txt'), 'w') as fout:
+    for class_id, result in curves.items():
+      for key, val in roc_lib.summary(result).items():
+        logging.info('class {} {}: {}'.format(class_id, key, val))
+        fout.write('class {} {}: {}\n'.format(class_id, key, val))
+
+      name = 'roc_{}'.format(class_id)
+      table = roc_lib.curve_table(roc_lib.downsample(result, FLAGS.num_points))
+      np.savetxt(
+          os.path.join(FLAGS.output_dir, name + '.tsv'),
+          table,
+          fmt='%.6g',
+          delimiter='\t',
+          header='\t'.join(roc_lib.CURVE_COLUMNS),
+          comments='')
+
+      if FLAGS.tensorboard:
+        write_summaries(FLAGS.output_dir, name, table)
+      if FLAGS.plot:
+        # pylint: disable=import-outside-toplevel
+        from delta.utils import plot
+        fpr, tpr, thresholds = roc_lib.roc(result)
+        plot.plot_roc(
+            fpr,
+            tpr,
+            np.minimum(thresholds, 1.0),
+            roc_lib.auc(result),
+            save_path=os.path.join(FLAGS.output_dir, name + '.png'))
+        precision, recall, thresholds = roc_lib.precision_recall(result)
+        plot.plot_pr(
+            precision,
+            recall,
+            thresholds,
+            save_path=os.path.join(FLAGS.output_dir,
+                                   'pr_{}.png'.format(class_id)))
 
 
 if __name__ == '__main__':
-  predict_label_file = sys.argv[1]
-  save_dir = 'ckpt'
-  true_label_id = 1
-  threshold_num = 20
-
-  roc = tf_roc(predict_label_file, true_label_id, int(threshold_num), save_dir)
-  roc.roc_pr()
+  logging.set_verbosity(logging.INFO)
+  flags.mark_flag_as_required('score_file')
+  app.run(main)
@@ -16,9 +16,19 @@
 ''' speech feature '''
 from delta.data.feat import speech_ops
 
+from .feat_archive import FeatArchive
+from .feat_archive import FeatArchiveWriter
+
+from .speech_feature import FeatureExtractor
+from .speech_feature import get_extractor
 from .speech_feature import load_wav
 from .speech_feature import extract_filterbank
 from .speech_feature import add_delta_delta
+from .speech_feature import extract_shard
+from .speech_feature import archive_pending
+from .speech_feature import archive_removed
+from .speech_feature import merge_shards
+from .speech_feature import feat_savepath
 
 # numpy
 from .speech_feature import extract_fbank
@@ -26,3 +36,4 @@ from .speech_feature import delta_delta
 from .speech_feature import fbank_feat
 from .speech_feature import powspec_feat
 from .speech_feature import extract_feat
+from .speech_feature import pyfeat
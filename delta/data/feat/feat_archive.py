@@ -0,0 +1,238 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+'''
+packed feature archive
+
+  <path>.data: features packed back to back, each aligned to 64 bytes
+  <path>.index: one line per utt, `key \t offset \t dtype \t shape`
+
+the index is written last, an archive without index is incomplete.
+features are appended to the data of an archive in place, those of replaced
+or dropped utts stay unreferenced until the archive is rewritten.
+'''
+import os
+import hashlib
+
+import numpy as np
+from absl import logging
+
+DATA_SUFFIX = '.data'
+INDEX_SUFFIX = '.index'
+_ALIGN = 64
+
+
+def archive_exists(path):
+  ''' whether a complete archive exists at `path` '''
+  return os.path.exists(path + INDEX_SUFFIX) and os.path.exists(path +
+                                                                DATA_SUFFIX)
+
+
+def archive_mtime(path):
+  ''' modify time of archive '''
+  return os.path.getmtime(path + INDEX_SUFFIX)
+
+
+def archive_part_path(path, keys):
+  ''' path of the part archive which holds `keys` '''
+  digest = hashlib.md5('\n'.join(keys).encode('utf-8')).hexdigest()
+  return '{}.part-{}'.format(path, digest)
+
+
+def remove_archive(path):
+  ''' remove data and index of archive '''
+  for suffix in (INDEX_SUFFIX, DATA_SUFFIX):
+    if os.path.exists(path + suffix):
+      os.remove(path + suffix)
+
+
+def _read_index(path):
+  ''' {key: (offset, dtype, shape)} of the index of archive `path` '''
+  index = {}
+  with open(path + INDEX_SUFFIX, 'r', encoding='utf-8') as fidx:
+    for line in fidx:
+      key, offset, dtype, shape = line.rstrip('\n').split('\t')
+      shape = tuple(int(dim) for dim in shape.split(',')) if shape else ()
+      index[key] = (int(offset), np.dtype(dtype), shape)
+  return index
+
+
+class FeatArchiveWriter:
+  '''
+  append features to data file, the index is written on close.
+  with `append`, features are appended to the data of the existing archive
+    in place, and its utts are kept unless written again or removed.
+  '''
+
+  def __init__(self, path, append=False):
+    self._path = path
+    self._tmp = '.{}.tmp'.format(os.getpid())
+    dirname = os.path.dirname(path)
+    if dirname:
+      os.makedirs(dirname, exist_ok=True)
+    self._append = append and archive_exists(path)
+    # key -> (offset, dtype, shape)
+    self._index = {}
+    if self._append:
+      self._index = _read_index(path)
+      self._fdata = open(path + DATA_SUFFIX, 'ab')
+    else:
+      self._fdata = open(path + DATA_SUFFIX + self._tmp, 'wb')
+    self._start = self._fdata.tell()
+    self._offset = self._start
+
+  def __len__(self):
+    return len(self._index)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    if exc_type is None:
+      self.close()
+    else:
+      self.abort()
+
+  def write(self, key, feat):
+    ''' append `feat` of utt `key` '''
+    feat = np.ascontiguousarray(feat)
+    pad = -self._offset % _ALIGN
+    if pad:
+      self._fdata.write(b'\0' * pad)
+      self._offset += pad
+    self._fdata.write(feat.tobytes())
+    self._index.pop(key, None)
+    self._index[key] = (self._offset, feat.dtype, feat.shape)
+    self._offset += feat.nbytes
+
+  def remove(self, key):
+    ''' drop utt `key` from the index, if any '''
+    self._index.pop(key, None)
+
+  def close(self):
+    ''' flush data, write index and move them into place '''
+    self._fdata.close()
+    nbytes = 0
+    with open(
+        self._path + INDEX_SUFFIX + self._tmp, 'w', encoding='utf-8') as fidx:
+      for key, (offset, dtype, shape) in self._index.items():
+        fidx.write('{}\t{}\t{}\t{}\n'.format(key, offset, dtype.str,
+                                             ','.join(map(str, shape))))
+        nbytes += dtype.itemsize * int(np.prod(shape))
+    if not self._append:
+      os.replace(self._path + DATA_SUFFIX + self._tmp,
+                 self._path + DATA_SUFFIX)
+    os.replace(self._path + INDEX_SUFFIX + self._tmp,
+               self._path + INDEX_SUFFIX)
+    logging.debug(
+        'write archive: {}, {} utts, {} bytes, {} unreferenced'.format(
+            self._path, len(self._index), self._offset,
+            self._offset - nbytes))
+
+  def abort(self):
+    ''' drop what has been written '''
+    self._fdata.close()
+    if self._append:
+      os.truncate(self._path + DATA_SUFFIX, self._start)
+    else:
+      os.remove(self._path + DATA_SUFFIX + self._tmp)
+
+
+class FeatArchive:
+  ''' read only, memory mapped view of an archive '''
+
+  def __init__(self, path):
+    self._path = path
+    # key -> (offset, dtype, shape)
+    self._index = _read_index(path)
+
+    if os.path.getsize(path + DATA_SUFFIX):
+      self._data = np.memmap(path + DATA_SUFFIX, dtype=np.uint8, mode='r')
+    else:
+      self._data = np.zeros([0], dtype=np.uint8)
+    logging.info('load archive: {}, {} utts'.format(path, len(self._index)))
+
+  @property
+  def path(self):
+    ''' path prefix of archive '''
+    return self._path
+
+  def __len__(self):
+    return len(self._index)
+
+  def __contains__(self, key):
+    return key in self._index
+
+  def __iter__(self):
+    return iter(self._index)
+
+  def keys(self):
+    ''' utt keys '''
+    return self._index.keys()
+
+  def shape(self, key):
+    ''' shape of feature, without reading it '''
+    return self._index[key][2]
+
+  def __getitem__(self, key):
+    ''' feature of `key`, a read only view into the mapping '''
+    offset, dtype, shape = self._index[key]
+    nbytes = dtype.itemsize * int(np.prod(shape))
+    return self._data[offset:offset + nbytes].view(dtype).reshape(shape)
+
+
+def _owners(sources, excludes):
+  ''' {key: source} of utts of `sources`, later sources win '''
+  owner = {}
+  for source in sources:
+    for key in source.keys():
+      if key not in excludes:
+        owner[key] = source
+  return owner
+
+
+def merge_archives(path, sources, excludes=()):
+  '''
+  pack all utts of `sources` into archive `path`, later sources win.
+  params:
+    sources: list of FeatArchive
+    excludes: keys to drop
+  '''
+  owner = _owners(sources, excludes)
+  with FeatArchiveWriter(path) as writer:
+    for key in sorted(owner):
+      writer.write(key, owner[key][key])
+  return len(owner)
+
+
+def append_archives(path, sources, excludes=()):
+  '''
+  append all utts of `sources` to archive `path` in place, only its index
+    is rewritten, created if missing. utts of `sources` replace those of
+    the archive, later sources win.
+  params:
+    sources: list of FeatArchive
+    excludes: keys to drop, of the archive or `sources`
+  return:
+    num of utts in the archive
+  '''
+  owner = _owners(sources, excludes)
+  with FeatArchiveWriter(path, append=True) as writer:
+    for key in excludes:
+      writer.remove(key)
+    for key in sorted(owner):
+      writer.write(key, owner[key][key])
+    nutt = len(writer)
+  return nutt
@@ -0,0 +1,113 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+''' packed feature archive unittest '''
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from delta.data.feat import feat_archive
+
+
+class FeatArchiveTest(tf.test.TestCase):
+  ''' packed feature archive unittest '''
+
+  def setUp(self):
+    ''' set up '''
+    self.path = os.path.join(self.get_temp_dir(), 'feats')
+    self.feats = {
+        '/data/normal/0.npy': np.random.randn(10, 40, 1).astype(np.float32),
+        '/data/normal/1.npy': np.random.randn(7, 40, 1).astype(np.float32),
+        '/data/conflict/0.npy': np.arange(6, dtype=np.int16).reshape(2, 3),
+    }
+
+  def tearDown(self):
+    ''' tear down '''
+    feat_archive.remove_archive(self.path)
+
+  def test_write_read(self):
+    ''' test write and read archive '''
+    with feat_archive.FeatArchiveWriter(self.path) as writer:
+      for key, feat in self.feats.items():
+        writer.write(key, feat)
+    self.assertTrue(feat_archive.archive_exists(self.path))
+
+    archive = feat_archive.FeatArchive(self.path)
+    self.assertEqual(len(archive), len(self.feats))
+    for key, feat in self.feats.items():
+      self.assertIn(key, archive)
+      self.assertEqual(archive.shape(key), feat.shape)
+      self.assertEqual(archive[key].dtype, feat.dtype)
+      self.assertAllEqual(archive[key], feat)
+      self.assertFalse(archive[key].flags.writeable)
+
+  def test_merge(self):
+    ''' test merge archives '''
+    keys = sorted(self.feats)
+    parts = []
+    for i, key in enumerate(keys):
+      part = feat_archive.archive_part_path(self.path, [key])
+      with feat_archive.FeatArchiveWriter(part) as writer:
+        writer.write(key, self.feats[key] + i)
+      parts.append(feat_archive.FeatArchive(part))
+
+    nutt = feat_archive.merge_archives(self.path, parts)
+    self.assertEqual(nutt, len(keys))
+    archive = feat_archive.FeatArchive(self.path)
+    for i, key in enumerate(keys):
+      self.assertAllEqual(archive[key], self.feats[key] + i)
+      feat_archive.remove_archive(parts[i].path)
+
+  def test_append(self):
+    ''' test append archives in place '''
+    keys = sorted(self.feats)
+    with feat_archive.FeatArchiveWriter(self.path) as writer:
+      for key in keys:
+        writer.write(key, self.feats[key])
+    with open(self.path + feat_archive.DATA_SUFFIX, 'rb') as fdata:
+      data = fdata.read()
+
+    part = feat_archive.archive_part_path(self.path, ['new'])
+    with feat_archive.FeatArchiveWriter(part) as writer:
+      writer.write(keys[0], self.feats[keys[0]] + 1)
+      writer.write('new', np.ones([3, 2], dtype=np.float32))
+    nutt = feat_archive.append_archives(
+        self.path, [feat_archive.FeatArchive(part)], excludes={keys[1]})
+    feat_archive.remove_archive(part)
+    self.assertEqual(nutt, 3)
+
+    # data of the archive is kept, index is rewritten
+    with open(self.path + feat_archive.DATA_SUFFIX, 'rb') as fdata:
+      self.assertEqual(fdata.read(len(data)), data)
+    archive = feat_archive.FeatArchive(self.path)
+    self.assertEqual(sorted(archive.keys()), sorted([keys[0], keys[2], 'new']))
+    self.assertAllEqual(archive[keys[0]], self.feats[keys[0]] + 1)
+    self.assertAllEqual(archive[keys[2]], self.feats[keys[2]])
+    self.assertAllEqual(archive['new'], np.ones([3, 2]))
+
+    # aborted append leaves the archive as it was
+    data_path = self.path + feat_archive.DATA_SUFFIX
+    size = os.path.getsize(data_path)
+    with self.assertRaises(ValueError):
+      with feat_archive.FeatArchiveWriter(self.path, append=True) as writer:
+        writer.write('bad', np.zeros([100], dtype=np.float32))
+        raise ValueError('abort')
+    self.assertEqual(os.path.getsize(data_path), size)
+    self.assertNotIn('bad', feat_archive.FeatArchive(self.path))
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -15,6 +15,7 @@
 # ==============================================================================
 ''' speech feat entrypoint unittest'''
 import os
+import threading
 
 import librosa
 import numpy as np
@@ -22,67 +23,240 @@ import tensorflow as tf
 from absl import logging
 
 from delta.data.feat import speech_ops
+from delta.data.feat import feat_archive
 from delta.data.feat import python_speech_features as psf
 
 
-#pylint: disable=too-many-locals
-def extract_filterbank(*args, **kwargs):
-  ''' tensorflow fbank feat '''
-  winlen = kwargs.get('winlen')
-  winstep = kwargs.get('winstep')
-  feature_size = kwargs.get('feature_size')
-  sr = kwargs.get('sr')  #pylint: disable=invalid-name
-  nfft = kwargs.get('nfft')
-  dry_run = kwargs.get('dry_run')
-  del nfft
-
-  graph = tf.Graph()
-  #pylint: disable=not-context-manager
-  with graph.as_default():
-    # fbank
-    params = speech_ops.speech_params(
-        sr=sr,
-        bins=feature_size,
-        add_delta_deltas=False,
-        audio_frame_length=winlen,
-        audio_frame_step=winstep)
-
-    filepath = tf.placeholder(dtype=tf.string, shape=[], name='wavpath')
-    waveforms, sample_rate = speech_ops.read_wav(filepath, params)
-    del sample_rate
-    fbank = speech_ops.extract_feature(waveforms, params)
+#pylint: disable=too-many-instance-attributes
+class FeatureExtractor:
+  '''
+  Build the wav decoding, fbank and delta-delta graph once and keep one
+  session alive, so that feature extraction does not pay graph
+  construction on every call.
+  '''
 
-  sess = tf.Session(graph=graph)
+  #pylint: disable=too-many-arguments,invalid-name
+  def __init__(self,
+               sr=8000,
+               feature_size=40,
+               winlen=0.025,
+               winstep=0.010,
+               add_delta_deltas=False,
+               order=2,
+               sess_config=None):
+    self._sr = sr
+    self._feature_size = feature_size
+    self._order = order
+
+    self._graph = tf.Graph()
+    #pylint: disable=not-context-manager
+    with self._graph.as_default():
+      params = speech_ops.speech_params(
+          sr=sr,
+          bins=feature_size,
+          add_delta_deltas=add_delta_deltas,
+          audio_desired_samples=-1,
+          audio_frame_length=winlen,
+          audio_frame_step=winstep)
+
+      # wavpath -> samples, fbank
+      self._wavpath = tf.placeholder(dtype=tf.string, shape=[], name='wavpath')
+      self._audio, self._sample_rate = speech_ops.read_wav(
+          self._wavpath, params)
+      self._wav_fbank = speech_ops.extract_feature(self._audio, params)
+
+      # [nsample] -> fbank
+      self._waveform = tf.placeholder(
+          dtype=tf.float32, shape=[None], name='waveform')
+      self._fbank = speech_ops.extract_feature(
+          tf.expand_dims(self._waveform, axis=-1), params)
+
+      # [batch, nsample] -> [batch, nframe, nbins, channels]
+      self._waveforms = tf.placeholder(
+          dtype=tf.float32, shape=[None, None], name='waveforms')
+      self._batch_fbank = speech_ops.batch_extract_feature(
+          tf.expand_dims(self._waveforms, axis=-1), params)
+
+      # [nframe, nbins, 1] -> [nframe, nbins, order + 1]
+      self._feat = tf.placeholder(
+          dtype=tf.float32, shape=[None, feature_size, 1], name='fbank')
+      self._delta_delta = speech_ops.delta_delta(self._feat, order=order)
+
+      # [batch, nframe, nbins, 1] -> [batch, nframe, nbins, order + 1]
+      self._feats = tf.placeholder(
+          dtype=tf.float32, shape=[None, None, feature_size, 1], name='fbanks')
+      self._batch_delta_delta = tf.map_fn(
+          lambda x: speech_ops.delta_delta(x, order=order),
+          self._feats,
+          dtype=tf.float32,
+          back_prop=False)
+    self._graph.finalize()
+
+    self._sess = tf.Session(graph=self._graph, config=sess_config)
+
+  @property
+  def sample_rate(self):
+    ''' sample rate of input audio '''
+    return self._sr
+
+  @property
+  def feature_size(self):
+    ''' num of fbank bins '''
+    return self._feature_size
+
+  def close(self):
+    ''' release session '''
+    if self._sess is not None:
+      self._sess.close()
+      self._sess = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def load_wav(self, wavpath):
+    '''
+    return
+      sr: sample rate
+      audio: np.float32, shape [None], sample in [-1, 1]
+    '''
+    audio, sample_rate = self._sess.run([self._audio, self._sample_rate],
+                                        feed_dict={self._wavpath: wavpath})
+    assert sample_rate == self._sr, \
+      'sampling rate must be {}Hz, get {}Hz'.format(self._sr, sample_rate)
+    return sample_rate, audio[:, 0]
+
+  def load_wavs(self, wavpaths):
+    ''' load list of wav, return list of samples '''
+    return [self.load_wav(wavpath)[1] for wavpath in wavpaths]
+
+  def wav_fbank(self, wavpath):
+    ''' wavpath -> fbank of shape [nframe, nbins, channels] '''
+    return self._sess.run(self._wav_fbank, feed_dict={self._wavpath: wavpath})
+
+  def fbank(self, waveforms):
+    '''
+    params:
+      waveforms: np.ndarray of shape [nsample] or [batch, nsample],
+        or list of np.ndarray of shape [nsample]
+    return:
+      fbank of shape [nframe, nbins, channels] for one waveform,
+      otherwise [batch, nframe, nbins, channels] or list of fbank.
+    '''
+    if isinstance(waveforms, np.ndarray):
+      if waveforms.ndim == 1:
+        return self._sess.run(
+            self._fbank, feed_dict={self._waveform: waveforms})
+      assert waveforms.ndim == 2
+      return self._sess.run(
+          self._batch_fbank, feed_dict={self._waveforms: waveforms})
+
+    waveforms = list(waveforms)
+    if waveforms and len(set(len(x) for x in waveforms)) == 1:
+      # same length, using one batch run
+      return list(self.fbank(np.stack(waveforms)))
+    return [self.fbank(np.asarray(x)) for x in waveforms]
+
+  def add_delta_delta(self, feats):
+    '''
+    params:
+      feats: np.ndarray of shape [nframe, nbins, 1] or [batch, nframe, nbins, 1],
+        or list of np.ndarray of shape [nframe, nbins, 1]
+    return:
+      features with delta and delta-delta, the channels are `order + 1`
+    '''
+    if isinstance(feats, np.ndarray):
+      if feats.ndim == 2:
+        feats = feats[..., np.newaxis]
+      if feats.ndim == 3:
+        return self._sess.run(self._delta_delta, feed_dict={self._feat: feats})
+      assert feats.ndim == 4
+      return self._sess.run(
+          self._batch_delta_delta, feed_dict={self._feats: feats})
+
+    feats = list(feats)
+    if feats and len(set(x.shape for x in feats)) == 1:
+      # same shape, using one batch run
+      return list(self.add_delta_delta(np.stack(feats)))
+    return [self.add_delta_delta(np.asarray(x)) for x in feats]
+
+  def extract_filterbank(self, wavpaths, save_feat_path=None, dry_run=False):
+    ''' extract fbank of wavs and dump to *.npy '''
+    for wavpath in wavpaths:
+      savepath = feat_savepath(wavpath, save_feat_path)
+      logging.debug('input: {}, output: {}'.format(wavpath, savepath))
+
+      feat = self.wav_fbank(wavpath)
+
+      # save feat
+      if dry_run:
+        logging.info('save feat: path {} shape:{} dtype:{}'.format(
+            savepath, feat.shape, feat.dtype))
+      else:
+        save_feat(savepath, feat)
+
+
+_EXTRACTORS = {}
+_EXTRACTORS_LOCK = threading.Lock()
 
-  for wavpath in args:
-    savepath = os.path.splitext(wavpath)[0] + '.npy'
-    logging.debug('input: {}, output: {}'.format(wavpath, savepath))
 
-    feat = sess.run(fbank, feed_dict={'wavpath:0': wavpath})
+#pylint: disable=too-many-arguments,invalid-name
+def get_extractor(sr=8000,
+                  feature_size=40,
+                  winlen=0.025,
+                  winstep=0.010,
+                  add_delta_deltas=False,
+                  order=2,
+                  num_threads=None):
+  '''
+  return a process wide `FeatureExtractor` cached by its params,
+  `num_threads` limits the intra and inter op threads of its session,
+  None for the TF default.
+  '''
+  key = (sr, feature_size, winlen, winstep, add_delta_deltas, order,
+         num_threads)
+  with _EXTRACTORS_LOCK:
+    if key not in _EXTRACTORS:
+      sess_config = None
+      if num_threads:
+        sess_config = tf.ConfigProto(
+            intra_op_parallelism_threads=num_threads,
+            inter_op_parallelism_threads=num_threads)
+      _EXTRACTORS[key] = FeatureExtractor(
+          sr=sr,
+          feature_size=feature_size,
+          winlen=winlen,
+          winstep=winstep,
+          add_delta_deltas=add_delta_deltas,
+          order=order,
+          sess_config=sess_config)
+    return _EXTRACTORS[key]
+
+
+def feat_savepath(wavpath, save_feat_path=None):
+  ''' *.wav -> *.npy, under `save_feat_path` if given '''
+  if save_feat_path:
+    filename = os.path.splitext(os.path.split(wavpath)[-1])[0] + '.npy'
+    return os.path.join(save_feat_path, filename)
+  return os.path.splitext(wavpath)[0] + '.npy'
 
-    # save feat
-    if dry_run:
-      logging.info('save feat: path {} shape:{} dtype:{}'.format(
-          savepath, feat.shape, feat.dtype))
-    else:
-      np.save(savepath, feat)
 
-  sess.close()
+def extract_filterbank(*args, **kwargs):
+  ''' tensorflow fbank feat '''
+  extractor = get_extractor(
+      sr=kwargs.get('sr'),
+      feature_size=kwargs.get('feature_size'),
+      winlen=kwargs.get('winlen'),
+      winstep=kwargs.get('winstep'))
+  extractor.extract_filterbank(args, dry_run=kwargs.get('dry_run'))
 
 
 def add_delta_delta(feat, feat_size, order=2):
   ''' add delta detla '''
-  graph = tf.Graph()
-  #pylint: disable=not-context-manager
-  with graph.as_default():
-    fbank = tf.placeholder(
-        dtype=tf.float32, shape=[None, feat_size, 1], name='fbank')
-    feat_with_delta_delta = speech_ops.delta_delta(fbank, order=order)
-
-  sess = tf.Session(graph=graph)
-  feat = sess.run(feat_with_delta_delta, feed_dict={'fbank:0': feat})
-  sess.close()
-  return feat
+  extractor = get_extractor(feature_size=feat_size, order=order)
+  return extractor.add_delta_delta(feat)
 
 
 #pylint: disable=invalid-name
@@ -102,18 +276,7 @@ def load_wav(wavpath, sr=8000):
 
   #samples, sample_rate = librosa.load(wavpath, sr=sr)
 
-  with tf.Session() as sess:
-    params = speech_ops.speech_params(sr=sr, audio_desired_samples=-1)
-    t_wavpath = tf.placeholder(dtype=tf.string)
-    t_audio, t_sample_rate = speech_ops.read_wav(t_wavpath, params)
-
-    audio, sample_rate = sess.run([t_audio, t_sample_rate],
-                                  feed_dict={t_wavpath: wavpath})
-    audio = audio[:, 0]
-
-  assert sample_rate == sr, 'sampling rate must be {}Hz, get {}Hz'.format(
-      sr, sample_rate)
-  return sample_rate, audio
+  return get_extractor(sr=sr).load_wav(wavpath)
 
 
 #pylint: disable=invalid-name
@@ -211,60 +374,216 @@ def points(freq, resolution):
   return freq / resolution
 
 
+#pylint: disable=too-many-arguments,invalid-name
+def pyfeat(samples,
+           sr=8000,
+           nfft=512,
+           winlen=0.025,
+           winstep=0.01,
+           highfreq=None,
+           feature_size=40,
+           feat_type='logfbank'):
+  ''' pyfeat, samples -> spectrogram or logfbank of shape [nframe, nbins] '''
+  feat = powspec_feat(samples, sr=sr, nfft=nfft, winlen=winlen, winstep=winstep)
+  logging.debug('apply power spectorgram')
+
+  if feat_type == 'spectrogram':
+    # shape: [T, F]
+    feat = psf.logpowerspec(feat)
+    if highfreq:
+      resolution = freq_resolution(sr, nfft)
+      ps = int(points(highfreq, resolution))  #pylint: disable=invalid-name
+      logging.debug("feat slice: {} {}".format(ps, type(ps)))
+      feat = feat[:, :ps]
+    logging.debug('apply log power spectorgram')
+  elif feat_type == 'logfbank':
+    feat = fbank_feat(feat, sr=sr, nfft=nfft, feature_size=feature_size)
+    logging.debug('apply fbank spectorgram')
+  else:
+    raise ValueError("not support feat method")
+
+  return feat.astype(np.float32)
+
+
+def feat_is_fresh(wavpath, savepath):
+  ''' whether feat of `wavpath` exists and is newer than it '''
+  return os.path.exists(savepath) and \
+      os.path.getmtime(savepath) >= os.path.getmtime(wavpath)
+
+
+def save_feat(savepath, feat):
+  ''' save feat to *.npy atomically, a partial file is never seen '''
+  tmppath = '{}.{}.tmp'.format(savepath, os.getpid())
+  with open(tmppath, 'wb') as fout:
+    np.save(fout, feat)
+  os.replace(tmppath, savepath)
+
+
 #pylint: disable=too-many-locals
 def extract_feat(*args, **kwargs):
   ''' pyfeat, extract feat from utt and dump it '''
   logging.debug("extract_feat : {}".format(kwargs))
 
-  winlen = kwargs.get('winlen')
-  winstep = kwargs.get('winstep')
-  feature_size = kwargs.get('feature_size')
   sr = kwargs.get('sr')  #pylint: disable=invalid-name
-  nfft = kwargs.get('nfft')
-  lowfreq = kwargs.get('lowfreq')
-  highfreq = kwargs.get('highfreq')
-  preemph = kwargs.get('preemph')
   save_feat_path = kwargs.get('save_feat_path')
   dry_run = kwargs.get('dry_run')
-  feat_type = kwargs.get('feat_type')
-
-  del lowfreq, preemph
 
   if save_feat_path and not os.path.exists(save_feat_path):
     os.makedirs(save_feat_path)
 
   for wavpath in args:
-    if save_feat_path:
-      filename = os.path.splitext(os.path.split(wavpath)[-1])[0] + '.npy'
-      savepath = os.path.join(save_feat_path, filename)
-    else:
-      savepath = os.path.splitext(wavpath)[0] + '.npy'
+    savepath = feat_savepath(wavpath, save_feat_path)
     logging.debug('input: {}, output: {}'.format(wavpath, savepath))
 
     sr_out, samples = load_wav(wavpath, sr=sr)
     del sr_out
-    feat = powspec_feat(
-        samples, sr=sr, nfft=nfft, winlen=winlen, winstep=winstep)
-    logging.debug('apply power spectorgram')
-
-    if feat_type == 'spectrogram':
-      # shape: [T, F]
-      feat = psf.logpowerspec(feat)
-      if highfreq:
-        resolution = freq_resolution(sr, nfft)
-        ps = int(points(highfreq, resolution))  #pylint: disable=invalid-name
-        logging.debug("feat slice: {} {}".format(ps, type(ps)))
-        feat = feat[:, :ps]
-      logging.debug('apply log power spectorgram')
-    elif feat_type == 'logfbank':
-      feat = fbank_feat(feat, sr=sr, nfft=nfft, feature_size=feature_size)
-      logging.debug('apply fbank spectorgram')
-    else:
-      raise ValueError("not support feat method")
+    feat = pyfeat(
+        samples,
+        sr=sr,
+        nfft=kwargs.get('nfft'),
+        winlen=kwargs.get('winlen'),
+        winstep=kwargs.get('winstep'),
+        highfreq=kwargs.get('highfreq'),
+        feature_size=kwargs.get('feature_size'),
+        feat_type=kwargs.get('feat_type'))
 
-    feat = feat.astype(np.float32)
     if dry_run:
       logging.info('save feat: path {} shape:{} dtype:{}'.format(
           savepath, feat.shape, feat.dtype))
     else:
       np.save(savepath, feat)
+
+
+def extract_shard(wavpaths, featconf):
+  '''
+  extract feat of wavs and dump them, skip the wav whose feat is newer
+  than it, so an interrupted run can be resumed.
+  if `feat_archive` is set, feats of the shard are packed into one part
+  archive instead of *.npy files, and a finished part is skipped.
+  params:
+    wavpaths: list of wav path
+    featconf: `data.task.audio` config, `gen_feat_threads` limits the
+      threads of the tffeat session
+  return:
+    (num of extracted files, num of skipped files, seconds of extracted audio)
+  '''
+  sr = featconf['sr']  #pylint: disable=invalid-name
+  feature_type = featconf['feature_extractor']
+  save_feat_path = featconf.get('save_feat_path')
+  dry_run = featconf.get('dry_run')
+  archive = featconf.get('feat_archive')
+
+  writer = None
+  if archive:
+    part = feat_archive.archive_part_path(archive, wavpaths)
+    if feat_archive.archive_exists(part):
+      logging.debug('skip: {} is done'.format(part))
+      return 0, len(wavpaths), 0.0
+    if not dry_run:
+      writer = feat_archive.FeatArchiveWriter(part)
+
+  if feature_type == 'tffeat':
+    extractor = get_extractor(
+        sr=sr,
+        feature_size=featconf['feature_size'],
+        winlen=featconf['winlen'],
+        winstep=featconf['winstep'],
+        num_threads=featconf.get('gen_feat_threads'))
+  elif feature_type != 'pyfeat':
+    raise ValueError("Not support feat: {}".format(feature_type))
+
+  if save_feat_path and not archive:
+    os.makedirs(save_feat_path, exist_ok=True)
+
+  nextract, nskip, seconds = 0, 0, 0.0
+  try:
+    for wavpath in wavpaths:
+      savepath = feat_savepath(wavpath, save_feat_path)
+      if not archive and feat_is_fresh(wavpath, savepath):
+        logging.debug('skip: {}, {} is up to date'.format(wavpath, savepath))
+        nskip += 1
+        continue
+      logging.debug('input: {}, output: {}'.format(wavpath, savepath))
+
+      if feature_type == 'tffeat':
+        _, samples = extractor.load_wav(wavpath)
+        feat = extractor.fbank(samples)
+      else:
+        _, samples = load_wav(wavpath, sr=sr)
+        feat = pyfeat(
+            samples,
+            sr=sr,
+            nfft=featconf.get('nfft'),
+            winlen=featconf.get('winlen'),
+            winstep=featconf.get('winstep'),
+            highfreq=featconf.get('highfreq'),
+            feature_size=featconf.get('feature_size'),
+            feat_type=featconf.get('feat_type'))
+      nextract += 1
+      seconds += len(samples) / sr
+
+      if dry_run:
+        logging.info('save feat: path {} shape:{} dtype:{}'.format(
+            savepath, feat.shape, feat.dtype))
+      elif writer:
+        writer.write(savepath, feat)
+      else:
+        save_feat(savepath, feat)
+  except BaseException:
+    # no tmp part left behind by a failed wav
+    if writer:
+      writer.abort()
+    raise
+
+  if writer:
+    writer.close()
+  return nextract, nskip, seconds
+
+
+def archive_pending(archive_path, wavpaths, save_feat_path=None):
+  ''' wavs whose feats are not in archive `archive_path` or older than them '''
+  if not feat_archive.archive_exists(archive_path):
+    return list(wavpaths)
+  archived = feat_archive.FeatArchive(archive_path)
+  mtime = feat_archive.archive_mtime(archive_path)
+  return [
+      wavpath for wavpath in wavpaths
+      if feat_savepath(wavpath, save_feat_path) not in archived or
+      os.path.getmtime(wavpath) > mtime
+  ]
+
+
+def archive_removed(archive_path, wavpaths, save_feat_path=None):
+  ''' keys of archive `archive_path` which are not feats of `wavpaths` '''
+  if not feat_archive.archive_exists(archive_path):
+    return []
+  savepaths = {feat_savepath(wavpath, save_feat_path) for wavpath in wavpaths}
+  archived = feat_archive.FeatArchive(archive_path)
+  return [key for key in archived.keys() if key not in savepaths]
+
+
+def merge_shards(archive_path, shards, excludes=(), compact=False):
+  '''
+  merge the part archives written by `extract_shard` of `shards`, a list of
+    wav path lists, into `archive_path`, then remove the parts.
+  the parts are appended to the data of the existing archive and only its
+    index is rewritten, with `compact` the whole archive is rewritten
+    without the feats which are no longer referenced.
+  params:
+    excludes: keys to drop from the archive, e.g. of `archive_removed`
+  return:
+    num of utts in the archive
+  '''
+  parts = [
+      feat_archive.FeatArchive(
+          feat_archive.archive_part_path(archive_path, shard))
+      for shard in shards
+  ]
+  if compact and feat_archive.archive_exists(archive_path):
+    sources = [feat_archive.FeatArchive(archive_path)] + parts
+    nutt = feat_archive.merge_archives(archive_path, sources, excludes)
+  else:
+    nutt = feat_archive.append_archives(archive_path, parts, excludes)
+  for part in parts:
+    feat_archive.remove_archive(part.path)
+  return nutt
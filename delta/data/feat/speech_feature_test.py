@@ -24,6 +24,7 @@ from absl import logging
 
 from delta.data.feat import speech_ops
 from delta.data.feat import speech_feature
+from delta.data.feat import feat_archive
 
 
 #pylint: disable=too-many-instance-attributes
@@ -87,6 +88,101 @@ class SpeechFeatureTest(tf.test.TestCase):
     feat = speech_feature.add_delta_delta(feat, 40, order=2)
     self.assertEqual(feat.shape, (425, 40, 3))
 
+  def test_feature_extractor(self):
+    ''' test tensorflow feature extractor with cached graph '''
+    extractor = speech_feature.FeatureExtractor(
+        sr=self.sr,
+        feature_size=self.feature_size,
+        winlen=self.winlen,
+        winstep=self.winstep)
+    self.assertIs(
+        speech_feature.get_extractor(sr=self.sr),
+        speech_feature.get_extractor(sr=self.sr))
+    self.assertIsNot(
+        speech_feature.get_extractor(sr=self.sr),
+        speech_feature.get_extractor(sr=self.sr, num_threads=1))
+
+    sample_rate, audio = extractor.load_wav(self.wavfile)
+    self.assertEqual(sample_rate, self.sr)
+    audio_true, _ = librosa.load(self.wavfile, sr=self.sr)
+    self.assertAllClose(audio, audio_true)
+
+    feat = extractor.wav_fbank(self.wavfile)
+    self.assertEqual(feat.shape, (425, 40, 1))
+    self.assertAllClose(extractor.fbank(audio), feat)
+
+    # batched
+    feats = extractor.fbank(np.stack([audio, audio]))
+    self.assertEqual(feats.shape, (2, 425, 40, 1))
+    feats = extractor.fbank([audio, audio[:8000]])
+    self.assertEqual(len(feats), 2)
+    self.assertEqual(feats[0].shape, (425, 40, 1))
+
+    feat_delta = extractor.add_delta_delta(feat)
+    self.assertEqual(feat_delta.shape, (425, 40, 3))
+    feats_delta = extractor.add_delta_delta([feat, feat])
+    self.assertEqual(len(feats_delta), 2)
+    self.assertAllClose(feats_delta[1], feat_delta)
+    extractor.close()
+
+  def test_extract_shard(self):
+    ''' test resumable feature extraction of a shard '''
+    featconf = {
+        'sr': self.sr,
+        'winlen': self.winlen,
+        'winstep': self.winstep,
+        'feature_size': self.feature_size,
+        'feature_extractor': 'tffeat',
+        'save_feat_path': None,
+    }
+    nextract, nskip, seconds = speech_feature.extract_shard([self.wavfile],
+                                                            featconf)
+    self.assertEqual((nextract, nskip), (1, 0))
+    self.assertGreater(seconds, 0)
+    self.assertEqual(np.load(self.featfile).shape, (425, 40, 1))
+
+    # feat is newer than wav, skip it
+    nextract, nskip, seconds = speech_feature.extract_shard([self.wavfile],
+                                                            featconf)
+    self.assertEqual((nextract, nskip, seconds), (0, 1, 0.0))
+
+  def test_extract_shard_archive(self):
+    ''' test shards packed into part archives and merged '''
+    archive = os.path.join(self.get_temp_dir(), 'feats')
+    featconf = {
+        'sr': self.sr,
+        'winlen': self.winlen,
+        'winstep': self.winstep,
+        'feature_size': self.feature_size,
+        'feature_extractor': 'tffeat',
+        'save_feat_path': None,
+        'feat_archive': archive,
+    }
+    # a failed wav leaves no tmp part
+    with self.assertRaises(Exception):
+      speech_feature.extract_shard([self.wavfile, self.wavfile + '.missing'],
+                                   featconf)
+    self.assertEqual(os.listdir(self.get_temp_dir()), [])
+
+    shards = [[self.wavfile]]
+    self.assertEqual(
+        speech_feature.archive_pending(archive, shards[0]), shards[0])
+    nextract, nskip, _ = speech_feature.extract_shard(shards[0], featconf)
+    self.assertEqual((nextract, nskip), (1, 0))
+    self.assertEqual(speech_feature.merge_shards(archive, shards), 1)
+    self.assertEqual(sorted(os.listdir(self.get_temp_dir())),
+                     ['feats.data', 'feats.index'])
+    self.assertEqual(
+        feat_archive.FeatArchive(archive)[self.featfile].shape, (425, 40, 1))
+    self.assertEqual(speech_feature.archive_pending(archive, shards[0]), [])
+
+    # feats of removed wavs are dropped
+    self.assertEqual(speech_feature.archive_removed(archive, shards[0]), [])
+    removed = speech_feature.archive_removed(archive, [])
+    self.assertEqual(removed, [self.featfile])
+    self.assertEqual(speech_feature.merge_shards(archive, [], removed), 0)
+    self.assertNotIn(self.featfile, feat_archive.FeatArchive(archive))
+
   def test_py_extract_feat(self):
     ''' test python fbank with delta-delta interface '''
     speech_feature.extract_feat((self.wavfile),
@@ -26,6 +26,9 @@ class Preparer:
     self.config = config
     self.reuse = self.config["data"]["task"]["preparer"].get("reuse", True)
     self.done_sign = self.config["data"]["task"]["preparer"].get("done_sign", "")
+    # lines of raw data in memory at once
+    self.chunk_size = self.config["data"]["task"]["preparer"].get(
+        "chunk_size", 100000)
 
   def skip_prepare(self):
     """Check if task need to skip the prepare process."""
@@ -15,15 +15,16 @@
 # ==============================================================================
 ''' Preparer for text classification.'''
 
+import collections
 from absl import logging
-import math
 
 from delta.data.preprocess.base_preparer import Preparer
 from delta.data.preprocess.utils import prepare_embedding
 from delta.data.preprocess.utils import prepare_vocab
 from delta.data.preprocess.utils import prepare_vocab_from_config
-from delta.data.preprocess.utils import get_pre_process_text_ds
-from delta.data.preprocess.utils import run_one_sentence
+from delta.data.preprocess.utils import iter_chunks
+from delta.data.preprocess.utils import PreProcessRunner
+from delta.data.utils.vocabulary import count_tokens
 from delta.utils.solver.solver_utils import get_session_conf
 from delta.data import utils as data_utils
 from delta import utils
@@ -51,9 +52,14 @@ class TextClsPreparer(Preparer):
     self.session_conf = get_session_conf(self.config)
 
   def _prepare_raw_data(self, pre_process_pipeline):
-    """Preparing raw data."""
-    all_texts = []
-    all_labels = []
+    """
+    Preparing raw data, streamed in chunks of lines.
+    Return token counters of texts and labels.
+    """
+    text_counter = collections.Counter()
+    label_counter = collections.Counter()
+    runner = PreProcessRunner(pre_process_pipeline, self.num_parallel_calls,
+                              self.batch_size, self.session_conf)
     for mode in self.all_modes:
       paths = self.config["data"][mode]['paths']
       paths_after_pre_process = [one_path + ".after" for one_path in paths]
@@ -63,27 +69,30 @@ class TextClsPreparer(Preparer):
       infer_without_label = bool(mode == utils.INFER and self.infer_no_label)
 
       for one_path, one_path_after in zip(paths, paths_after_pre_process):
-        text, label = data_utils.load_cls_raw_data(
-            paths=[one_path], mode=mode, infer_no_label=infer_without_label)
-        text_t = get_pre_process_text_ds(text, pre_process_pipeline, self.num_parallel_calls,
-                                         self.batch_size)
-        batch_num = math.ceil(len(text) / float(self.batch_size))
-        text_after_arr = run_one_sentence(text_t, batch_num, self.session_conf)
-        text_after = [one_line.decode("utf-8") for one_line in text_after_arr]
-        all_texts += text_after
-        all_labels += label
+        logging.info("Saving processed file to: {}".format(one_path_after))
+        raw_data = data_utils.iter_cls_raw_data(
+            one_path, mode=mode, infer_no_label=infer_without_label)
+        with open(one_path_after, "w", encoding="utf-8") as out_f:
+          for chunk in iter_chunks(raw_data, self.chunk_size):
+            text = [one_text for one_text, _ in chunk]
+            label = [one_label for _, one_label in chunk]
+            text_after, = runner(text)
+            text_counter.update(count_tokens(text_after))
+            if not infer_without_label:
+              label_counter.update(count_tokens(label))
+            data_utils.write_text_cls_lines(out_f, label, text_after,
+                                            infer_without_label)
+    runner.close()
+    return text_counter, label_counter
 
-        data_utils.save_a_text_cls_file(label, text_after, one_path_after,
-                                        infer_without_label)
-    return all_texts, all_labels
-
-  def _prepare_vocabs(self, all_texts, all_labels):
+  def _prepare_vocabs(self, text_counter, label_counter):
     """Preparing vocab for x."""
     logging.info("Preparing vocab for x ...")
     prepare_vocab(
         self.text_vocab_file_path,
-        all_texts,
-        min_frequency=self.vocab_min_frequency)
+        text_counter,
+        min_frequency=self.vocab_min_frequency,
+        max_size=self.task_config.get('vocab_max_size'))
 
     logging.info("Preparing vocab for y ...")
     if "vocab" in self.config["data"]["task"]["classes"]:
@@ -91,7 +100,7 @@ class TextClsPreparer(Preparer):
     else:
       prepare_vocab(
           self.label_vocab_file_path,
-          all_labels,
+          label_counter,
           min_frequency=1,
           use_default_dict=False)
 
@@ -99,13 +108,16 @@ class TextClsPreparer(Preparer):
     """Preparing embedding."""
     logging.info("Preparing embedding ...")
     if self.model_config["use_pre_train_emb"]:
-      prepare_embedding(self.model_config["pre_train_emb_path"],
-                        self.task_config["text_vocab"],
-                        self.model_config["embedding_path"])
+      prepare_embedding(
+          self.model_config["pre_train_emb_path"],
+          self.task_config["text_vocab"],
+          self.model_config["embedding_path"],
+          cache_dir=self.model_config.get("pre_train_emb_cache_dir"),
+          num_workers=self.model_config.get("pre_train_emb_workers", 0))
 
   def do_prepare(self, pre_process_pipeline):
     """Do the prepare processing."""
 
-    all_texts, all_labels = self._prepare_raw_data(pre_process_pipeline)
-    self._prepare_vocabs(all_texts, all_labels)
+    text_counter, label_counter = self._prepare_raw_data(pre_process_pipeline)
+    self._prepare_vocabs(text_counter, label_counter)
     self._prepare_embedding()
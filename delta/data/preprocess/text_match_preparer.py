@@ -14,14 +14,16 @@
 # limitations under the License.
 # ==============================================================================
 ''' Preparer for text match.'''
-import math
+import itertools
+import collections
 from absl import logging
 from delta.data.preprocess.base_preparer import Preparer
 from delta.data.preprocess.utils import prepare_embedding
 from delta.data.preprocess.utils import prepare_vocab
 from delta.data.preprocess.utils import prepare_vocab_from_config
-from delta.data.preprocess.utils import get_pre_process_text_ds
-from delta.data.preprocess.utils import run_two_sentence
+from delta.data.preprocess.utils import iter_chunks
+from delta.data.preprocess.utils import PreProcessRunner
+from delta.data.utils.vocabulary import count_tokens
 from delta.utils.solver.solver_utils import get_session_conf
 from delta.data import utils as data_utils
 
@@ -51,9 +53,15 @@ class TextMatchPreparer(Preparer):
 
   #pylint: disable=too-many-locals
   def _prepare_raw_data(self, pre_process_pipeline):
-    """Preparing raw data."""
-    all_texts = []
-    all_labels = []
+    """
+    Preparing raw data, streamed in chunks of lines.
+    Return token counters of texts and labels.
+    """
+    text_counter = collections.Counter()
+    label_counter = collections.Counter()
+    runner = PreProcessRunner(pre_process_pipeline, self.num_parallel_calls,
+                              self.batch_size, self.session_conf,
+                              num_inputs=2)
     for mode in self.all_modes:
       paths = self.config["data"][mode]['paths']
       paths_after_pre_process = [one_path + ".after" for one_path in paths]
@@ -63,42 +71,40 @@ class TextMatchPreparer(Preparer):
       infer_without_label = bool(mode == utils.INFER and self.infer_no_label)
 
       for one_path, one_path_after in zip(paths, paths_after_pre_process):
-        (text_left, text_right), label = data_utils.load_match_raw_data(
-            paths=[one_path], mode=mode, infer_no_label=infer_without_label)
-        text_t_left = get_pre_process_text_ds(text_left, pre_process_pipeline,
-                                              self.num_parallel_calls, self.batch_size)
-        text_t_right = get_pre_process_text_ds(text_right, pre_process_pipeline,
-                                               self.num_parallel_calls, self.batch_size)
-
-        batch_num = math.ceil(len(text_left) / float(self.batch_size))
-        text_after_left_right = run_two_sentence([text_t_left, text_t_right], batch_num,
-                                               self.session_conf)
-
-        text_after_arr_l_r = [(left.decode("utf-8"), right.decode("utf-8")) for (left, right)
-                              in text_after_left_right]
-        all_texts += text_after_arr_l_r
-        all_labels += label
+        logging.info("Saving processed file to: {}".format(one_path_after))
+        raw_data = data_utils.iter_match_raw_data(
+            one_path, mode=mode, infer_no_label=infer_without_label)
         with open(one_path_after, "w", encoding="utf-8") as out_f:
-          for i, [one_line_l, one_line_r] in enumerate(text_after_arr_l_r):
-            if mode == utils.INFER and self.infer_no_label:
-              out_f.write(one_line_l + '\t' + one_line_r + "\n")
-            else:
-              out_f.write(label[i] + "\t" + one_line_l + '\t' +
-                          one_line_r + "\n")
-
-    return all_texts, all_labels
-
-  def _prepare_vocabs(self, all_texts, all_labels):
+          for chunk in iter_chunks(raw_data, self.chunk_size):
+            text_left = [left for left, _, _ in chunk]
+            text_right = [right for _, right, _ in chunk]
+            label = [one_label for _, _, one_label in chunk]
+            text_left_after, text_right_after = runner(text_left, text_right)
+            text_counter.update(
+                count_tokens(
+                    itertools.chain.from_iterable(
+                        zip(text_left_after, text_right_after))))
+            if not infer_without_label:
+              label_counter.update(count_tokens(label))
+
+            for i, (one_line_l, one_line_r) in enumerate(
+                zip(text_left_after, text_right_after)):
+              if infer_without_label:
+                out_f.write(one_line_l + '\t' + one_line_r + "\n")
+              else:
+                out_f.write(label[i] + "\t" + one_line_l + '\t' +
+                            one_line_r + "\n")
+    runner.close()
+    return text_counter, label_counter
+
+  def _prepare_vocabs(self, text_counter, label_counter):
     """Preparing vocab for x."""
     logging.info("Preparing vocab for x ...")
-    vocab_data = []
-    for left_right in all_texts:
-       vocab_data.extend(left_right)
-    #
     prepare_vocab(
         self.text_vocab_file_path,
-        vocab_data,
-        min_frequency=self.vocab_min_frequency)
+        text_counter,
+        min_frequency=self.vocab_min_frequency,
+        max_size=self.task_config.get('vocab_max_size'))
 
     logging.info("Preparing vocab for y ...")
     if "vocab" in self.config["data"]["task"]["classes"]:
@@ -106,7 +112,7 @@ class TextMatchPreparer(Preparer):
     else:
       prepare_vocab(
           self.label_vocab_file_path,
-          all_labels,
+          label_counter,
           min_frequency=1,
           use_default_dict=False)
 
@@ -114,15 +120,18 @@ class TextMatchPreparer(Preparer):
     """Preparing embedding."""
     logging.info("Preparing embedding ...")
     if self.model_config["use_pre_train_emb"]:
-      prepare_embedding(self.model_config["pre_train_emb_path"],
-                        self.task_config["text_vocab"],
-                        self.model_config["embedding_path"])
+      prepare_embedding(
+          self.model_config["pre_train_emb_path"],
+          self.task_config["text_vocab"],
+          self.model_config["embedding_path"],
+          cache_dir=self.model_config.get("pre_train_emb_cache_dir"),
+          num_workers=self.model_config.get("pre_train_emb_workers", 0))
 
   def do_prepare(self, pre_process_pipeline):
     """Do the prepare processing."""
 
-    all_texts, all_labels = self._prepare_raw_data(pre_process_pipeline)
+    text_counter, label_counter = self._prepare_raw_data(pre_process_pipeline)
 
-    self._prepare_vocabs(all_texts, all_labels)
+    self._prepare_vocabs(text_counter, label_counter)
 
     self._prepare_embedding()
@@ -16,14 +16,20 @@
 '''Utilities for data preprocessing'''
 
 import os
-import pickle
+import hashlib
+import functools
 import collections
+import multiprocessing as mp
 import numpy as np
 from absl import logging
 import tensorflow as tf
 
 
 from delta.data.utils.vocabulary import Vocabulary
+from delta.data.utils.vocabulary import count_files
+from delta.data.utils.vocabulary import count_tokens
+from delta.data.utils.vocabulary import file_chunks
+from delta.data.utils.vocabulary import iter_chunk_lines
 
 
 def get_pre_process_text_ds(text, pipeline_func, num_parallel_calls, batch_size,):
@@ -63,14 +69,78 @@ def run_two_sentence(text_t, batch_num, session_conf):
   text_after_arr_l_r = np.concatenate(text_after_left_right, axis=0)
   return text_after_arr_l_r
 
-def process_vocab(vocab_file_path, data, vocab, min_frequency=0):
-  """Process vocab"""
-  for line in data:
-    for word in line.split():
-      vocab.add(word)
-  if min_frequency > 0:
-    vocab.trim(min_frequency)
-  save_vocabs(vocab.mapping, vocab_file_path)
+def iter_chunks(iterable, chunk_size):
+  """Yield lists of at most chunk_size items of iterable."""
+  chunk = []
+  for item in iterable:
+    chunk.append(item)
+    if len(chunk) == chunk_size:
+      yield chunk
+      chunk = []
+  if chunk:
+    yield chunk
+
+
+class PreProcessRunner:
+  """
+  Run pipeline_func on chunks of sentences,
+    the graph and session are built once and fed by placeholders.
+  """
+
+  # pylint: disable=too-many-arguments
+  def __init__(self, pipeline_func, num_parallel_calls, batch_size,
+               session_conf, num_inputs=1):
+    self._graph = tf.Graph()
+    self._text_phs = []
+    self._initializers = []
+    self._next_batches = []
+    with self._graph.as_default():
+      for _ in range(num_inputs):
+        text_ph = tf.placeholder(tf.string, shape=[None])
+        text_ds = tf.data.Dataset.from_tensor_slices(text_ph)
+        text_ds = text_ds.map(
+            pipeline_func, num_parallel_calls=num_parallel_calls)
+        text_ds = text_ds.batch(batch_size)
+        iterator = text_ds.make_initializable_iterator()
+        self._text_phs.append(text_ph)
+        self._initializers.append(iterator.initializer)
+        self._next_batches.append(iterator.get_next())
+      table_init = tf.tables_initializer()
+    self._graph.finalize()
+    self._sess = tf.Session(graph=self._graph, config=session_conf)
+    self._sess.run(table_init)
+
+  def __call__(self, *texts):
+    """Pre-processed sentences of each input, as lists of str."""
+    outputs = [[] for _ in texts]
+    if not texts[0]:
+      return outputs
+    feed_dict = dict(zip(self._text_phs, texts))
+    self._sess.run(self._initializers, feed_dict=feed_dict)
+    while True:
+      try:
+        batches = self._sess.run(self._next_batches)
+      except tf.errors.OutOfRangeError:
+        break
+      for output, batch in zip(outputs, batches):
+        output.extend(one_line.decode("utf-8") for one_line in batch)
+    return outputs
+
+  def close(self):
+    """Close session."""
+    self._sess.close()
+
+
+def process_vocab(vocab_file_path, data, vocab, min_frequency=0,
+                  max_size=None):
+  """Process vocab, data: iterable of lines or a token counter"""
+  if not isinstance(data, collections.Counter):
+    data = count_tokens(data)
+  vocab.update(data)
+  if min_frequency > 0 or max_size is not None:
+    vocab.trim(min_frequency, max_size)
+  logging.info("Saving vocab to {}".format(vocab_file_path))
+  vocab.save(vocab_file_path)
 
 
 def save_vocabs(vocabs, vocab_file_path):
@@ -112,10 +182,24 @@ def get_vocab_size(vocab_file_path):
 
 
 def prepare_vocab(vocab_file_path, text, min_frequency=1,
-                  use_default_dict=True):
+                  use_default_dict=True, max_size=None):
   """Prepare vocab"""
   text_vocab = Vocabulary(use_default_dict=use_default_dict)
-  process_vocab(vocab_file_path, text, text_vocab, min_frequency=min_frequency)
+  process_vocab(vocab_file_path, text, text_vocab, min_frequency=min_frequency,
+                max_size=max_size)
+
+
+# pylint: disable=too-many-arguments
+def prepare_vocab_from_files(vocab_file_path, paths, column=None,
+                             min_frequency=1, use_default_dict=True,
+                             max_size=None, num_workers=0):
+  """Prepare vocab from files without loading them,
+     column: count only the column-th field of tab separated lines"""
+  counter = count_files(paths, column=column, num_workers=num_workers)
+  logging.info("Counted {} tokens from {} files".format(len(counter),
+                                                        len(paths)))
+  prepare_vocab(vocab_file_path, counter, min_frequency=min_frequency,
+                use_default_dict=use_default_dict, max_size=max_size)
 
 
 def prepare_vocab_from_config(vocab_file_path, config):
@@ -125,58 +209,172 @@ def prepare_vocab_from_config(vocab_file_path, config):
   save_vocabs(label_config, vocab_file_path)
 
 
-def prepare_embedding(pre_train_emb_path, text_vocab_path, embedding_path):
-  """Prepare embedding"""
-  # pylint: disable=too-many-locals
-
-  if os.path.isfile(embedding_path):
-    os.remove(embedding_path)
-
-  # load pre_train model
-  logging.info("Loading embedding from {}".format(pre_train_emb_path))
-  emb_data = open(pre_train_emb_path, encoding='utf-8', mode='r')
+def parse_embedding_chunk(chunk, words=None):
+  """
+  Parse a (path, start, end) chunk of a word2vec/GloVe text file.
+    words: keep only these words, None to keep all
+  Return: list of words, unit norm float32 vectors [num_words, emb_size]
+  """
+  chunk_words = []
+  fields = []
+  for i, line in enumerate(iter_chunk_lines(chunk)):
+    parts = line.strip().split(b' ')
+    # word2vec header: `num_words emb_size`
+    if len(parts) < 2 or (chunk[1] == 0 and i == 0 and len(parts) == 2):
+      continue
+    word = parts[0].decode('utf-8', errors='replace')
+    if words is not None and word not in words:
+      continue
+    if fields and len(parts) - 1 != len(fields[0]):
+      logging.warning("Skip vector of {}, size {} != {}".format(
+          word, len(parts) - 1, len(fields[0])))
+      continue
+    chunk_words.append(word)
+    fields.append(parts[1:])
+
+  if not fields:
+    return chunk_words, np.zeros([0, 0], dtype=np.float32)
+  vectors = np.array(fields, dtype=np.float64)
+  norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+  norms[norms == 0] = 1.0
+  return chunk_words, (vectors / norms).astype(np.float32)
+
+
+def _parse_embedding(pre_train_emb_path, words=None, num_workers=0):
+  """Yield parsed chunks of embedding file in file order."""
+  chunks = file_chunks([pre_train_emb_path])
+  parse_fn = functools.partial(parse_embedding_chunk, words=words)
+  if num_workers and len(chunks) > 1:
+    with mp.get_context('spawn').Pool(num_workers) as pool:
+      for result in pool.imap(parse_fn, chunks):
+        yield result
+  else:
+    for chunk in chunks:
+      yield parse_fn(chunk)
+
+
+def embedding_file_key(pre_train_emb_path, block_bytes=1 << 20):
+  """Key of embedding file, md5 of its whole content."""
+  md5 = hashlib.md5()
+  with open(pre_train_emb_path, 'rb') as in_f:
+    for block in iter(functools.partial(in_f.read, block_bytes), b''):
+      md5.update(block)
+  return md5.hexdigest()
+
+
+def convert_embedding(pre_train_emb_path, cache_prefix, num_workers=0):
+  """
+  Convert all vectors of an embedding text file to binary,
+    <cache_prefix>.words: `num_words emb_size` and one word per line
+    <cache_prefix>.vectors: float32 unit norm vectors
+  """
+  tmp = '.{}.tmp'.format(os.getpid())
+  all_words = []
+  emb_size = 0
+  with open(cache_prefix + '.vectors' + tmp, 'wb') as out_f:
+    for chunk_words, vectors in _parse_embedding(
+        pre_train_emb_path, num_workers=num_workers):
+      if not chunk_words:
+        continue
+      emb_size = emb_size or vectors.shape[1]
+      if vectors.shape[1] != emb_size:
+        logging.warning("Skip {} vectors of size {} != {}".format(
+            len(chunk_words), vectors.shape[1], emb_size))
+        continue
+      all_words.extend(chunk_words)
+      out_f.write(vectors.tobytes())
+  with open(cache_prefix + '.words' + tmp, 'w', encoding='utf-8') as out_f:
+    out_f.write("{} {}\n".format(len(all_words), emb_size))
+    for word in all_words:
+      out_f.write(word + "\n")
+  os.replace(cache_prefix + '.vectors' + tmp, cache_prefix + '.vectors')
+  os.replace(cache_prefix + '.words' + tmp, cache_prefix + '.words')
+  logging.info("Converted {} vectors to {}".format(len(all_words),
+                                                   cache_prefix))
+
+
+def load_converted_embedding(cache_prefix):
+  """Words and memory mapped vectors of `convert_embedding`."""
+  with open(cache_prefix + '.words', encoding='utf-8') as in_f:
+    num_words, emb_size = map(int, in_f.readline().split())
+    words = [line.rstrip('\n') for line in in_f]
+  assert len(words) == num_words, cache_prefix
+  if not num_words:
+    return words, np.zeros([0, emb_size], dtype=np.float32)
+  vectors = np.memmap(
+      cache_prefix + '.vectors',
+      dtype=np.float32,
+      mode='r',
+      shape=(num_words, emb_size))
+  return words, vectors
+
+
+def load_pre_train_embedding(pre_train_emb_path, words, cache_dir=None,
+                             num_workers=0):
+  """
+  Vectors of `words` in an embedding text file,
+    streamed in chunks, parsed in `num_workers` processes if it is set.
+  With cache_dir, the whole file is converted to binary once and
+    later runs read the binary, keyed by the content of the file.
+  Return: {word: unit norm float32 vector}, emb_size
+  """
+  words = set(words)
   emb_dict = {}
   emb_size = 0
-  line_num = 0
-  for line in emb_data.readlines():
-    line_num += 1
-    if line_num == 1:
-      continue
-    line = line.strip().split(' ')
-    word = line[0]
-    vector = [float(i) for i in line[1:]]
-    vector = vector / np.linalg.norm(vector)
-    emb_dict[word] = vector
-    emb_size = len(vector)
-  logging.info("Load {} vectors".format(line_num))
+  if cache_dir:
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_prefix = os.path.join(cache_dir,
+                                embedding_file_key(pre_train_emb_path))
+    if not os.path.exists(cache_prefix + '.words'):
+      convert_embedding(pre_train_emb_path, cache_prefix, num_workers)
+    logging.info("Loading converted embedding {}".format(cache_prefix))
+    all_words, vectors = load_converted_embedding(cache_prefix)
+    emb_size = vectors.shape[1]
+    # the last vector of a word wins
+    for i, word in enumerate(all_words):
+      if word in words:
+        emb_dict[word] = vectors[i]
+  else:
+    for chunk_words, vectors in _parse_embedding(pre_train_emb_path, words,
+                                                 num_workers):
+      if chunk_words:
+        emb_size = emb_size or vectors.shape[1]
+      for word, vector in zip(chunk_words, vectors):
+        emb_dict[word] = vector
+  logging.info("Load {} vectors of vocab".format(len(emb_dict)))
+  return emb_dict, emb_size
+
+
+def prepare_embedding(pre_train_emb_path, text_vocab_path, embedding_path,
+                      cache_dir=None, num_workers=0):
+  """
+  Prepare embedding, a float32 [vocab_size, emb_size] .npy matrix,
+    words not in pre-trained embedding are initialized randomly.
+  """
+  logging.info("Loading embedding from {}".format(pre_train_emb_path))
   # load text vocab
   vocabs = load_vocab_dict(text_vocab_path)
+  emb_dict, emb_size = load_pre_train_embedding(
+      pre_train_emb_path, vocabs, cache_dir=cache_dir, num_workers=num_workers)
 
   # get embedding vector for words in vocab
   vocab_size = len(vocabs)
-  emb_list = [[]] * vocab_size
   bound = np.sqrt(1.0) / np.sqrt(vocab_size)
+  emb_matrix = np.random.uniform(
+      -bound, bound, [vocab_size, emb_size]).astype(np.float32)
   count_exist = 0
-  count_not_exist = 0
-  word_id = 0
-
-  for word in vocabs:
-    try:
-      word_vector = emb_dict[word]
-    except Exception:  # pylint: disable=broad-except
-      word_vector = None
-
-    if word_vector is not None:
-      emb_list[word_id] = word_vector
+  for word_id, word in enumerate(vocabs):
+    if word in emb_dict:
+      emb_matrix[word_id] = emb_dict[word]
       count_exist += 1
-    else:
-      count_not_exist += 1
-      emb_list[word_id] = np.random.uniform(-bound, bound, emb_size)
-    word_id += 1
 
-  emb_list = np.array(emb_list)
   logging.info("embedding exist : {}, embedding not exist : {}".format(
-      count_exist, count_not_exist))
+      count_exist, vocab_size - count_exist))
   logging.info("embedding exist dump to: {}".format(embedding_path))
-  with open(embedding_path, mode='wb') as out_f:
-    pickle.dump(emb_list, out_f)
+  dirname = os.path.dirname(embedding_path)
+  if dirname and not os.path.exists(dirname):
+    os.makedirs(dirname)
+  tmp_path = embedding_path + '.{}.tmp'.format(os.getpid())
+  with open(tmp_path, mode='wb') as out_f:
+    np.save(out_f, emb_matrix)
+  os.replace(tmp_path, embedding_path)
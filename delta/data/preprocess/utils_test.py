@@ -0,0 +1,76 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+''' preprocess utils unittest '''
+import os
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+from delta import utils
+from delta.data.preprocess.utils import prepare_embedding
+
+
+class PrepareEmbeddingTest(tf.test.TestCase):
+  ''' prepare embedding unittest '''
+
+  def setUp(self):
+    ''' set up '''
+    self.tmpdir = tempfile.mkdtemp()
+    self.vectors = np.random.randn(100, 8)
+    self.emb_path = os.path.join(self.tmpdir, 'emb.txt')
+    with open(self.emb_path, 'w', encoding='utf-8') as out_f:
+      out_f.write('100 8\n')
+      for i, vector in enumerate(self.vectors):
+        out_f.write('w{} {}\n'.format(i, ' '.join(map(str, vector))))
+    self.vocab_path = os.path.join(self.tmpdir, 'vocab.txt')
+    with open(self.vocab_path, 'w', encoding='utf-8') as out_f:
+      for i, word in enumerate(['<pad>', 'w7', 'oov', 'w99', 'w0']):
+        out_f.write('{}\t{}\n'.format(word, i))
+
+  def test_prepare_embedding(self):
+    ''' vocab rows are unit norm pre-trained vectors, with or without cache '''
+    unit_vectors = self.vectors / np.linalg.norm(
+        self.vectors, axis=1, keepdims=True)
+    embedding_path = os.path.join(self.tmpdir, 'embedding.npy')
+    cache_dir = os.path.join(self.tmpdir, 'cache')
+    for kwargs in ({}, {'cache_dir': cache_dir}, {'cache_dir': cache_dir}):
+      prepare_embedding(self.emb_path, self.vocab_path, embedding_path,
+                        **kwargs)
+      embedding = utils.load_embedding(embedding_path)
+      self.assertEqual(embedding.dtype, np.float32)
+      self.assertAllEqual(embedding.shape, [5, 8])
+      self.assertAllClose(embedding[1], unit_vectors[7])
+      self.assertAllClose(embedding[3], unit_vectors[99])
+      self.assertAllClose(embedding[4], unit_vectors[0])
+    self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+    # a digit rewritten in the middle, of the same size
+    with open(self.emb_path, 'rb') as emb_f:
+      content = bytearray(emb_f.read())
+    pos = len(content) // 2
+    while not chr(content[pos]).isdigit():
+      pos += 1
+    content[pos] = ord('1') if content[pos] != ord('1') else ord('2')
+    with open(self.emb_path, 'wb') as emb_f:
+      emb_f.write(content)
+    prepare_embedding(self.emb_path, self.vocab_path, embedding_path,
+                      cache_dir=cache_dir)
+    self.assertEqual(len(os.listdir(cache_dir)), 4)
+
+
+if __name__ == '__main__':
+  tf.test.main()
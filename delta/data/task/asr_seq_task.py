@@ -21,6 +21,7 @@ from absl import logging
 
 from delta import utils
 from delta.data.utils import espnet_utils
+from delta.data.utils import espnet_manifest
 
 from delta.utils.register import registers
 from delta.data.task.base_speech_task import SpeechTask
@@ -35,9 +36,19 @@ class AsrSeqTask(SpeechTask):
 
   def __init__(self, config, mode):
     super().__init__(config, mode)
+    self.mode = mode
     self.dummy = config['data']['task']['dummy']
     self.batch_mode = config['data']['task']['batch_mode']
     self.batch_size = config['solver']['optimizer']['batch_size']
+    # non batch mode: batches of utts under a frames budget
+    budgetconf = config['data']['task'].get('budget_batch') or {}
+    self.budget_batch = not self.batch_mode and budgetconf.get('enable', False)
+    self.sort_window = budgetconf.get('sort_window', 100) * self.batch_size
+    self._epoch = 0
+    # threads loading batches ahead, without generator workers
+    self.loader_threads = config['data']['task'].get('loader_threads', 0)
+    self.collator = espnet_utils.BatchCollator(
+        reuse_buffer=config['data']['task'].get('reuse_batch_buffer', False))
     # get batches form data path
     if self.dummy:
       self._feat_shape = [40]
@@ -84,6 +95,9 @@ class AsrSeqTask(SpeechTask):
     steps = None
     if self.batch_mode:
       steps = len(self.batches)
+    elif self.budget_batch:
+      # batches of an epoch differ a little with the shuffle
+      steps = len(self.make_budget_batches())
     else:
       batch_size = self._config['solver']['optimizer']['batch_size']
       steps = int(self.n_utts / batch_size)
@@ -95,49 +109,83 @@ class AsrSeqTask(SpeechTask):
   def generate_cmvn(self, paths):
     pass
 
-  def generate_data(self):  #pylint: disable=too-many-locals
+  def __getstate__(self):
+    state = super().__getstate__()
+    # file handles of converter are reopened by generator workers
+    state['_converter'] = None
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._converter = espnet_utils.ASRConverter(self.config)
+
+  def make_budget_batches(self, epoch=0):
     '''
+    batches of all utts under `batch_bins` and `batch_frames_*` budget,
+      utts in train mode are shuffled by `epoch` and sorted by frames in
+      each window of `sort_window` utts, and the batches are shuffled
+    '''
+    rng, window = None, 0
+    if self.mode == utils.TRAIN:
+      rng = np.random.RandomState(epoch)
+      window = self.sort_window
+    budget = espnet_utils.batch_budget(self.config)
+
+    if isinstance(self.batches[0], espnet_manifest.ManifestBatch):
+      # lengths from the columns of binary manifest
+      manifest = self.batches[0].manifest
+      indices = np.concatenate([batch.indices for batch in self.batches])
+      batches = espnet_utils.budget_batch_indices(
+          manifest.ilens[indices],
+          manifest.olens[indices],
+          self.feat_shape[0],
+          self.vocab_size,
+          self.batch_size,
+          window=window,
+          rng=rng,
+          **budget)
+      return [manifest.batch(indices[batch]) for batch in batches]
+
+    utts = [utt for batch in self.batches for utt in batch]
+    return espnet_utils.budget_batches(
+        utts, self.batch_size, window=window, rng=rng, **budget)
+
+  def generate_item(self, item):
+    '''
+        :param item: one batch of metas
         :return: feat, feat_len, target, terget_len
         '''
-    if self.batch_mode:
-      for batch in self.batches:
-        srcs, ilens, tgts, olens = self.converter(batch)
-
-        imax = max(ilens)
-        omax = max(olens)
-        batch_feat = []
-        batch_target = []
-        for i in range(len(srcs)):
-          #pad feat
-          ipad_len = imax - srcs[i].shape[0]
-          feat = np.pad(
-              srcs[i],
-              pad_width=((0, ipad_len), (0, 0)),
-              mode='constant',
-              constant_values=0)
-
-          #pad target
-          opad_len = omax - tgts[i].shape[0]
-          target = np.pad(
-              tgts[i],
-              pad_width=(0, opad_len),
-              mode='constant',
-              constant_values=0)
-
-          batch_feat.append(feat)
-          batch_target.append(target)
-
-        batch_feat = np.stack(batch_feat).astype(np.float32)
-        batch_target = np.stack(batch_target).astype(np.int64)
-        ilens = np.array(ilens).astype(np.int64)
-        olens = np.array(ilens).astype(np.int64)
-
-        yield batch_feat, ilens, batch_target, olens
+    return self.make_examples(self.converter(item))
+
+  def make_examples(self, converted):
+    '''
+        :param converted: srcs, ilens, tgts, olens of one batch by converter
+        :return: feat, feat_len, target, terget_len
+        '''
+    srcs, ilens, tgts, olens = converted
+    if self.batch_mode or self.budget_batch:
+      yield self.collator(srcs, tgts)
     else:
-      for batch in self.batches:
-        srcs, ilens, tgts, olens = self.converter(batch)
-        for i in range(len(srcs)):
-          yield srcs[i], ilens[i], tgts[i], olens[i]
+      for i in range(len(srcs)):
+        yield srcs[i], ilens[i], tgts[i], olens[i]
+
+  def generate_data(self):
+    '''
+        :return: feat, feat_len, target, terget_len
+        '''
+    batches = self.batches
+    if self.budget_batch:
+      batches = self.make_budget_batches(self._epoch)
+      self._epoch += 1
+    if self.generator_workers or not self.loader_threads:
+      for example in self.item_generator(batches):
+        yield example
+      return
+
+    # load next batches while making examples
+    for converted in self.converter.iterate(batches, self.loader_threads):
+      for example in self.make_examples(converted):
+        yield example
 
   def feature_spec(self, batch_size_):  # pylint: disable=arguments-differ
     '''
@@ -155,7 +203,7 @@ class AsrSeqTask(SpeechTask):
       logging.info("Dummy data: batch size {} time {}".format(batch_size, time))
 
     types = (tf.float32, tf.int32, tf.int32, tf.int32)
-    if self.batch_mode or self.dummy:
+    if self.batch_mode or self.budget_batch or self.dummy:
       # batch of examples
       shapes = (
           # input
@@ -228,12 +276,16 @@ class AsrSeqTask(SpeechTask):
           output_types=types,
           output_shapes=shapes)
 
-      if mode == utils.TRAIN:
+      if self.budget_batch:
+        # batches are shuffled by `generate_data` of each epoch
+        if mode == utils.TRAIN:
+          ds = ds.repeat(count=epoch)
+      elif mode == utils.TRAIN:
         ds = ds.apply(
             tf.data.experimental.shuffle_and_repeat(
                 buffer_size=100 * batch_size, count=epoch, seed=None))
 
-      if not self.batch_mode:
+      if not self.batch_mode and not self.budget_batch:
         ds = ds.padded_batch(
             batch_size,
             padded_shapes=shapes,
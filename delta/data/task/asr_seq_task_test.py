@@ -285,6 +285,51 @@ class AsrSeqTaskTest(tf.test.TestCase):
           self.assertEqual(len(features['targets'].shape), 2)
           self.assertEqual(len(features['target_length'].shape), 1)
 
+  def test_loader_threads(self):
+    task_name = self.config['data']['task']['name']
+    self.config['data']['task']['batch_mode'] = True
+    self.config['data']['task']['dummy'] = False
+    for loader_threads in (0, 2):
+      self.config['data']['task']['loader_threads'] = loader_threads
+      task = registers.task[task_name](self.config, self.mode)
+      nutts = 0
+      for feats, src_lens, targets, tgt_lens in task.generate_data():
+        self.assertEqual(feats.shape[:2], (len(src_lens), 100))
+        self.assertAllEqual(src_lens, [100] * len(src_lens))
+        self.assertEqual(targets.shape, (len(src_lens), 4))
+        self.assertAllEqual(tgt_lens, [4] * len(src_lens))
+        nutts += len(src_lens)
+      self.assertEqual(nutts, 10)
+
+  def test_budget_batch(self):
+    task_name = self.config['data']['task']['name']
+    self.config['data']['task']['batch_mode'] = False
+    self.config['data']['task']['dummy'] = False
+    self.config['data']['task']['budget_batch'] = {
+        'enable': True,
+        'sort_window': 2
+    }
+    # 100 frames of each utt
+    self.config['solver']['optimizer']['batch_frames_in'] = 250
+    task = registers.task[task_name](self.config, self.mode)
+    self.assertEqual(task.steps_per_epoch, 5)
+
+    nutts = 0
+    for feats, src_lens, targets, tgt_lens in task.generate_data():
+      self.assertDTypeEqual(feats, np.float32)
+      self.assertEqual(feats.shape, (2, 100, 40))
+      self.assertAllEqual(src_lens, [100, 100])
+      self.assertEqual(targets.shape, (2, 4))
+      self.assertEqual(len(tgt_lens), 2)
+      nutts += len(feats)
+    self.assertEqual(nutts, 10)
+
+    with self.session():
+      for features, _ in task.dataset(self.mode, self.batch_size, epoch=2):
+        self.assertDTypeEqual(features['inputs'], np.float32)
+        self.assertEqual(len(features['inputs'].shape), 3)
+        self.assertLessEqual(features['inputs'].shape[0], 2)
+
   def test_dummy_dataset(self):
     for batch_mode in [True, False]:
       task_name = self.config['data']['task']['name']
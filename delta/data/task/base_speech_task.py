@@ -14,9 +14,13 @@
 # limitations under the License.
 # ==============================================================================
 ''' Base Speech Task'''
+import random
+from absl import logging
+
 from delta import utils
 from delta.data import utils as data_utils
 from delta.data.task.base_task import WavSpeechTask
+from delta.data.utils.parallel_generator import ParallelGenerator
 
 #pylint: disable=abstract-method
 
@@ -27,6 +31,64 @@ class SpeechTask(WavSpeechTask):
   def __init__(self, config, mode):
     super().__init__(config)
     assert mode in (utils.TRAIN, utils.EVAL, utils.INFER)
+    self._parallel_generator = None
+    # (num of shards, index) of the data read by this worker
+    self._shard = (1, 0)
+
+  def __getstate__(self):
+    ''' state copied to generator workers '''
+    state = self.__dict__.copy()
+    state['_parallel_generator'] = None
+    return state
+
+  @property
+  def generator_workers(self):
+    ''' num of processes running `generate_item`, 0 for the host thread '''
+    return self.config['data']['task'].get('generator_workers', 0)
+
+  def set_shard(self, mode):
+    ''' each worker reads a shard of the train data in multi-worker training '''
+    self._shard = utils.worker_shard() if mode == utils.TRAIN else (1, 0)
+    if self._shard[0] > 1:
+      logging.info("Read shard {1} of {0} of train data".format(*self._shard))
+
+  def shard_items(self, items, key=None):
+    '''
+    items of the shard of this worker. Items are sorted by `key` so that
+      the shards of workers are disjoint, then the shard is shuffled,
+      not to read the data in sorted order.
+    '''
+    num_shards, index = self._shard
+    if num_shards == 1:
+      return items
+    shard = sorted(items, key=key)[index::num_shards]
+    random.shuffle(shard)
+    return shard
+
+  def generate_item(self, item):
+    ''' yield examples of one item of data '''
+    raise NotImplementedError()
+
+  def item_generator(self, items):
+    '''
+    yield examples of `items` by `generate_item`,
+      in `generator_workers` processes if it is set
+    '''
+    if not self.generator_workers:
+      for item in items:
+        for example in self.generate_item(item):
+          yield example
+      return
+
+    if self._parallel_generator is None:
+      taskconf = self.config['data']['task']
+      self._parallel_generator = ParallelGenerator(
+          self,
+          num_workers=self.generator_workers,
+          queue_depth=taskconf.get('generator_queue_depth', 8),
+          slab_bytes=taskconf.get('generator_slab_mb', 16) << 20)
+    for example in self._parallel_generator(items):
+      yield example
 
   #pylint: disable=arguments-differ
   def input_fn(self, mode, batch_size, num_epoch=None):
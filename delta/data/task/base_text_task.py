@@ -15,6 +15,7 @@
 # ==============================================================================
 """Base task for NLP."""
 
+import tensorflow as tf
 from absl import logging
 
 from delta.data.task.base_task import Task
@@ -31,6 +32,7 @@ class TextTask(Task):
     super().__init__(config)
     self.all_modes = [utils.TRAIN, utils.EVAL, utils.INFER]
     assert mode in self.all_modes
+    self.mode = mode
     self.preparer = None
     self.use_preparer = True
 
@@ -41,6 +43,72 @@ class TextTask(Task):
 
     return _input_fn
 
+  def bucket_batch_sizes(self, boundaries):
+    """
+    Batch size of each length bucket, from `bucket.batch_sizes` or
+    `bucket.token_budget` tokens over the max length of the bucket.
+    """
+    task_config = self.config['data']['task']
+    bucket_config = task_config['bucket']
+    max_lens = list(boundaries) + [task_config['max_seq_len'] + 1]
+    token_budget = bucket_config.get('token_budget')
+    if token_budget:
+      return [max(token_budget // (max_len - 1), 1) for max_len in max_lens]
+    batch_sizes = bucket_config.get('batch_sizes')
+    if batch_sizes:
+      if len(batch_sizes) != len(max_lens):
+        raise ValueError("bucket batch_sizes should have {} values, "
+                         "got {}".format(len(max_lens), len(batch_sizes)))
+      return batch_sizes
+    return [task_config['batch_size']] * len(max_lens)
+
+  def use_bucket(self, mode):
+    """Length bucketing is done only for training, other modes keep order."""
+    bucket_config = self.config['data']['task'].get('bucket')
+    return mode == utils.TRAIN and bool(bucket_config) and \
+      bucket_config.get('enable', False)
+
+  def batch_dataset(self, data_set, feature_shape, length_fn, trim_fn):
+    """
+    Batch the data set to `batch_size`, or in bucket mode,
+    batch examples of similar lengths and trim each batch to the max
+    length of it.
+      length_fn: length of an example.
+      trim_fn: (batch, max_len) -> batch of `max_len` steps.
+    """
+    task_config = self.config['data']['task']
+    if not self.use_bucket(self.mode):
+      return data_set.padded_batch(
+          batch_size=task_config['batch_size'], padded_shapes=feature_shape)
+
+    max_seq_len = task_config['max_seq_len']
+    boundaries = task_config['bucket'].get('boundaries')
+    if not boundaries:
+      # powers of 2
+      boundaries = [8]
+      while boundaries[-1] * 2 <= max_seq_len:
+        boundaries.append(boundaries[-1] * 2)
+    batch_sizes = self.bucket_batch_sizes(boundaries)
+    logging.info("bucket boundaries: {}, batch sizes: {}".format(
+        boundaries, batch_sizes))
+
+    def _element_length(*example):
+      return tf.cast(length_fn(*example), tf.int32)
+
+    data_set = data_set.apply(
+        tf.data.experimental.bucket_by_sequence_length(
+            _element_length,
+            boundaries,
+            batch_sizes,
+            padded_shapes=feature_shape))
+
+    def _trim(*batch):
+      max_len = tf.maximum(tf.reduce_max(_element_length(*batch)), 1)
+      return trim_fn(batch, max_len)
+
+    return data_set.map(
+        _trim, num_parallel_calls=task_config['num_parallel_calls'])
+
   def preprocess_batch(self, batch):
     """
     Pre-process batch.
@@ -63,7 +63,93 @@ class KwsClsTask(SpeechTask):
   def generate_cmvn(self, paths):
     ''' generate cmvn '''
 
-  #pylint: disable=too-many-locals
+  @staticmethod
+  def read_feat(path):
+    '''
+    read HTK feature file, header is big-endian
+      (num_frames, period, frame_bytes, kind), body is big-endian float32.
+    return: memory mapped array of shape [num_frames, feat_dim]
+    '''
+    with open(path, 'rb') as fp_feat:
+      # read file header, frame_bytes is 160 Bytes, 40 dimensions
+      num_frames, _, frame_bytes, _ = struct.unpack('!%di%dh' % (2, 2),
+                                                    fp_feat.read(12))
+    del num_frames
+    # (570485, 40) (frame_num, feat_dim)
+    return np.memmap(
+        path, dtype='>f4', mode='r', offset=12).reshape(
+            (-1, int(frame_bytes / 4)))
+
+  @staticmethod
+  def read_label(path):
+    ''' label is 0 ~ 8, one int32 label per frame '''
+    with open(path, 'rb') as fp_label:
+      return np.frombuffer(fp_label.read(), dtype=np.int32)
+
+  @staticmethod
+  def window_labels(label_arr, window_len, window_shift, num_keyword_labels=8):
+    '''
+    select windows and label them, using per window label counts from
+    cumulative sums instead of np.unique on every window.
+    return:
+      starts: start frame of kept windows
+      labels: 1 if window covers all keyword labels, else 0
+    '''
+    length = len(label_arr) - window_len
+    starts = np.arange(0, max(length, 0), window_shift)
+    if not starts.size:
+      return starts, starts
+
+    # presence[v, i]: whether label `v` appears in window `i`
+    values = np.unique(label_arr)
+    presence = np.zeros([len(values), len(starts)], dtype=np.bool_)
+    for i, value in enumerate(values):
+      counts = np.concatenate(([0], np.cumsum(label_arr == value)))
+      presence[i] = counts[starts + window_len] > counts[starts]
+
+    num_unique = presence.sum(axis=0)
+    keep = (num_unique <= 2) | (num_unique >= 8)
+    if -1 in values:
+      # reduce the ratio of negative samples
+      keep &= ~presence[np.searchsorted(values, -1)]
+
+    # including keyword
+    keyword = np.ones([len(starts)], dtype=np.bool_)
+    for value in range(0, num_keyword_labels):
+      if value in values:
+        keyword &= presence[np.searchsorted(values, value)]
+      else:
+        keyword[:] = False
+    return starts[keep], keyword[keep].astype(np.int32)
+
+  def generate_item(self, item):
+    ''' generate windows of one (feat file, label file) '''
+    feat_path, label_path = item
+    feat_matrix = self.read_feat(feat_path)
+    label_arr = self.read_label(label_path)  # 570485
+
+    starts, labels = self.window_labels(label_arr, self.window_len,
+                                        self.window_shift)
+    if not starts.size:
+      return
+
+    # delta and cmvn of the whole file, then slice windows
+    feat = feat_matrix.astype(np.float32)
+    _, feat = self.reader.add_delta(feat, self.delta_order, self.delta_wind)
+    # cmvn is 120 lines, each line has mean and variance
+    _, feat = self.reader.normalization_feat_by_mean_variance(
+        feat, self.cmvn_path)
+    feat = feat.astype(np.float32)
+    if self.splice_frame:
+      # strided view of [frames, context, dim], each window is spliced
+      # when reshaped, instead of copying the spliced whole file
+      _, feat = self.reader.splice_frames_view(feat, self.left_context,
+                                               self.right_context)
+
+    for start, label in zip(starts, labels):
+      window = feat[start:start + self.window_len]
+      yield window.reshape([len(window), -1]), label
+
   def generate_data(self):
     '''
     train.list file:
@@ -74,52 +160,11 @@ class KwsClsTask(SpeechTask):
       /path/to/train.7.label
       ./train.7.desc
     '''
-
-    for i in range(0, len(self.lines), 3):
-      fp_feat = open(self.lines[i].strip(), 'rb')
-      buff = open(self.lines[i + 1].strip(), 'rb').read()
-      # label is 0 ~ 8,
-      # one label per frame
-      label_arr = struct.unpack('%di' % (len(buff) / 4), buff)  # 570485
-      #desc_lines = open(self.lines[i + 2].strip()).readlines()[1:]
-
-      # read file header, frame_bytes is 160 Bytes, 40 dimensions
-      num_frames, _, frame_bytes, _ = struct.unpack('!%di%dh' % (2, 2),
-                                                    fp_feat.read(12))
-      del num_frames
-      buff = fp_feat.read()  # file body
-      fp_feat.close()
-
-      # ! means converting Big-Endian to Little-Endian
-      feat_all = struct.unpack('!%df' % (len(buff) / 4), buff)
-      feat_matrix = np.array(feat_all).reshape(
-          (-1, int(frame_bytes / 4)))  # (570485, 40) (frame_num, feat_dim)
-
-      #num, bad = 0, 0
-      length = feat_matrix.shape[0] - self.window_len  #  281508
-      for j in range(0, length, self.window_shift):
-        label_t = np.unique(label_arr[j:j + self.window_len])
-        if -1 in label_t:
-          # reduce the ratio of negative samples
-          continue
-        if len(label_t) > 2 and len(label_t) < 8:
-          continue
-
-        feat = feat_matrix[j:j + self.window_len]
-        _, feat = self.reader.add_delta(feat, self.delta_order, self.delta_wind)
-        # cmvn is 120 lines, each line has mean and variance
-        _, feat = self.reader.normalization_feat_by_mean_variance(
-            feat, self.cmvn_path)
-        if self.splice_frame:
-          _, feat = self.reader.splice_frames(feat, self.left_context,
-                                              self.left_context)
-        if set(label_t).issuperset(range(0, 8)):
-          # including keyword
-          label = 1
-        else:
-          label = 0
-
-        yield feat, label
+    #desc_lines = open(self.lines[i + 2].strip()).readlines()[1:]
+    items = self.shard_items([(self.lines[i].strip(), self.lines[i + 1].strip())
+                              for i in range(0, len(self.lines), 3)])
+    for example in self.item_generator(items):
+      yield example
 
   def feature_spec(self):
     ''' data meta'''
@@ -135,6 +180,7 @@ class KwsClsTask(SpeechTask):
   #pylint: disable=arguments-differ
   def dataset(self, mode, batch_size, epoch):
     ''' make tf dataset'''
+    self.set_shard(mode)
     shapes, types = self.feature_spec()
     ds = tf.data.Dataset.from_generator(  #pylint: disable=invalid-name
         generator=lambda: self.generate_data(),  #pylint: disable=unnecessary-lambda
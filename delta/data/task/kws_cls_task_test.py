@@ -16,11 +16,13 @@
 ''' kws task unittest'''
 import os
 from pathlib import Path
+import numpy as np
 import tensorflow as tf
 from absl import logging
 
 from delta import utils
 from delta.utils.register import registers
+from delta.data.task.kws_cls_task import KwsClsTask
 
 
 class KwsClsTaskTest(tf.test.TestCase):
@@ -53,6 +55,35 @@ class KwsClsTaskTest(tf.test.TestCase):
   def tearDown(self):
     ''' tear down '''
 
+  def test_window_labels(self):
+    ''' window selection and label unittest'''
+    window_len, window_shift = 10, 5
+    # keyword, negative, filler and mixed windows
+    label_arr = np.concatenate([
+        np.arange(10),
+        np.full([10], -1),
+        np.full([10], 8),
+        np.array([8, 8, 8, 1, 2, 3, 8, 8, 8, 8]),
+        np.full([10], 8),
+    ]).astype(np.int32)
+
+    starts, labels = KwsClsTask.window_labels(label_arr, window_len,
+                                              window_shift)
+
+    starts_true, labels_true = [], []
+    for j in range(0, len(label_arr) - window_len, window_shift):
+      label_t = np.unique(label_arr[j:j + window_len])
+      if -1 in label_t:
+        continue
+      if len(label_t) > 2 and len(label_t) < 8:
+        continue
+      starts_true.append(j)
+      labels_true.append(int(set(label_t).issuperset(range(0, 8))))
+
+    self.assertAllEqual(starts, starts_true)
+    self.assertAllEqual(labels, labels_true)
+    self.assertEqual(labels[0], 1)
+
   def test_dataset(self):
     ''' dataset unittest'''
     pass
@@ -16,6 +16,8 @@
 ''' Speaker Classification. '''
 import os
 import random
+import itertools
+import collections
 import multiprocessing as mp
 from pathlib import Path
 from absl import logging
@@ -26,6 +28,7 @@ import kaldiio
 from delta import utils
 from delta.utils.register import registers
 from delta.data.task.base_speech_task import SpeechTask
+from delta.data.utils.parallel_generator import ParallelGenerator
 
 #pylint: disable=too-many-instance-attributes
 #pylint: disable=too-many-arguments
@@ -80,17 +83,83 @@ class SpeakerMetaData():
       self.utts[utt_key] = utt
 
 
+def ark_sort_key(ark_offset):
+  ''' (ark path, offset) of `path.ark:offset[slices]`, the storage order. '''
+  ark_name = ark_offset.split('[', 1)[0]
+  ark, _, offset = ark_name.rpartition(':')
+  if ark and offset.isdigit():
+    return ark, int(offset)
+  return ark_name, 0
+
+
+def block_shuffle(keys, sort_key, block_size):
+  '''
+  Sort keys in storage order, then shuffle blocks of `block_size`
+  consecutive keys, so reads inside a block are sequential.
+  '''
+  keys = sorted(keys, key=sort_key)
+  blocks = [keys[i:i + block_size] for i in range(0, len(keys), block_size)]
+  random.shuffle(blocks)
+  return list(itertools.chain.from_iterable(blocks))
+
+
+# pid -> {ark path: file object}, handles inherited by fork share offsets
+_ARK_HANDLES = {}
+
+
+class ArkReader():
+  '''
+  Load Kaldi matrices of `path.ark:offset`, keeping open handles per ark.
+  Handles are shared by readers of a process, at most `max_handles`
+  of the recently used arks are kept open.
+  '''
+
+  def __init__(self, max_handles=64):
+    self.max_handles = max_handles
+
+  @staticmethod
+  def _handles():
+    ''' Open handles of this process. '''
+    pid = os.getpid()
+    if pid not in _ARK_HANDLES:
+      _ARK_HANDLES.clear()
+      _ARK_HANDLES[pid] = collections.OrderedDict()
+    return _ARK_HANDLES[pid]
+
+  def load(self, ark_offset):
+    ''' Load matrix of `ark_offset`. '''
+    handles = self._handles()
+    ark, _ = ark_sort_key(ark_offset)
+    if ark in handles:
+      handles.move_to_end(ark)
+    mat = kaldiio.load_mat(ark_offset, fd_dict=handles)
+    while len(handles) > self.max_handles:
+      _, fd = handles.popitem(last=False)
+      fd.close()
+    return mat
+
+  @staticmethod
+  def close():
+    ''' Close handles of this process. '''
+    handles = ArkReader._handles()
+    while handles:
+      _, fd = handles.popitem()
+      fd.close()
+
+
 class ChunkSampler():
   ''' Produce samples from utterance. '''
 
-  def __init__(self, chunk_size):
+  def __init__(self, chunk_size, reader=None):
     '''
       Args:
       chunk_size: fixed chunk size in frames.
       pad_chunks: whether to zero pad chunks.
+      reader: ArkReader of features and vads.
     '''
     self.chunk_size = chunk_size
     self.pad_chunks = True
+    self.reader = reader or ArkReader()
 
   def set_chunk_size(self, chunk_size):
     ''' Set chunk size. '''
@@ -113,9 +182,9 @@ class ChunkSampler():
 
     # Load features and select voiced frames.
     feat_scp = utt_meta['feat']
-    feat_mat = kaldiio.load_mat(feat_scp)
+    feat_mat = self.reader.load(feat_scp)
     vad_scp = utt_meta['vad']
-    vad_mat = kaldiio.load_mat(vad_scp)
+    vad_mat = self.reader.load(vad_scp)
     num_frames_feat, feat_dim = feat_mat.shape
     num_frames_vad = vad_mat.shape[0]
     logging.debug('feat_mat: %s, vad_mat: %s' %
@@ -157,6 +226,11 @@ class ChunkSampler():
     # imap mode
     return results
 
+  def utt_samples(self, utt_info):
+    ''' Yield samples of (utt_key, utt_meta). '''
+    for sample in self.utt_to_samples((None, utt_info)) or []:
+      yield sample
+
 
 class DataQueueAsync():
   ''' Sample from raw data. '''
@@ -215,56 +289,69 @@ class ManagerQueueDataQueue(DataQueueAsync):
 
 class ImapUnorderedDataQueue(DataQueueAsync):
   '''
-  Use async imap() calls to fetch partial results.
+  Sample in worker processes, samples are passed back through a ring of
+  shared memory slabs, only slab indices go through pipes.
   Much faster than the Manager-based one.
   '''
 
-  def __init__(self, meta, sampler, num_processes=None, max_qsize=20):
+  #pylint: disable=too-many-arguments
+  def __init__(self,
+               meta,
+               sampler,
+               num_processes=None,
+               max_qsize=20,
+               block_size=None,
+               slab_bytes=16 << 20,
+               keys=None):
+    '''
+    Params:
+      max_qsize: number of slabs, results in flight are bounded by it.
+      block_size: utts read in storage order by one worker,
+        None to shuffle utts globally.
+      slab_bytes: bytes of one slab.
+      keys: utt keys to read, all utts of meta if None.
+    '''
     super().__init__(meta, sampler, num_processes, max_qsize)
     self.meta = meta
     self.meta_keys = []
-    self.meta_keys_pointer = 0
-    self.end_of_inputs = False
+    self.keys = keys
     self.sampler = sampler
-    self.pool = None
-    self.pool_chunk_size = 1000
-    self.pool_res = None
-    self.num_processes = num_processes
+    self.block_size = block_size
+    self.generator = ParallelGenerator(
+        sampler,
+        method='utt_samples',
+        num_workers=num_processes or os.cpu_count(),
+        queue_depth=max_qsize,
+        slab_bytes=slab_bytes,
+        chunk_size=block_size or 100)
 
   def start(self):
     ''' Start sampling async. '''
-    self.pool = mp.Pool(self.num_processes)
-    self.meta_keys = list(self.meta.utts.keys())
-    logging.info('Shuffling utt keys ...')
-    random.shuffle(self.meta_keys)
-
-  def next_chunk(self):
-    ''' Return an iterator of next chunk of utterances. '''
-    for index in range(self.meta_keys_pointer,
-                       self.meta_keys_pointer + self.pool_chunk_size):
-      if index < len(self.meta_keys):
-        utt_key = self.meta_keys[index]
-        utt_meta = self.meta.utts[utt_key]
-        yield (utt_key, utt_meta)
-      else:
-        self.end_of_inputs = True
-    self.meta_keys_pointer = index + 1
+    self.meta_keys = list(
+        self.keys if self.keys is not None else self.meta.utts.keys())
+    if self.block_size:
+      logging.info('Shuffling utt blocks ...')
+      self.meta_keys = block_shuffle(
+          self.meta_keys,
+          lambda key: ark_sort_key(self.meta.utts[key]['feat']),
+          self.block_size)
+    else:
+      logging.info('Shuffling utt keys ...')
+      random.shuffle(self.meta_keys)
+    self.generator.start()
 
-  def append_requests(self):
-    ''' Append some requests to pool. '''
-    pool_args = [(None, x) for x in self.next_chunk()]
-    self.pool_res = self.pool.imap_unordered(
-        self.sampler.utt_to_samples, pool_args, chunksize=100)
+  def close(self):
+    ''' Stop and join worker processes. '''
+    self.generator.close()
 
   def get_items(self):
     ''' Get a generator of results. '''
-    while True:
-      self.append_requests()
-      for item in self.pool_res:
-        yield item
-      if self.end_of_inputs:
-        break
-    self.pool.close()
+    items = [(key, self.meta.utts[key]) for key in self.meta_keys]
+    try:
+      for samples in self.generator.batches(items):
+        yield samples
+    finally:
+      self.close()
 
 
 @registers.task.register
@@ -299,7 +386,12 @@ class SpeakerClsTask(SpeechTask):
     logging.info('Loading meta data ...')
     self.load_meta_data()
 
-    self.sampler = ChunkSampler(self.chunk_size_frames)
+    self.sampler = ChunkSampler(
+        self.chunk_size_frames,
+        ArkReader(self.taskconf['audio'].get('ark_max_handles', 64)))
+    # utts read sequentially per block, blocks are shuffled,
+    # samples are shuffled by buffer in `dataset`
+    self.block_size = self.taskconf['audio'].get('block_size', 100)
 
   def load_meta_data(self):
     ''' Load meta data. '''
@@ -353,7 +445,7 @@ class SpeakerClsTask(SpeechTask):
     ''' Test kaldiio's functions. '''
 
     def load_func(ark_offset):
-      return kaldiio.load_mat(ark_offset)
+      return self.sampler.reader.load(ark_offset)
 
     for utt in self.meta.utt2feat:
       ark_offset = self.meta.utt2feat[utt]
@@ -402,6 +494,21 @@ class SpeakerClsTask(SpeechTask):
     logging.info(mean)
     logging.info(var)
 
+  def _process_sample(self, sample):
+    ''' sample of sampler to example '''
+    inputs, label, utt_key = sample
+    texts = np.array([0] * self.max_text_len)
+    filename = utt_key
+    clip_id = 0
+    soft_label = np.zeros((1,))  # disabled for speaker model
+    return inputs, texts, label, filename, clip_id, soft_label
+
+  def generate_item(self, item):
+    ''' examples of one (utt_key, utt_meta) '''
+    samples = self.sampler.utt_to_samples((None, item))
+    for sample in samples or []:
+      yield self._process_sample(sample)
+
   def generate_data(self):
     '''
     Yields samples.
@@ -412,34 +519,43 @@ class SpeakerClsTask(SpeechTask):
     Yields:
       (inputs, texts, label, filename, clip_id, soft_label)
     '''
-    class_num = self.taskconf['classes']['num']
-
-    def process_sample(sample):
-      inputs, label, utt_key = sample
-      texts = np.array([0] * self.max_text_len)
-      filename = utt_key
-      clip_id = 0
-      soft_label = np.zeros((1,))  # disabled for speaker model
-      return inputs, texts, label, filename, clip_id, soft_label
-
     if self.mode == utils.INFER:
       # Estimator.predict might cause multiprocessing to fail.
       multiprocess = False
     else:
       multiprocess = True
 
-    if multiprocess:
+    if multiprocess and self.generator_workers:
+      keys = self.shard_items(list(self.meta.utts.keys()))
+      if self.block_size:
+        keys = block_shuffle(
+            keys, lambda key: ark_sort_key(self.meta.utts[key]['feat']),
+            self.block_size)
+      else:
+        random.shuffle(keys)
+      items = [(key, self.meta.utts[key]) for key in keys]
+      for example in self.item_generator(items):
+        yield example
+    elif multiprocess:
       q = ImapUnorderedDataQueue
-      data_queue = q(self.meta, self.sampler, num_processes=4)
+      data_queue = q(
+          self.meta,
+          self.sampler,
+          num_processes=4,
+          max_qsize=self.taskconf.get('generator_queue_depth', 20),
+          block_size=self.block_size,
+          slab_bytes=self.taskconf.get('generator_slab_mb', 16) << 20,
+          keys=self.shard_items(list(self.meta.utts.keys())))
       data_queue.start()
       for samples in data_queue.get_items():
         for sample in samples:
-          yield process_sample(sample)
+          yield self._process_sample(sample)
     else:
-      for item in self.meta.utts.items():
-        samples = self.sampler.utt_to_samples((None, item))
-        for sample in samples:
-          yield process_sample(sample)
+      items = self.shard_items(
+          list(self.meta.utts.items()), key=lambda item: item[0])
+      for item in items:
+        for example in self.generate_item(item):
+          yield example
     raise StopIteration
 
   def feature_spec(self):
@@ -466,6 +582,7 @@ class SpeakerClsTask(SpeechTask):
     return batch
 
   def dataset(self, mode, batch_size, num_epoch):
+    self.set_shard(mode)
     shapes, types = self.feature_spec()
     data = tf.data.Dataset.from_generator(
         generator=lambda: self.generate_data(),
@@ -481,9 +598,12 @@ class SpeakerClsTask(SpeechTask):
         'Using buffer size of %d batches = %d in shuffle_and_repeat().' %
         (buffer_size, buffer_size * batch_size))
     if mode == utils.TRAIN:
+      # epochs are run by the solver, repeated if `num_epoch` is None
       data = data.apply(
           tf.data.experimental.shuffle_and_repeat(
-              buffer_size=buffer_size * batch_size, count=1, seed=None))
+              buffer_size=buffer_size * batch_size,
+              count=1 if num_epoch else None,
+              seed=None))
 
     def make_example(inputs, texts, labels, filenames, clip_ids, soft_labels):
       features = {
@@ -0,0 +1,80 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+''' speaker task ark reader unittest'''
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+import kaldiio
+from absl import logging
+
+from delta.data.task.speaker_cls_task import ArkReader
+from delta.data.task.speaker_cls_task import ark_sort_key
+from delta.data.task.speaker_cls_task import block_shuffle
+
+
+class ArkReaderTest(tf.test.TestCase):
+  ''' ark reader and block shuffle test'''
+
+  def setUp(self):
+    ''' set up'''
+    self.tmpdir = tempfile.mkdtemp()
+    self.scp = {}
+    for ark_id in range(3):
+      mats = {
+          'utt{}_{}'.format(ark_id, i): np.full([5, 2], ark_id * 10 + i,
+                                                dtype=np.float32)
+          for i in range(4)
+      }
+      ark_path = os.path.join(self.tmpdir, '{}.ark'.format(ark_id))
+      scp_path = os.path.join(self.tmpdir, '{}.scp'.format(ark_id))
+      kaldiio.save_ark(ark_path, mats, scp=scp_path)
+      with open(scp_path) as fin:
+        for line in fin:
+          key, ark_offset = line.split()
+          self.scp[key] = ark_offset
+
+  def tearDown(self):
+    ''' tear down'''
+    ArkReader.close()
+    shutil.rmtree(self.tmpdir)
+
+  def test_load(self):
+    ''' reused handles, bounded by max handles'''
+    reader = ArkReader(max_handles=2)
+    for _ in range(2):
+      for key, ark_offset in self.scp.items():
+        ark_id, utt_id = key[3:].split('_')
+        mat = reader.load(ark_offset)
+        self.assertAllEqual(mat, np.full([5, 2], int(ark_id) * 10 + int(utt_id)))
+    self.assertEqual(len(reader._handles()), 2)  #pylint: disable=protected-access
+
+  def test_block_shuffle(self):
+    ''' blocks in storage order'''
+    sort_key = lambda key: ark_sort_key(self.scp[key])
+    keys = block_shuffle(list(self.scp.keys()), sort_key, 4)
+    self.assertCountEqual(keys, self.scp.keys())
+    for i in range(0, len(keys), 4):
+      block = keys[i:i + 4]
+      self.assertEqual(block, sorted(block, key=sort_key))
+      self.assertEqual(len({self.scp[key].split(':')[0] for key in block}), 1)
+
+
+if __name__ == '__main__':
+  logging.set_verbosity(logging.DEBUG)
+  tf.test.main()
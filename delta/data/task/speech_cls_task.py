@@ -17,7 +17,6 @@
 import ast
 import os
 import copy
-import threading
 import itertools
 import functools
 from collections import defaultdict
@@ -33,6 +32,9 @@ from delta import utils
 from delta.data import feat as feat_lib
 from delta.utils.register import registers
 from delta.data.task.base_speech_task import SpeechTask
+from delta.data.utils import manifest as manifest_lib
+from delta.serving.knowledge_distilling import SoftLabelCache
+from delta.serving.knowledge_distilling import TeacherStage
 
 
 def _load_text(text_path):
@@ -106,6 +108,12 @@ class SpeechClsTask(SpeechTask):
     self._postive_segs = None
     self.data_items = None
 
+    # packed features instead of *.npy files
+    self._feat_archive = None
+    archive_path = self.taskconf['audio'].get('feat_archive')
+    if self._file_suffix == '.npy' and archive_path:
+      self._feat_archive = feat_lib.FeatArchive(archive_path)
+
     # generate segment index
     self.generate_meta(mode)
 
@@ -119,11 +127,34 @@ class SpeechClsTask(SpeechTask):
     if 'distilling' in self.solverconf:
       self.use_distilling = self.solverconf['distilling']['enable']
 
+    self.teacher = None
+    self.teacher_stage = None
     if self.use_distilling:
-      temperature = self.solverconf['distilling']['temperature']
-      model = self.solverconf['distilling']['teacher_model']
-      name = self.solverconf['distilling']['name']
-      self.teacher = registers.serving[name](model, None, temperature)
+      distilling = self.solverconf['distilling']
+      temperature = distilling['temperature']
+      model = distilling['teacher_model']
+      name = distilling['name']
+      self.teacher = registers.serving[name](
+          model, distilling.get('teacher_gpu'), temperature)
+
+      cache = None
+      if distilling.get('cache_dir'):
+        cache = SoftLabelCache(distilling['cache_dir'], model)
+      self.teacher_stage = TeacherStage(
+          self.teacher,
+          batch_size=distilling.get('teacher_batch_size', 32),
+          queue_depth=distilling.get('teacher_queue_depth', 4),
+          cache=cache)
+
+  def feature_extractor(self, add_delta_deltas=False):
+    ''' feature extractor which builds graph once and reuses its session '''
+    audioconf = self.taskconf['audio']
+    return feat_lib.get_extractor(
+        sr=self._sample_rate,
+        feature_size=self._feature_size,
+        winlen=audioconf['winlen'],
+        winstep=self._winstep,
+        add_delta_deltas=add_delta_deltas)
 
   @property
   def max_text_len(self):
@@ -220,12 +251,10 @@ class SpeechClsTask(SpeechTask):
        withoud consider segments file
     filelist: paths: list, path of wav data
     '''
-    featconf = self.taskconf['audio'].update({'dry_run': dry_run}) \
-      if dry_run else self.taskconf['audio']
+    featconf = dict(self.taskconf['audio'], dry_run=dry_run)
     logging.debug("feat config: {}".format(featconf))
 
     files = []
-    threads = []
     for data_path in filelist:
       for root, dirname, filenames in os.walk(data_path):
         del dirname
@@ -234,22 +263,21 @@ class SpeechClsTask(SpeechTask):
             filename = os.path.join(root, filename)
             files.append(filename)
 
-      if self._feature_type == 'tffeat':
-        func = feat_lib.extract_filterbank
-      elif self._feature_type == 'pyfeat':
-        func = feat_lib.extract_feat
-      else:
-        raise ValueError("Not support feat: {}".format(self._feature_type))
-
-      #pylint: disable=invalid-name
-      t = threading.Thread(
-          target=func, args=tuple(files), kwargs=featconf, daemon=True)
-      threads.append(t)
-      t.start()
-      files = []
-
-    for t in threads:  #pylint: disable=invalid-name
-      t.join()
+    # archived feats are merged like `gen_feat` of main, as one shard
+    archive_path = featconf.get('feat_archive')
+    nskip = 0
+    if archive_path:
+      todo = feat_lib.archive_pending(archive_path, files,
+                                      featconf.get('save_feat_path'))
+      nskip = len(files) - len(todo)
+      files = todo
+
+    nextract, nskip_shard, _ = feat_lib.extract_shard(files, featconf)
+    nskip += nskip_shard
+    if archive_path and files and not dry_run:
+      nutt = feat_lib.merge_shards(archive_path, [files])
+      logging.info('pack {} utts into {}'.format(nutt, archive_path))
+    logging.info('extracted {} files, skipped {} files'.format(nextract, nskip))
     logging.info('generate feature done')
 
   #pylint: disable=arguments-differ,too-many-locals
@@ -262,24 +290,16 @@ class SpeechClsTask(SpeechTask):
         num_epoch=1)().make_one_shot_iterator().get_next()
     del labels
 
+    feature = features['inputs']
     suffix = self.taskconf['suffix']
     if suffix == '.npy':
       logging.info('generate cmvn from numpy')
-      feature = features['inputs']
+      extractor = None
     else:
       logging.info('genearte cmvn from wav')
-      # tf extractor graph
-      params = feat_lib.speech_ops.speech_params(
-          sr=self.taskconf['audio']['sr'],
-          bins=self.taskconf['audio']['feature_size'],
-          add_delta_deltas=self.taskconf['audio']['add_delta_deltas'],
-          audio_frame_length=self.taskconf['audio']['winlen'],
-          audio_frame_step=self.taskconf['audio']['winstep'])
-
-      #[batch, Time] -> [batch, time, audio_channel]
-      waveforms = tf.expand_dims(features['inputs'], axis=-1)
-      #[batch, Time, feat_size, channles]
-      feature = feat_lib.speech_ops.batch_extract_feature(waveforms, params)
+      # tf extractor graph, [batch, Time] -> [batch, Time, feat_size, channles]
+      extractor = self.feature_extractor(
+          add_delta_deltas=self.taskconf['audio']['add_delta_deltas'])
 
     # create stats vars
     sums, square, count = utils.create_cmvn_statis(
@@ -290,6 +310,8 @@ class SpeechClsTask(SpeechTask):
       with tf.Session() as sess:
         while True:
           feat_np = sess.run(feature)
+          if extractor:
+            feat_np = extractor.fbank(feat_np)
           # update stats
           sums, square, count = utils.update_cmvn_statis(
               feat_np, sums, square, count, axis=(0, 1))
@@ -303,18 +325,79 @@ class SpeechClsTask(SpeechTask):
     logging.info('save cmvn:{}'.format(self._cmvn_path))
     logging.info('generate cmvn done')
 
+  def load_feat(self, filename):
+    ''' load feature of *.npy, a view into the mapping if archive is used '''
+    if self._feat_archive is not None:
+      return self._feat_archive[filename]
+    return np.load(filename)
+
+  def list_files(self, data_path):
+    ''' files with `suffix` under `data_path` '''
+    if self._feat_archive is not None:
+      prefix = os.path.join(os.path.normpath(data_path), '')
+      for key in self._feat_archive.keys():
+        if os.path.normpath(key).startswith(prefix):
+          yield key
+      return
+
+    for root, dirname, filenames in os.walk(data_path):
+      del dirname
+      for filename in filenames:
+        if filename.endswith(self._file_suffix):
+          yield os.path.join(root, filename)
+
   def get_duration(self, filename, sr):  #pylint: disable=invalid-name
     ''' time in second '''
-    if filename.endswith('.npy'):
-      nframe = np.load(filename).shape[0]
+    if filename.endswith('.npy') and self._feat_archive is not None:
+      nframe = self._feat_archive.shape(filename)[0]
       return librosa.frames_to_time(
           nframe, hop_length=self._winstep * sr, sr=sr)
 
-    if filename.endswith('.wav'):
-      return librosa.get_duration(filename=filename)
+    # header only
+    _, duration, _ = manifest_lib.file_info(filename, sr, self._winstep)
+    return duration
+
+  def scan_files(self, data_path, class_fn):
+    '''
+    (filename, duration, class) of files under `data_path`,
+      cached in a manifest under `audio.manifest_dir` if it is set.
+    '''
+    if self._feat_archive is not None:
+      for filename in self.list_files(data_path):
+        duration = self.get_duration(filename=filename, sr=self._sample_rate)
+        yield filename, duration, class_fn(filename)
+      return
 
-    raise ValueError("filename suffix not .npy or .wav: {}".format(
-        os.path.splitext(filename)[-1]))
+    audioconf = self.taskconf['audio']
+    manifest_dir = audioconf.get('manifest_dir')
+    path = None
+    manifest = None
+    if manifest_dir:
+      path = manifest_lib.manifest_path(manifest_dir, data_path,
+                                        self._file_suffix)
+      if os.path.exists(path):
+        manifest = manifest_lib.DatasetManifest.load(path)
+        if (manifest.sr, manifest.winstep) != (self._sample_rate,
+                                               self._winstep):
+          logging.info('manifest of other sr or winstep, rebuild')
+          manifest = None
+
+    if manifest is None or audioconf.get('manifest_refresh', True):
+      if manifest is None:
+        manifest = manifest_lib.DatasetManifest(self._sample_rate,
+                                                self._winstep)
+      changed = manifest.update(
+          self.list_files(data_path),
+          class_fn,
+          num_workers=audioconf.get('manifest_workers', 0))
+      if path and changed:
+        manifest.save(path)
+
+    for filename, record in manifest.items():
+      class_name = record.class_name
+      if class_name not in self._classes:
+        class_name = class_fn(filename)
+      yield filename, record.duration, class_name
 
   def get_class_files_duration(self):
     ''' dirnames under dataset is class name
@@ -337,28 +420,22 @@ class SpeechClsTask(SpeechTask):
     # to exclude some data under some dir
     excludes = []
 
-    #pylint: disable=too-many-nested-blocks
+    def _get_file_class(filename):
+      # 'conflict' or 'normal' str
+      return _get_class(os.path.dirname(filename))
+
     for data_path in self._data_path:
       logging.debug("data path: {}".format(data_path))
-      for root, dirname, filenames in os.walk(data_path):
-        del dirname
-        for filename in filenames:
-          if filename.endswith(self._file_suffix):
-            class_name = _get_class(root)  # 'conflict' or 'normal' str
-            assert class_name is not None
-            filename = os.path.join(root, filename)
+      for filename, duration, class_name in self.scan_files(
+          data_path, _get_file_class):
+        assert class_name is not None
 
-            if excludes:
-              for exclude in excludes:
-                if exclude in filename:
-                  pass
+        if excludes:
+          for exclude in excludes:
+            if exclude in filename:
+              pass
 
-            duration = self.get_duration(
-                filename=filename, sr=self._sample_rate)
-            self._class_file[class_name].append(
-                (filename, duration, class_name))
-          else:
-            pass
+        self._class_file[class_name].append((filename, duration, class_name))
 
     logging.info("class file: {}".format(self._class_file))
     assert self._class_file, "maybe the suffix {} file not exits".format(
@@ -681,103 +758,112 @@ class SpeechClsTask(SpeechTask):
         text2id[char_num] = self.word2id['<unk>']
     return text2id
 
-  #pylint: disable=too-many-statements,too-many-locals,too-many-branches
-  def generate_data(self):
-    ''' generate one example'''
+  def __getstate__(self):
+    state = super().__getstate__()
+    # teacher runs in host process
+    state['teacher'] = None
+    state['teacher_stage'] = None
+    # workers map the archive themselves instead of copying it
+    if self._feat_archive is not None:
+      state['_feat_archive'] = self._feat_archive.path
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    if isinstance(self._feat_archive, str):
+      self._feat_archive = feat_lib.FeatArchive(self._feat_archive)
+
+  #pylint: disable=too-many-locals,too-many-branches
+  def generate_item(self, item):
+    ''' generate examples of one file '''
     use_text = self.taskconf['text']['enable']
+    filename, examples = item
+    #logging.info("example info", filename, examples)
 
-    #logging.info("generate data")
-    total = len(self._train_by_filename.values())
-    self._epoch += 1  # epcoh from 1
-
-    batch = []
-    np.random.shuffle(self.data_items)
-    for i, (filename, examples) in enumerate(self.data_items):
-      #logging.info("example info", filename, examples)
+    # convert txt to ids
+    if use_text:
+      text = _load_text('.'.join(filename.split('.')[:-1]))
+      text2id = self._word_table_lookup(text)
+    else:
+      text2id = np.array([0] * self._max_text_len)
+
+    # gen audio or load feat
+    if self._file_suffix == '.wav':
+      sr, raw_samples = self.feature_extractor().load_wav(filename)  #pylint: disable=invalid-name
+      for label, seg, clip_id in examples:
+        samples = raw_samples
+        if seg[2]:
+          samples = np.pad(samples, [0, seg[2]], mode='constant')
+        samples = samples[seg[0]:seg[1]]
+        assert len(samples) == self.example_len, "{} {}".format(filename, seg)
+
+        labelid = self.class_id(label)
+
+        # filled by teacher stage when distilling
+        class_num = self.taskconf['classes']['num']
+        soft_label = [0] * class_num
+
+        if use_text:
+          if clip_id == 0:
+            # only add into batch when meet the first clip
+            yield samples, text2id, labelid, filename, clip_id, soft_label
+        else:
+          yield samples, text2id, labelid, filename, clip_id, soft_label
 
-      # convert txt to ids
-      if use_text:
-        text = _load_text('.'.join(filename.split('.')[:-1]))
-        text2id = self._word_table_lookup(text)
-      else:
-        text2id = np.array([0] * self._max_text_len)
-
-      # gen audio or load feat
-      if self._file_suffix == '.wav':
-        sr, raw_samples = feat_lib.load_wav(filename)  #pylint: disable=invalid-name
-        for label, seg, clip_id in examples:
-          samples = raw_samples
-          if seg[2]:
-            samples = np.pad(samples, [0, seg[2]], mode='constant')
-          samples = samples[seg[0]:seg[1]]
-          assert len(samples) == self.example_len, "{} {}".format(filename, seg)
-
-          labelid = self.class_id(label)
-
-          if self.use_distilling:
-            soft_label = self.teacher(feat)
-          else:
-            class_num = self.taskconf['classes']['num']
-            soft_label = [0] * class_num
-
-          if use_text:
-            if clip_id == 0:
-              # only add into batch when meet the first clip
-              batch.append(
-                  (samples, text2id, labelid, filename, clip_id, soft_label))
-          else:
-            batch.append(
-                (samples, text2id, labelid, filename, clip_id, soft_label))
+    else:
+      feat = self.load_feat(filename)
 
+      # shape : [nframe, feat_size, 3]
+      if self._feature_type:
+        fbank = self.feature_extractor().add_delta_delta(feat)
       else:
-        feat = np.load(filename)
-
-        # shape : [nframe, feat_size, 3]
-        if self._feature_type:
-          fbank = feat_lib.add_delta_delta(feat, self._feature_size, order=2)
+        fbank = feat_lib.delta_delta(feat)
+
+      for label, seg, clip_id in examples:
+        feat = fbank
+        logging.info("feat shape: {}".format(feat.shape))
+
+        seg = list(map(self._sample_to_frame, seg))
+        if seg[2]:
+          # need padding
+          feat = np.pad(feat, [(0, seg[2]), (0, 0), (0, 0)], mode='constant')
+        feat = feat[seg[0]:seg[1], :, :]
+        assert len(feat) == self._sample_to_frame(
+            self.example_len), "{} {} {} {} {}".format(
+                filename, seg, len(feat), self.example_len,
+                self._sample_to_frame(self.example_len))
+
+        # filled by teacher stage when distilling
+        class_num = self.taskconf['classes']['num']
+        soft_label = [0] * class_num
+
+        # convert string label to int label
+        labelid = self.class_id(label)
+
+        if use_text:
+          if clip_id == 0:
+            # only add into batch when meet the first clip
+            yield feat, text2id, labelid, filename, clip_id, soft_label
         else:
-          fbank = feat_lib.delta_delta(feat)
-
-        for label, seg, clip_id in examples:
-          feat = fbank
-          logging.info("feat shape: {}".format(feat.shape))
-
-          seg = list(map(self._sample_to_frame, seg))
-          if seg[2]:
-            # need padding
-            feat = np.pad(feat, [(0, seg[2]), (0, 0), (0, 0)], mode='constant')
-          feat = feat[seg[0]:seg[1], :, :]
-          assert len(feat) == self._sample_to_frame(
-              self.example_len), "{} {} {} {} {}".format(
-                  filename, seg, len(feat), self.example_len,
-                  self._sample_to_frame(self.example_len))
-
-          if self.use_distilling:
-            soft_label = self.teacher(feat)
-          else:
-            class_num = self.taskconf['classes']['num']
-            soft_label = [0] * class_num
-
-          # convert string label to int label
-          labelid = self.class_id(label)
-
-          if use_text:
-            if clip_id == 0:
-              # only add into batch when meet the first clip
-              batch.append(
-                  (feat, text2id, labelid, filename, clip_id, soft_label))
-          else:
-            batch.append(
-                (feat, text2id, labelid, filename, clip_id, soft_label))
-
-      #if i % 10000:
-      #  sys.stderr.write('\r epoch:{} iter:{} total:{}:{:.2f}%'.format(
-      #     self._epoch, i, total, i * 100 / total))
+          yield feat, text2id, labelid, filename, clip_id, soft_label
 
-      for inputs, texts, label, filepath, clip_id, soft_label in batch:
-        yield inputs, texts, label, filepath, clip_id, soft_label
+  def generate_data(self):
+    ''' generate one example'''
+    #logging.info("generate data")
+    self._epoch += 1  # epcoh from 1
 
-      batch.clear()
+    data_items = self.shard_items(self.data_items, key=lambda item: item[0])
+    np.random.shuffle(data_items)
+    examples = self.item_generator(data_items)
+    if not self.use_distilling:
+      for example in examples:
+        yield example
+    else:
+      # (filename, clip_id), inputs, example
+      items = (((example[3], example[4]), example[0], example)
+               for example in examples)
+      for example, soft_label in self.teacher_stage(items):
+        yield example[:-1] + (soft_label,)
 
     logging.info("Out of range")
     raise StopIteration  #pylint: disable=stop-iteration-return
@@ -817,6 +903,7 @@ class SpeechClsTask(SpeechTask):
 
   #pylint: disable=arguments-differ
   def dataset(self, mode, batch_size, num_epoch):
+    self.set_shard(mode)
     shapes, types = self.feature_spec()
     ds = tf.data.Dataset.from_generator(  #pylint: disable=invalid-name
         generator=lambda: self.generate_data(),  #pylint: disable=unnecessary-lambda
@@ -204,8 +204,16 @@ class TextClsTask(TextTask):
 
     feature_shape = self.feature_spec()
     logging.debug("feature_shape: {}".format(feature_shape))
-    data_set = data_set.padded_batch(
-        batch_size=self.batch_size, padded_shapes=feature_shape)
+
+    def _length(text, *_):
+      _, input_x_len = text
+      return input_x_len
+
+    def _trim(batch, max_len):
+      (input_x, input_x_len), rest = batch[0], batch[1:]
+      return ((input_x[:, :max_len], input_x_len),) + rest
+
+    data_set = self.batch_dataset(data_set, feature_shape, _length, _trim)
 
     data_set = data_set.prefetch(self.num_prefetch_batch)
 
@@ -68,6 +68,29 @@ class TextClsTaskTest(tf.test.TestCase):
       logging.debug(res[0])
       self.assertEqual(np.shape(res[0]), (max_len,))
 
+  def test_bucket(self):
+    config = utils.load_config(self.config_file)
+    task_config = config["data"]["task"]
+    max_len = task_config["max_seq_len"]
+    task_config["bucket"] = {
+        "enable": True,
+        "boundaries": [16, 64],
+        "token_budget": 512
+    }
+    task = TextClsTask(config, utils.TRAIN)
+    self.assertEqual(
+        task.bucket_batch_sizes([16, 64]), [34, 8, max(512 // max_len, 1)])
+
+    data = task.dataset()
+    with self.session() as sess:
+      sess.run(data["iterator"].initializer)
+      for _ in range(5):
+        input_x, input_x_len = sess.run(
+            [data["input_x_dict"]["input_x"], data["input_x_len"]])
+        # trimmed to the longest sentence of the batch
+        self.assertEqual(input_x.shape[1], max(np.max(input_x_len), 1))
+        self.assertLessEqual(input_x.size, max(512, max_len))
+
   ## comment it for no dense data now
   # def test_english_dense(self):
   #   config = utils.load_config(self.config_file)
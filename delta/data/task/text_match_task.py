@@ -194,8 +194,19 @@ class TextMatchTask(TextTask):
     feature_shape = self.feature_spec()
     logging.debug("feature_shape: {}".format(feature_shape))
 
-    data_set_left_right = data_set_left_right.padded_batch(
-      batch_size=self.batch_size, padded_shapes=feature_shape)
+
+    def _length(text_left_right, *_):
+      text_left, text_right = text_left_right
+      return tf.maximum(
+          compute_sen_lens(text_left, padding_token=0),
+          compute_sen_lens(text_right, padding_token=0))
+
+    def _trim(batch, max_len):
+      (input_x_left, input_x_right), rest = batch[0], batch[1:]
+      return ((input_x_left[:, :max_len], input_x_right[:, :max_len]),) + rest
+
+    data_set_left_right = self.batch_dataset(data_set_left_right,
+                                             feature_shape, _length, _trim)
     text_len_left_right = text_len_left_right.batch(self.batch_size)
 
     data_set_left_right = data_set_left_right.prefetch(self.num_prefetch_batch)
@@ -211,6 +222,10 @@ class TextMatchTask(TextTask):
         (input_x_left, input_x_right), input_y = iterator.get_next()
 
     input_x_left_len, input_x_right_len = iterator_len.get_next()
+    if self.use_bucket(self.mode):
+      # batches are reordered by length
+      input_x_left_len = compute_sen_lens(input_x_left, padding_token=0)
+      input_x_right_len = compute_sen_lens(input_x_right, padding_token=0)
     input_x_dict = collections.OrderedDict(
       [("input_x_left", input_x_left), ("input_x_right", input_x_right)])
     input_x_len = collections.OrderedDict(
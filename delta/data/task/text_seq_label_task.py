@@ -164,8 +164,16 @@ class TextSeqLabelTask(TextTask):
     feature_shape = self.feature_spec()
     logging.debug("feature_shape: {}".format(feature_shape))
 
-    data_set = data_set.padded_batch(
-        batch_size=self.batch_size, padded_shapes=feature_shape)
+
+    def _length(text, *_):
+      _, input_x_len = text
+      return input_x_len
+
+    def _trim(batch, max_len):
+      (input_x, input_x_len), input_y = batch
+      return (input_x[:, :max_len], input_x_len), input_y[:, :max_len]
+
+    data_set = self.batch_dataset(data_set, feature_shape, _length, _trim)
 
     data_set = data_set.prefetch(self.num_prefetch_batch)
 
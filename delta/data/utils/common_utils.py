@@ -145,90 +145,152 @@ def load_seq_label_raw_data(paths, mode, infer_no_label=False):
   return text, label
 
 
+def iter_seq_label_raw_data(path, mode, infer_no_label=False):
+  """
+  Yield (text, label) of sentences of a sequence labeling file,
+    label is None for inference without label.
+  """
+  counter = 0
+  actual_max_seq_len = 0
+  with open(path, 'r', encoding='utf8') as file_input:
+    if mode == utils.INFER and infer_no_label:
+      for line in file_input:
+        line = list(line.strip())
+        if line:
+          counter += 1
+          yield " ".join(line), None
+    else:
+      sentence = []
+      char_label = []
+      for line in file_input:
+        line = line.strip()
+        if not line:
+          actual_max_seq_len = max(actual_max_seq_len, len(sentence))
+          counter += 1
+          yield " ".join(sentence), " ".join(char_label)
+          sentence = []
+          char_label = []
+        else:
+          l = line.split("\t")
+          if len(l) == 2:
+            sentence.append(l[0])
+            char_label.append(l[1])
+      # same as load_seq_label_raw_data on one path
+      if not sentence:
+        counter += 1
+        yield " ".join(sentence), " ".join(char_label)
+      logging.info("the actual max seq len {}".format(str(actual_max_seq_len)))
+  logging.info("Load {} lines from {}.".format(str(counter), path))
+
+
+def iter_cls_raw_data(path, mode, infer_no_label=False):
+  """
+  Yield (text, label) of lines of a classification file,
+    label is None for inference without label.
+  """
+  success_count = 0
+  fail_count = 0
+  all_lines = 0
+  with open(path, 'r', encoding='utf-8') as file_input:
+    for i, line in enumerate(file_input):
+      all_lines += 1
+      line = line.strip()
+      if mode == utils.INFER and infer_no_label:
+        yield line, None
+      else:
+        sp = line.split('\t')
+        if len(sp) != 2:
+          logging.warning("Line no.{} not in standard format!".format(i))
+          fail_count += 1
+          continue
+        else:
+          success_count += 1
+        yield " ".join(sp[1:]), sp[0]
+  logging.info("Data loaded from {}. " \
+               "Total {} lines, successfully load {} lines, " \
+               "failed {} lines.".format(path, all_lines, success_count, fail_count))
+
+
 def load_cls_raw_data(paths, mode, infer_no_label=False):
   """Load raw data for classification."""
   text = []
   label = []
   for path in paths:
-    success_count = 0
-    fail_count = 0
-    with open(path, 'r', encoding='utf-8') as file_input:
-      lines = file_input.readlines()
-      for i, line in enumerate(lines):
-        line = line.strip()
-        if mode == utils.INFER and infer_no_label:
-          text.append(line)
-        else:
-          sp = line.split('\t')
-          if len(sp) != 2:
-            logging.warning("Line no.{} not in standard format!".format(i))
-            fail_count += 1
-            continue
-          else:
-            success_count += 1
-          text.append(" ".join(sp[1:]))
-          label.append(sp[0])
-      all_lines = len(lines)
-      del lines
-    logging.info("Data loaded from {}. " \
-                 "Total {} lines, successfully load {} lines, " \
-                 "failed {} lines.".format(path, all_lines, success_count, fail_count))
+    for one_text, one_label in iter_cls_raw_data(path, mode, infer_no_label):
+      text.append(one_text)
+      if one_label is not None:
+        label.append(one_label)
   if mode == utils.INFER and infer_no_label:
     return text, []
   return text, label
-# pylint: disable = too-many-locals
+
+
+def iter_match_raw_data(path, mode, infer_no_label=False):
+  """
+  Yield (text_left, text_right, label) of lines of a text match file,
+    label is None for inference without label.
+  """
+  success_count = 0
+  fail_count = 0
+  all_lines = 0
+  with open(path, 'r', encoding='utf-8') as file_input:
+    for i, line in enumerate(file_input):
+      all_lines += 1
+      line = line.strip()
+      sp = line.split('\t')
+      if mode == utils.INFER and infer_no_label:
+        if len(sp) != 2:
+          fail_count += 1
+          logging.warning("Line no.{} not in standard format!".format(i))
+          continue
+        else:
+          success_count += 1
+          yield sp[0], sp[1], None  # [sentence1, sentence2]
+      else:
+        if len(sp) != 3:
+          fail_count += 1
+          logging.warning("Line no.{} not in standard format!".format(i))
+          continue
+        else:
+          success_count += 1
+          yield sp[1], sp[2], sp[0]  # [label sentence1 sentence2]
+  logging.info("Data loaded from {}. " \
+               "Total {} lines, successfully load {} lines, " \
+               "failed {} lines.".format(path, all_lines, success_count, fail_count))
+
+
 def load_match_raw_data(paths, mode, infer_no_label=False):
   """Load raw data for text match."""
   text_right = []
   text_left = []
   label = []
   for path in paths:
-    success_count = 0
-    fail_count = 0
-    with open(path, 'r', encoding='utf-8') as file_input:
-      lines = file_input.readlines()
-      for i, line in enumerate(lines):
-          line = line.strip()
-          sp = line.split('\t')
-          if mode == utils.INFER and infer_no_label:
-            if len(sp) != 2:
-              fail_count += 1
-              logging.warning("Line no.{} not in standard format!".format(i))
-              continue
-            else:
-              success_count += 1
-              text_left.append(sp[0])  # [sentence1, sentence2]
-              text_right.append(sp[1])
-          else:
-            if len(sp) != 3:
-              fail_count += 1
-              logging.warning("Line no.{} not in standard format!".format(i))
-              continue
-            else:
-              success_count += 1
-              text_left.append(sp[1])  # [label sentence1 sentence2]
-              text_right.append(sp[2])
-              label.append(sp[0])
-
-      all_lines = len(lines)
-      del lines
-    logging.info("Data loaded from {}. " \
-                 "Total {} lines, successfully load {} lines, " \
-                 "failed {} lines.".format(path, all_lines, success_count, fail_count))
+    for left, right, one_label in iter_match_raw_data(path, mode,
+                                                      infer_no_label):
+      text_left.append(left)
+      text_right.append(right)
+      if one_label is not None:
+        label.append(one_label)
 
   if mode == utils.INFER and infer_no_label:  # label \t sentence1 \t sentence2
     return (text_left, text_right), []
   return (text_left, text_right), label
 
+
+def write_text_cls_lines(out_f, label, texts_after, no_label):
+  """Write lines of text classification data to an opened file."""
+  for i, one_line in enumerate(texts_after):
+    if no_label:
+      out_f.write(one_line + "\n")
+    else:
+      out_f.write(label[i] + "\t" + one_line + "\n")
+
+
 def save_a_text_cls_file(label, texts_after, new_path, no_label):
   """Save a text classification data to a file."""
   logging.info("Saving processed file to: {}".format(new_path))
   with open(new_path, "w", encoding="utf-8") as out_f:
-    for i, one_line in enumerate(texts_after):
-      if no_label:
-        out_f.write(one_line + "\n")
-      else:
-        out_f.write(label[i] + "\t" + one_line + "\n")
+    write_text_cls_lines(out_f, label, texts_after, no_label)
 
 
 def save_a_text_seq_label_file(label, texts_after, new_path, no_label):
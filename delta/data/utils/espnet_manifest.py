@@ -0,0 +1,217 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+'''
+binary manifest of espnet data.json
+
+  a dir of .npy columns next to the json, memory mapped when loaded:
+    uttids, feats: utf-8 bytes and offsets of utt ids and feature pointers
+    input_shapes, output_shapes: [N, 2]
+    tokens, token_offsets: token ids of all utts and offsets
+  utts are in order of utt id, entries are made only when indexed.
+'''
+import os
+import json
+import shutil
+import functools
+import collections.abc
+
+import numpy as np
+from absl import logging
+
+_VERSION = 1
+_INFO = 'info.json'
+_COLUMNS = ('uttids', 'uttid_offsets', 'feats', 'feat_offsets',
+            'input_shapes', 'output_shapes', 'tokens', 'token_offsets')
+
+
+def manifest_path(json_path):
+  ''' dir of the binary manifest of `json_path` '''
+  return json_path + '.manifest'
+
+
+def _join(strings):
+  ''' utf-8 bytes and [N + 1] offsets of strings '''
+  encoded = [string.encode('utf-8') for string in strings]
+  offsets = np.zeros([len(encoded) + 1], dtype=np.int64)
+  np.cumsum([len(string) for string in encoded], out=offsets[1:])
+  return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def compile_manifest(json_path, path=None):
+  '''
+  compile espnet `json_path` of one input and one output of each utt
+    into binary manifest dir `path`, default `manifest_path(json_path)`
+  '''
+  path = path or manifest_path(json_path)
+  with open(json_path, 'r', encoding='utf-8') as fin:
+    utts = json.load(fin)['utts']
+  uttids = sorted(utts.keys())
+  inputs, outputs = [], []
+  for uttid in uttids:
+    meta = utts[uttid]
+    if len(meta['input']) != 1 or len(meta['output']) != 1:
+      raise ValueError('utt {} not of one input and one output'.format(uttid))
+    inputs.append(meta['input'][0])
+    outputs.append(meta['output'][0])
+
+  columns = {}
+  columns['uttids'], columns['uttid_offsets'] = _join(uttids)
+  columns['feats'], columns['feat_offsets'] = _join(
+      [entry['feat'] for entry in inputs])
+  columns['input_shapes'] = np.array([entry['shape'] for entry in inputs],
+                                     dtype=np.int64).reshape([-1, 2])
+  columns['output_shapes'] = np.array([entry['shape'] for entry in outputs],
+                                      dtype=np.int64).reshape([-1, 2])
+  tokenids = [entry['tokenid'].split() for entry in outputs]
+  columns['tokens'] = np.array(
+      [token for tokens in tokenids for token in tokens], dtype=np.int64)
+  columns['token_offsets'] = np.zeros([len(tokenids) + 1], dtype=np.int64)
+  np.cumsum([len(tokens) for tokens in tokenids],
+            out=columns['token_offsets'][1:])
+  info = {
+      'version': _VERSION,
+      'source_mtime': os.path.getmtime(json_path),
+      'input_name': inputs[0]['name'] if inputs else 'input1',
+      'output_name': outputs[0]['name'] if outputs else 'target1',
+      'filetype': inputs[0].get('filetype') if inputs else None,
+  }
+
+  tmp = '{}.{}.tmp'.format(path, os.getpid())
+  os.makedirs(tmp, exist_ok=True)
+  for name in _COLUMNS:
+    np.save(os.path.join(tmp, name + '.npy'), columns[name])
+  with open(os.path.join(tmp, _INFO), 'w') as fout:
+    json.dump(info, fout)
+  try:
+    if os.path.exists(path) and not _is_fresh(json_path, path):
+      shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+  except OSError:
+    # compiled by another worker meanwhile
+    if not _is_fresh(json_path, path):
+      raise
+    shutil.rmtree(tmp)
+  # drop the mmaps of the replaced manifest
+  _open_manifest.cache_clear()
+  logging.info('compile manifest: {}, {} utts'.format(path, len(uttids)))
+  return path
+
+
+def _is_fresh(json_path, path):
+  info_path = os.path.join(path, _INFO)
+  if not os.path.exists(info_path):
+    return False
+  with open(info_path) as fin:
+    info = json.load(fin)
+  return (info.get('version') == _VERSION and
+          info.get('source_mtime') == os.path.getmtime(json_path))
+
+
+def load_manifest(json_path):
+  ''' manifest of `json_path`, compiled when missing or older than json '''
+  path = manifest_path(json_path)
+  if not _is_fresh(json_path, path):
+    compile_manifest(json_path, path)
+  return open_manifest(path)
+
+
+def open_manifest(path):
+  ''' manifest of dir `path`, shared in a process until it is recompiled '''
+  with open(os.path.join(path, _INFO)) as fin:
+    source_mtime = json.load(fin)['source_mtime']
+  return _open_manifest(path, source_mtime)
+
+
+@functools.lru_cache(maxsize=None)
+def _open_manifest(path, source_mtime):
+  del source_mtime
+  return AsrManifest(path)
+
+
+class AsrManifest:
+  ''' memory mapped columns of a binary manifest '''
+
+  def __init__(self, path):
+    self.path = path
+    with open(os.path.join(path, _INFO)) as fin:
+      self.info = json.load(fin)
+    for name in _COLUMNS:
+      setattr(self, name,
+              np.load(os.path.join(path, name + '.npy'), mmap_mode='r'))
+    logging.info('load manifest: {}, {} utts'.format(path, len(self)))
+
+  def __reduce__(self):
+    # reopened by path, instead of copying the columns
+    return open_manifest, (self.path,)
+
+  def __len__(self):
+    return len(self.input_shapes)
+
+  @property
+  def ilens(self):
+    ''' input frames [N] '''
+    return self.input_shapes[:, 0]
+
+  @property
+  def olens(self):
+    ''' output tokens [N] '''
+    return self.output_shapes[:, 0]
+
+  @staticmethod
+  def _string(data, offsets, index):
+    return data[offsets[index]:offsets[index + 1]].tobytes().decode('utf-8')
+
+  def uttid(self, index):
+    ''' utt id of `index` '''
+    return self._string(self.uttids, self.uttid_offsets, index)
+
+  def entry(self, index):
+    ''' (uttid, meta) of `index`, as the items of data.json '''
+    start, end = self.token_offsets[index], self.token_offsets[index + 1]
+    tokens = self.tokens[start:end]
+    inputs = {
+        'feat': self._string(self.feats, self.feat_offsets, index),
+        'name': self.info['input_name'],
+        'shape': self.input_shapes[index].tolist(),
+    }
+    if self.info['filetype'] is not None:
+      inputs['filetype'] = self.info['filetype']
+    outputs = {
+        'tokenid': ' '.join(map(str, tokens.tolist())),
+        'name': self.info['output_name'],
+        'shape': self.output_shapes[index].tolist(),
+    }
+    return self.uttid(index), {'input': [inputs], 'output': [outputs]}
+
+  def batch(self, indices):
+    ''' ManifestBatch of utts of `indices` '''
+    return ManifestBatch(self, indices)
+
+
+class ManifestBatch(collections.abc.Sequence):
+  ''' batch of (uttid, meta), made from the manifest when indexed '''
+
+  def __init__(self, manifest, indices):
+    self.manifest = manifest
+    self.indices = np.asarray(indices, dtype=np.int64)
+
+  def __len__(self):
+    return len(self.indices)
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return ManifestBatch(self.manifest, self.indices[i])
+    return self.manifest.entry(int(self.indices[i]))
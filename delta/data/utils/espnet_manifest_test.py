@@ -0,0 +1,103 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+''' espnet binary manifest unittest '''
+import os
+import json
+import pickle
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+from delta.data.utils import espnet_manifest
+
+
+class EspnetManifestTest(tf.test.TestCase):
+  ''' espnet binary manifest unittest '''
+
+  def setUp(self):
+    ''' set up '''
+    self.tmpdir = tempfile.mkdtemp()
+    self.utts = {}
+    for i in range(5):
+      olen = i + 1
+      self.utts['uttid{}'.format(4 - i)] = {
+          'input': [{
+              'feat': '/path/feats.ark:{}'.format(100 * i),
+              'name': 'input1',
+              'shape': [100 + i, 40]
+          }],
+          'output': [{
+              'tokenid': ' '.join(str(token) for token in range(olen)),
+              'name': 'target1',
+              'shape': [olen, 10]
+          }]
+      }
+    self.json_path = os.path.join(self.tmpdir, 'data.json')
+    with open(self.json_path, 'w') as fout:
+      json.dump({'utts': self.utts}, fout)
+
+  def test_entry(self):
+    ''' entries in order of utt id, as the json '''
+    manifest = espnet_manifest.load_manifest(self.json_path)
+    self.assertEqual(len(manifest), 5)
+    self.assertAllEqual(manifest.ilens, [104, 103, 102, 101, 100])
+    self.assertAllEqual(manifest.olens, [5, 4, 3, 2, 1])
+    for i, (uttid, meta) in enumerate(sorted(self.utts.items())):
+      self.assertEqual(manifest.entry(i), (uttid, meta))
+
+    # compiled once
+    self.assertIs(espnet_manifest.load_manifest(self.json_path), manifest)
+
+  def test_batch(self):
+    ''' batch resolves entries and pickles by path '''
+    manifest = espnet_manifest.load_manifest(self.json_path)
+    batch = manifest.batch([3, 0])
+    self.assertEqual(len(batch), 2)
+    self.assertEqual([uttid for uttid, _ in batch], ['uttid3', 'uttid0'])
+    self.assertEqual(batch[1], manifest.entry(0))
+
+    copied = pickle.loads(pickle.dumps(batch))
+    self.assertIs(copied.manifest, manifest)
+    self.assertEqual(list(copied), list(batch))
+
+  def test_recompile(self):
+    ''' compiled again when json is modified '''
+    manifest = espnet_manifest.load_manifest(self.json_path)
+    del self.utts['uttid0']
+    with open(self.json_path, 'w') as fout:
+      json.dump({'utts': self.utts}, fout)
+    mtime = os.path.getmtime(self.json_path) + 10
+    os.utime(self.json_path, (mtime, mtime))
+
+    manifest = espnet_manifest.load_manifest(self.json_path)
+    self.assertEqual(len(manifest), 4)
+    self.assertEqual(manifest.uttid(0), 'uttid1')
+    self.assertDTypeEqual(manifest.tokens, np.int64)
+
+  def test_compile_fresh_target(self):
+    ''' a fresh manifest compiled by another worker is kept '''
+    path = espnet_manifest.compile_manifest(self.json_path)
+    manifest = espnet_manifest.open_manifest(path)
+    self.assertEqual(espnet_manifest.compile_manifest(self.json_path), path)
+    self.assertEqual(
+        sorted(os.listdir(self.tmpdir)), ['data.json', 'data.json.manifest'])
+    self.assertEqual(len(espnet_manifest.open_manifest(path)), 5)
+    self.assertEqual(manifest.uttid(0), 'uttid0')
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -16,6 +16,9 @@
 ''' espnet utils'''
 import json
 from collections import OrderedDict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from absl import logging
 
 from espnet.utils.cli_utils import FileReaderWrapper
@@ -24,6 +27,7 @@ from espnet.utils.training.batchfy import make_batchset as make_batchset_espnet
 from espnet.utils.io_utils import LoadInputsAndTargets
 
 from delta import utils
+from delta.data.utils import espnet_manifest
 
 TASK_SET = {'asr': 'asr', 'tts': 'tts'}
 
@@ -121,19 +125,25 @@ def get_batches(config, mode):
   ''' make batches of metas and get dataset size'''
   assert mode in (utils.TRAIN, utils.EVAL, utils.INFER)
 
-  # read meta of json
-  logging.info("load json data")
   json_path = config['data'][mode]['paths']
   assert len(json_path) == 1
-  #pylint: disable=invalid-name
-  with open(json_path[0], 'r', encoding='utf-8') as f:
-    metas_raw = json.load(f)['utts']
+  use_manifest = config['data']['task'].get('binary_manifest', False)
+  if use_manifest:
+    # columns of json, compiled once
+    metas = espnet_manifest.load_manifest(json_path[0])
+    utts = len(metas)
+  else:
+    # read meta of json
+    logging.info("load json data")
+    #pylint: disable=invalid-name
+    with open(json_path[0], 'r', encoding='utf-8') as f:
+      metas_raw = json.load(f)['utts']
 
-  # sort by utts id
-  metas = OrderedDict(sorted(metas_raw.items(), key=lambda t: t[0]))
+    # sort by utts id
+    metas = OrderedDict(sorted(metas_raw.items(), key=lambda t: t[0]))
 
-  # dataset size
-  utts = len(metas.keys())
+    # dataset size
+    utts = len(metas.keys())
   logging.info('# utts: ' + str(utts))
 
   # make batchset
@@ -157,15 +167,13 @@ def get_batches(config, mode):
   _, ngpu = utils.gpu_device_names()
   global_batch_size = config['solver']['optimizer']['batch_size']
   batch_size = utils.per_device_batch_size(global_batch_size, ngpu)
-  batch_bins = config['solver']['optimizer']['batch_bins']
-  batch_frames_in = config['solver']['optimizer']['batch_frames_in']
-  batch_frames_out = config['solver']['optimizer']['batch_frames_out']
-  batch_frames_inout = config['solver']['optimizer']['batch_frames_inout']
+  budget = batch_budget(config)
   batch_strategy = config['solver']['optimizer']['batch_strategy']
 
-  minibatches = make_batchset(
-      task=task,
-      data=metas,
+  batchset_fn = manifest_batchset if use_manifest else make_batchset
+  minibatches = batchset_fn(
+      task,
+      metas,
       batch_size=batch_size,
       max_length_in=maxlen_src,
       max_length_out=maxlen_tgt,
@@ -173,15 +181,194 @@ def get_batches(config, mode):
       batch_sort_key=batch_sort_key,
       min_batch_size=ngpu if ngpu else 1,
       shortest_first=use_sortagrad,
-      batch_bins=batch_bins,
-      batch_frames_in=batch_frames_in,
-      batch_frames_out=batch_frames_out,
-      batch_frames_inout=batch_frames_inout,
-      batch_strategy=batch_strategy)
+      batch_strategy=batch_strategy,
+      **budget)
 
   return {'data': minibatches, 'n_utts': utts}
 
 
+def batch_budget(config):
+  ''' `batch_bins` and `batch_frames_*` limits of a minibatch, 0 is no limit '''
+  optconf = config['solver']['optimizer']
+  return {
+      key: optconf.get(key, 0) or 0
+      for key in ('batch_bins', 'batch_frames_in', 'batch_frames_out',
+                  'batch_frames_inout')
+  }
+
+
+#pylint: disable=too-many-arguments
+def budget_batches(utts,
+                   batch_size,
+                   batch_bins=0,
+                   batch_frames_in=0,
+                   batch_frames_out=0,
+                   batch_frames_inout=0,
+                   window=0,
+                   rng=None):
+  '''
+  cut utts into batches whose padded size is under the budget,
+    a utt over the budget by itself is a batch alone
+
+  :param List[Tuple[str, dict]] utts: (uttid, meta) in data.json
+  :param int batch_size: maximum number of utts in a batch, 0 is no limit
+  :param int batch_bins: maximum of padded frames x dim of inputs and outputs
+  :param int batch_frames_in: maximum of padded input frames
+  :param int batch_frames_out: maximum of padded output frames
+  :param int batch_frames_inout: maximum of padded input+output frames
+  :param int window: utts sorted by input frames in each window of `window`
+      utts, 0 keeps the order
+  :param np.random.RandomState rng: shuffle utts before sorting and the
+      batches, None keeps the order
+  :return: List[List[Tuple[str, dict]]] list of batches
+  '''
+  if not utts:
+    return []
+  ilens = np.array([meta['input'][0]['shape'][0] for _, meta in utts],
+                   dtype=np.int64)
+  olens = np.array([meta['output'][0]['shape'][0] for _, meta in utts],
+                   dtype=np.int64)
+  idim = utts[0][1]['input'][0]['shape'][1]
+  odim = utts[0][1]['output'][0]['shape'][1]
+  batches = budget_batch_indices(ilens, olens, idim, odim, batch_size,
+                                 batch_bins, batch_frames_in, batch_frames_out,
+                                 batch_frames_inout, window, rng)
+  return [[utts[index] for index in batch] for batch in batches]
+
+
+#pylint: disable=too-many-arguments,too-many-locals
+def budget_batch_indices(ilens,
+                         olens,
+                         idim,
+                         odim,
+                         batch_size,
+                         batch_bins=0,
+                         batch_frames_in=0,
+                         batch_frames_out=0,
+                         batch_frames_inout=0,
+                         window=0,
+                         rng=None):
+  '''
+  `budget_batches` of utts of input frames `ilens` and output lengths `olens`
+    return: List[np.ndarray] utt indices of batches
+  '''
+  if not len(ilens):  #pylint: disable=len-as-condition
+    return []
+  order = np.arange(len(ilens))
+  if rng is not None:
+    rng.shuffle(order)
+  if window <= 0:
+    window = max(len(order), 1)
+  else:
+    for start in range(0, len(order), window):
+      part = order[start:start + window]
+      # longest first, the first batch of a window is the smallest one
+      order[start:start + window] = part[np.argsort(
+          -ilens[part], kind='mergesort')]
+
+  def over_budget(size, max_in, max_out):
+    return ((batch_size and size > batch_size) or
+            (batch_frames_in and size * max_in > batch_frames_in) or
+            (batch_frames_out and size * max_out > batch_frames_out) or
+            (batch_frames_inout and
+             size * (max_in + max_out) > batch_frames_inout) or
+            (batch_bins and
+             size * (max_in * idim + max_out * odim) > batch_bins))
+
+  # batch of order[start:position]
+  ends = []
+  start = 0
+  max_in, max_out = 0, 0
+  for position, index in enumerate(order):
+    next_in = max(max_in, ilens[index])
+    next_out = max(max_out, olens[index])
+    # batches do not cross windows
+    if position > start and (position % window == 0 or over_budget(
+        position - start + 1, next_in, next_out)):
+      ends.append(position)
+      start = position
+      next_in, next_out = ilens[index], olens[index]
+    max_in, max_out = next_in, next_out
+
+  batches = np.split(order, ends)
+  if rng is not None:
+    rng.shuffle(batches)
+  logging.info('# budget batches: {} of {} utts'.format(
+      len(batches), len(order)))
+  return batches
+
+
+#pylint: disable=too-many-arguments,too-many-locals
+def manifest_batchset(task,
+                      manifest,
+                      batch_size,
+                      max_length_in,
+                      max_length_out,
+                      num_batches=0,
+                      batch_sort_key='shuffle',
+                      min_batch_size=1,
+                      shortest_first=False,
+                      batch_bins=0,
+                      batch_frames_in=0,
+                      batch_frames_out=0,
+                      batch_frames_inout=0,
+                      batch_strategy='auto'):
+  '''
+  `make_batchset` on the columns of an espnet_manifest.AsrManifest,
+    "bin" and "frame" strategies limit the padded size of batches
+    as `budget_batches`, category of utts is not supported
+  :return: List[espnet_manifest.ManifestBatch] list of batches
+  '''
+  assert task in list(TASK_SET.keys())
+  ilens = np.asarray(manifest.ilens)
+  olens = np.asarray(manifest.olens)
+  idim = int(manifest.input_shapes[0, 1]) if len(manifest) else 0
+  odim = int(manifest.output_shapes[0, 1]) if len(manifest) else 0
+  sort_lens = olens if batch_sort_key == 'output' else ilens
+  #swap_io: use "input" as output and "output" as input
+  if task == TASK_SET['tts']:
+    ilens, olens, idim, odim = olens, ilens, odim, idim
+
+  if batch_sort_key == 'shuffle':
+    order = np.random.permutation(len(manifest))
+  else:
+    order = np.argsort(sort_lens, kind='mergesort')
+    if not shortest_first:
+      order = order[::-1]
+
+  if batch_strategy == 'auto':
+    batch_strategy = 'seq' if batch_size else 'budget'
+  if batch_strategy == 'seq':
+    batches = []
+    start = 0
+    while start < len(order):
+      # adaptive batch size of the longest utt
+      factor = max(ilens[order[start]] // max_length_in,
+                   olens[order[start]] // max_length_out)
+      size = max(min_batch_size, int(batch_size // (1 + factor)))
+      batches.append(order[start:start + size])
+      start += size
+  else:
+    batches = [
+        order[batch] for batch in budget_batch_indices(
+            ilens[order], olens[order], idim, odim, 0, batch_bins,
+            batch_frames_in, batch_frames_out, batch_frames_inout)
+    ]
+
+  minibatches = []
+  for batch in batches:
+    if shortest_first:
+      batch = batch[::-1]
+    if len(batch) < min_batch_size:
+      extra = np.random.randint(0, len(order), min_batch_size - len(batch))
+      batch = np.concatenate([batch, order[extra]])
+    minibatches.append(manifest.batch(batch))
+  if num_batches > 0:
+    minibatches = minibatches[:num_batches]
+  logging.info('# minibaches: ' + str(len(minibatches)))
+  return minibatches
+
+
 class Converter:
   '''custom batch converter for kaldi
   :param int subsampling_factor: The subsampling factor
@@ -221,6 +408,63 @@ class Converter:
 
     return xs, ilens, ys, olens
 
+  def iterate(self, batches, num_threads=1, depth=None):
+    '''
+    converted batches in order, loaded by a pool of `num_threads` threads
+      up to `depth` (default 2 x num_threads) batches ahead
+    '''
+    depth = depth or 2 * num_threads
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=num_threads) as pool:
+      try:
+        for batch in batches:
+          pending.append(pool.submit(self, batch))
+          if len(pending) >= depth:
+            yield pending.popleft().result()
+        while pending:
+          yield pending.popleft().result()
+      finally:
+        for future in pending:
+          future.cancel()
+
+
+class BatchCollator:
+  '''
+  pad a batch of feats and targets into [B, Tmax, D] float32 and [B, Omax]
+    int64 arrays, each utt is copied once into the array.
+  :param bool reuse_buffer: reuse the feat buffer of the last batch,
+    only when a batch is consumed before the next one is made
+  '''
+
+  def __init__(self, reuse_buffer=False):
+    self.reuse_buffer = reuse_buffer
+    self._buffer = np.empty([0], dtype=np.float32)
+
+  def _feat_buffer(self, shape):
+    size = int(np.prod(shape))
+    if not self.reuse_buffer:
+      return np.empty(shape, dtype=np.float32)
+    if self._buffer.size < size:
+      self._buffer = np.empty([size], dtype=np.float32)
+    return self._buffer[:size].reshape(shape)
+
+  def __call__(self, xs, ys):
+    ''' return feats, ilens, targets, olens '''
+    #pylint: disable=invalid-name
+    ilens = np.array([x.shape[0] for x in xs], dtype=np.int64)
+    olens = np.array([y.shape[0] for y in ys], dtype=np.int64)
+
+    feats = self._feat_buffer(
+        [len(xs), ilens.max(initial=0), *xs[0].shape[1:]])
+    for feat, x, ilen in zip(feats, xs, ilens):
+      feat[:ilen] = x
+      feat[ilen:] = 0
+
+    targets = np.zeros([len(ys), olens.max(initial=0)], dtype=np.int64)
+    for target, y, olen in zip(targets, ys, olens):
+      target[:olen] = y
+    return feats, ilens, targets, olens
+
 
 class ASRConverter(Converter):
   ''' ASR preprocess '''
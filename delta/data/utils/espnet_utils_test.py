@@ -301,6 +301,41 @@ class KaldiJsonReaderTest(tf.test.TestCase):
           prev_ilen = cur_ilen
         prev_start_ilen = cur_start_ilen
 
+  def test_budget_batches(self):
+    dummy_json = make_dummy_json(128, [1, 700], [1, 100])
+    utts = list(dummy_json.items())
+    idim = utts[0][1]['input'][0]['shape'][1]
+    odim = utts[0][1]['output'][0]['shape'][1]
+
+    def lens(batch, key):
+      return [sample[1][key][0]['shape'][0] for sample in batch]
+
+    batch_frames_in = 2000
+    batch_bins = 2000 * idim
+    batchset = espnet_utils.budget_batches(
+        utts,
+        16,
+        batch_bins=batch_bins,
+        batch_frames_in=batch_frames_in,
+        window=64,
+        rng=np.random.RandomState(1))
+    self.assertEqual(sum(len(batch) for batch in batchset), len(utts))
+    for batch in batchset:
+      ilens = lens(batch, 'input')
+      olens = lens(batch, 'output')
+      self.assertLessEqual(len(batch), 16)
+      if len(batch) > 1:
+        self.assertLessEqual(len(batch) * max(ilens), batch_frames_in)
+        self.assertLessEqual(
+            len(batch) * (max(ilens) * idim + max(olens) * odim), batch_bins)
+      # long to short in minibatch
+      self.assertEqual(ilens, sorted(ilens, reverse=True))
+
+    # a utt over the budget is a batch alone
+    batchset = espnet_utils.budget_batches(utts, 16, batch_frames_in=1)
+    self.assertEqual([len(batch) for batch in batchset], [1] * len(utts))
+    self.assertEqual([batch[0] for batch in batchset], utts)
+
   def test_load_inputs_and_targets_legacy_format(self):
     # batch = [("F01_050C0101_PED_REAL",
     #          {"input": [{"feat": "some/path.ark:123"}],
@@ -444,5 +479,63 @@ class KaldiJsonReaderTest(tf.test.TestCase):
         self.assertEqual(len(o_xs), nexamples)
 
 
+  def test_manifest_batchset(self):
+    generate_json_data(self.config, utils.TRAIN, 10)
+    desire = espnet_utils.get_batches(self.config, utils.TRAIN)
+    self.config['data']['task']['binary_manifest'] = True
+    data_metas = espnet_utils.get_batches(self.config, utils.TRAIN)
+    self.assertEqual(data_metas['n_utts'], desire['n_utts'])
+    self.assertEqual([len(batch) for batch in data_metas['data']],
+                     [len(batch) for batch in desire['data']])
+    self.assertEqual(
+        sorted(utt for batch in data_metas['data'] for utt, _ in batch),
+        sorted(utt for batch in desire['data'] for utt, _ in batch))
+
+    converter = espnet_utils.ASRConverter(self.config)
+    xs, ilens, ys, olens = converter(data_metas['data'][0])
+    self.assertEqual(len(xs), len(data_metas['data'][0]))
+    self.assertAllEqual(ilens, [100] * len(xs))
+    self.assertAllEqual(olens, [4] * len(ys))
+    for y in ys:
+      self.assertAllEqual(y, [1, 2, 3, 10])
+
+  def test_batch_collator(self):
+    xs = [
+        np.random.random((length, 3)).astype(np.float32)
+        for length in (5, 2, 7)
+    ]
+    ys = [np.arange(1, length + 1) for length in (2, 4, 1)]
+
+    for reuse_buffer in (False, True):
+      collator = espnet_utils.BatchCollator(reuse_buffer=reuse_buffer)
+      # the reused buffer holds values of a larger batch
+      collator([np.ones((9, 3), dtype=np.float32)] * 4, ys)
+      feats, ilens, targets, olens = collator(xs, ys)
+      self.assertDTypeEqual(feats, np.float32)
+      self.assertDTypeEqual(targets, np.int64)
+      self.assertEqual(feats.shape, (3, 7, 3))
+      self.assertAllEqual(ilens, [5, 2, 7])
+      self.assertAllEqual(olens, [2, 4, 1])
+      for feat, x in zip(feats, xs):
+        self.assertAllEqual(feat[:len(x)], x)
+        self.assertAllEqual(feat[len(x):], np.zeros_like(feat[len(x):]))
+      self.assertAllEqual(targets, [[1, 2, 0, 0], [1, 2, 3, 4], [1, 0, 0, 0]])
+
+  def test_converter_iterate(self):
+    converter = espnet_utils.ASRConverter(self.config)
+    generate_json_data(self.config, utils.TRAIN, 10)
+    batches = espnet_utils.get_batches(self.config, utils.TRAIN)['data']
+
+    for num_threads in (1, 3):
+      for batch, (xs, ilens, ys, olens) in zip(
+          batches, converter.iterate(batches, num_threads=num_threads)):
+        desire_xs, desire_ilens, desire_ys, desire_olens = converter(batch)
+        self.assertAllEqual(ilens, desire_ilens)
+        self.assertAllEqual(olens, desire_olens)
+        for x, desire_x in zip(xs, desire_xs):
+          self.assertAllEqual(x, desire_x)
+        for y, desire_y in zip(ys, desire_ys):
+          self.assertAllEqual(y, desire_y)
+
 if __name__ == '__main__':
   tf.test.main()
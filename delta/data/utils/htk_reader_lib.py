@@ -15,10 +15,16 @@
 # ==============================================================================
 ''' HTK Reader'''
 import os
-import math
 import numpy as np
 
 
+def _float_dtype(feat_array):
+  ''' keep float32 input as float32, otherwise float64 '''
+  if feat_array.dtype == np.float32:
+    return np.float32
+  return np.float64
+
+
 class HtkReaderIO:
   """
     read the kaldi ark format file
@@ -34,6 +40,7 @@ class HtkReaderIO:
     self._calutlate_mean_variance_start = True
     self._meam_variance_list = []
     self._mean_variance_statu = False
+    self._mean_variance_file = None
     self._mean_array = None
     self._variance_array = None
 
@@ -77,34 +84,23 @@ class HtkReaderIO:
       self._compute_delta_normalizer(delta_window)
 
     frame_num, feat_dim = feat_array.shape
-    tmp_output_delta_feat = [feat_array]
+    dtype = _float_dtype(feat_array)
+    if frame_num == 0:
+      return 0, np.zeros([0, feat_dim * (delta_order + 1)], dtype=dtype)
+
+    weights = self._delta_window_array.astype(dtype)
+    tmp_output_delta_feat = [feat_array.astype(dtype, copy=False)]
     for _ in range(1, delta_order + 1):
-      tmp_delta_feat = np.zeros([frame_num, feat_dim])
-      for tmp_frame_num in range(frame_num):
-        tmp_action_frame_begin = tmp_frame_num - delta_window
-        tmp_action_frame_end = tmp_frame_num + delta_window
-        if tmp_action_frame_begin < 0 or tmp_action_frame_end >= frame_num:
-          for tmp_detal_window in range(-1 * delta_window, delta_window + 1):
-            tmp_action_frame = tmp_frame_num + tmp_detal_window
-            if tmp_action_frame < 0:
-              tmp_action_frame = 0
-              fill_status = True
-            if tmp_action_frame >= frame_num:
-              tmp_action_frame = frame_num - 1
-              fill_status = True
-
-            tmp_delta_feat[tmp_frame_num] += (
-                tmp_detal_window * tmp_output_delta_feat[-1][tmp_action_frame])
-
-          tmp_delta_feat[tmp_frame_num] = (
-              tmp_delta_feat[tmp_frame_num] * self._delta_normalizer)
-        else:
-          tmp_delta_feat[tmp_frame_num] = (
-              np.sum(
-                  (tmp_output_delta_feat[-1]
-                   [tmp_action_frame_begin:tmp_action_frame_end + 1].T *
-                   self._delta_window_array).T,
-                  axis=0))
+      # the frames out of sentence are filled with the first or last frame
+      padded = np.pad(
+          tmp_output_delta_feat[-1], ((delta_window, delta_window), (0, 0)),
+          mode='edge')
+      # correlate with the delta window along time axis
+      tmp_delta_feat = np.zeros([frame_num, feat_dim], dtype=dtype)
+      for tmp_offset, tmp_weight in enumerate(weights):
+        if tmp_weight:
+          tmp_delta_feat += tmp_weight * padded[tmp_offset:tmp_offset +
+                                                frame_num]
       tmp_output_delta_feat.append(tmp_delta_feat)
     output_delta_feat = np.hstack(tmp_output_delta_feat)
     return 0, output_delta_feat
@@ -164,12 +160,12 @@ class HtkReaderIO:
       if dim_number > input_dim_length:
         return -1
 
-      self._mean_array = np.zeros([dim_number])
-      self._variance_array = np.zeros([dim_number])
-      for input_line_number in range(0, dim_number):
-        tmp_mean, tmp_variance = input_list[input_line_number].strip().split()
-        self._mean_array[input_line_number] = float(tmp_mean)
-        self._variance_array[input_line_number] = math.sqrt(float(tmp_variance))
+      mean_variance = np.array(
+          [line.strip().split() for line in input_list[:dim_number]],
+          dtype=np.float64).reshape([dim_number, 2])
+      self._mean_array = mean_variance[:, 0]
+      self._variance_array = np.sqrt(mean_variance[:, 1])
+    self._mean_variance_file = mean_variance_file
     self._mean_variance_statu = True
     return 0
 
@@ -183,16 +179,18 @@ class HtkReaderIO:
             -1, array: failed
             0, array: success and return the new feat array
         """
-    if not self._mean_variance_statu:
+    if not self._mean_variance_statu or \
+        self._mean_variance_file != mean_variance_file or \
+        self._mean_array.shape[0] != feat_array.shape[1]:
       if self._read_mean_variance(mean_variance_file, feat_array.shape[1]) < 0:
         print("[ERROR] _read_mean_variance failed with shape %s %s" %
               (feat_array.shape[0], feat_array.shape[1]))
         return -1, np.array([])
 
-    mean_array = np.array([self._mean_array] * feat_array.shape[0])
-    variance_array = np.array([self._variance_array] * feat_array.shape[0])
-
-    new_feat_array = (feat_array - mean_array) / variance_array
+    # broadcast over frames
+    dtype = _float_dtype(feat_array)
+    new_feat_array = (feat_array - self._mean_array.astype(dtype)) / \
+        self._variance_array.astype(dtype)
     return 0, new_feat_array
 
   def splice_frames(self, feat_array, left_context, right_context):
@@ -206,31 +204,44 @@ class HtkReaderIO:
             -1, array: failed
             0, array: success
         """
+    ret, windows = self.splice_frames_view(feat_array, left_context,
+                                           right_context)
+    if ret != 0:
+      return ret, windows
+    feat_row, length_for_per_feat, feat_dim = windows.shape
+    output_array = windows.reshape([feat_row, length_for_per_feat * feat_dim])
+    return 0, output_array
+
+  #pylint: disable=no-self-use
+  def splice_frames_view(self, feat_array, left_context, right_context):
+    """
+        spliced frames as a read only sliding window view, without copying
+        args:
+            feat_array: the input feature
+            left_context: int type and must >= 0
+            right_context: int type and must >= 0
+        return:
+            -1, array: failed
+            0, array: success, of shape
+              [feat_row, left_context + 1 + right_context, feat_dim],
+              reshape rows of it to get the spliced frames
+        """
     if left_context < 0 or right_context < 0:
       return -1, np.array([])
 
     feat_row, feat_dim = feat_array.shape
     length_for_per_feat = 1 + left_context + right_context
-    #aim_feat_dim = feat_dim * length_for_per_feat
-    output_list = []
-    for row_number in range(feat_row):
-      read_row_number_begin = row_number - left_context
-      read_row_number_end = row_number + right_context
-      if read_row_number_begin < 0 or read_row_number_end >= feat_row:
-        tmp_output_list = []
-        for tmp_row_number in range(length_for_per_feat):
-          read_row_number = row_number + tmp_row_number - left_context
-          if read_row_number < 0:
-            read_row_number = 0
-
-          if read_row_number >= feat_row:
-            read_row_number = feat_row - 1
-
-          tmp_output_list.append(feat_array[read_row_number])
-        tmp_output_array = np.hstack(tmp_output_list)
-        output_list.append(tmp_output_array)
-      else:
-        output_list.append(
-            feat_array[read_row_number_begin:read_row_number_end + 1].flatten())
-    output_array = np.vstack(output_list)
-    return 0, output_array
+    if feat_row == 0:
+      return 0, np.zeros([0, length_for_per_feat, feat_dim],
+                         dtype=feat_array.dtype)
+
+    # the rows out of feature are filled with the first or last row
+    padded = np.pad(
+        feat_array, ((left_context, right_context), (0, 0)), mode='edge')
+    # sliding window view of shape [feat_row, length_for_per_feat, feat_dim]
+    windows = np.lib.stride_tricks.as_strided(
+        padded,
+        shape=(feat_row, length_for_per_feat, feat_dim),
+        strides=(padded.strides[0], padded.strides[0], padded.strides[1]),
+        writeable=False)
+    return 0, windows
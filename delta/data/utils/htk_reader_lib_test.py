@@ -0,0 +1,166 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+''' HTK reader unittest and benchmark '''
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+from absl import logging
+
+from delta.data.utils.htk_reader_lib import HtkReaderIO
+
+
+def _add_delta_loop(feat_array, delta_order=2, delta_window=2):
+  ''' frame by frame delta, for reference '''
+  normalizer = 1.0 / np.sum(
+      np.square(np.arange(-delta_window, delta_window + 1)))
+  frame_num, feat_dim = feat_array.shape
+  output = [feat_array]
+  for _ in range(delta_order):
+    delta = np.zeros([frame_num, feat_dim])
+    for frame in range(frame_num):
+      for window in range(-delta_window, delta_window + 1):
+        index = min(max(frame + window, 0), frame_num - 1)
+        delta[frame] += window * output[-1][index]
+      delta[frame] *= normalizer
+    output.append(delta)
+  return np.hstack(output)
+
+
+def _splice_frames_loop(feat_array, left_context, right_context):
+  ''' row by row splice, for reference '''
+  feat_row = feat_array.shape[0]
+  output = []
+  for row in range(feat_row):
+    indexes = [
+        min(max(row + offset, 0), feat_row - 1)
+        for offset in range(-left_context, right_context + 1)
+    ]
+    output.append(np.hstack([feat_array[index] for index in indexes]))
+  return np.vstack(output)
+
+
+class HtkReaderIOTest(tf.test.TestCase):
+  ''' HTK reader unittest '''
+
+  def setUp(self):
+    ''' set up '''
+    np.random.seed(12)
+    self.feat_dim = 40
+    self.feat = np.random.randn(57, self.feat_dim).astype(np.float32)
+    self.cmvn_path = os.path.join(self.get_temp_dir(), 'htk.cmvn')
+    self.mean = np.random.randn(self.feat_dim * 3)
+    self.variance = np.random.rand(self.feat_dim * 3) + 0.5
+    with open(self.cmvn_path, 'w') as fp:
+      for mean, variance in zip(self.mean, self.variance):
+        fp.write('{} {}\n'.format(mean, variance))
+
+  def tearDown(self):
+    ''' tear down '''
+    if os.path.exists(self.cmvn_path):
+      os.unlink(self.cmvn_path)
+
+  def test_add_delta(self):
+    ''' test add delta '''
+    reader = HtkReaderIO()
+    for delta_window in (1, 2, 3):
+      ret, feat = reader.add_delta(self.feat, 2, delta_window)
+      self.assertEqual(ret, 0)
+      self.assertEqual(feat.dtype, np.float32)
+      self.assertEqual(feat.shape, (57, self.feat_dim * 3))
+      self.assertAllClose(
+          feat, _add_delta_loop(self.feat, 2, delta_window), rtol=1e-5,
+          atol=1e-5)
+
+    ret, feat = reader.add_delta(self.feat[:2], 2, 2)
+    self.assertAllClose(feat, _add_delta_loop(self.feat[:2], 2, 2), atol=1e-5)
+
+  def test_normalization(self):
+    ''' test cmvn '''
+    reader = HtkReaderIO()
+    _, feat = reader.add_delta(self.feat, 2, 2)
+    ret, norm_feat = reader.normalization_feat_by_mean_variance(
+        feat, self.cmvn_path)
+    self.assertEqual(ret, 0)
+    self.assertEqual(norm_feat.dtype, np.float32)
+    self.assertAllClose(
+        norm_feat, (feat - self.mean) / np.sqrt(self.variance),
+        rtol=1e-5,
+        atol=1e-5)
+
+    # cmvn file is parsed once
+    os.unlink(self.cmvn_path)
+    ret, _ = reader.normalization_feat_by_mean_variance(feat, self.cmvn_path)
+    self.assertEqual(ret, 0)
+
+  def test_splice_frames(self):
+    ''' test splice frames '''
+    reader = HtkReaderIO()
+    for left_context, right_context in ((0, 0), (3, 4), (5, 0)):
+      ret, feat = reader.splice_frames(self.feat, left_context, right_context)
+      self.assertEqual(ret, 0)
+      self.assertEqual(feat.dtype, np.float32)
+      self.assertAllEqual(
+          feat, _splice_frames_loop(self.feat, left_context, right_context))
+
+    ret, _ = reader.splice_frames(self.feat, -1, 0)
+    self.assertEqual(ret, -1)
+
+  def test_splice_frames_view(self):
+    ''' test spliced windows reshaped from the strided view '''
+    reader = HtkReaderIO()
+    ret, view = reader.splice_frames_view(self.feat, 3, 4)
+    self.assertEqual(ret, 0)
+    self.assertEqual(view.shape, (len(self.feat), 8, self.feat_dim))
+    self.assertFalse(view.flags.writeable)
+    spliced = _splice_frames_loop(self.feat, 3, 4)
+    window = view[2:7].reshape([5, -1])
+    self.assertAllEqual(window, spliced[2:7])
+
+
+class HtkReaderIOBenchmark(tf.test.Benchmark):
+  ''' HTK reader benchmark, vectorized vs frame by frame '''
+
+  def benchmark_add_delta_splice(self):
+    ''' run with `--benchmarks=.` '''
+    feat = np.random.randn(20000, 40).astype(np.float32)
+    reader = HtkReaderIO()
+
+    start = time.time()
+    _, feat_fast = reader.add_delta(feat, 2, 2)
+    _, feat_fast = reader.splice_frames(feat_fast, 3, 4)
+    fast_time = time.time() - start
+
+    start = time.time()
+    feat_slow = _splice_frames_loop(_add_delta_loop(feat, 2, 2), 3, 4)
+    slow_time = time.time() - start
+
+    np.testing.assert_allclose(feat_fast, feat_slow, rtol=1e-4, atol=1e-4)
+    logging.info('add_delta + splice_frames: {:.4f}s vs loop {:.4f}s'.format(
+        fast_time, slow_time))
+    self.report_benchmark(
+        iters=1,
+        wall_time=fast_time,
+        extras={
+            'loop_wall_time': slow_time,
+            'speedup': slow_time / fast_time
+        })
+
+
+if __name__ == '__main__':
+  logging.set_verbosity(logging.INFO)
+  tf.test.main()
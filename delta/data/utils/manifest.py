@@ -0,0 +1,176 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+'''
+persistent manifest of the audio files of a dataset
+
+  one .npz per data path, with columns of
+  filename, class, duration, frames and mtime
+'''
+import os
+import hashlib
+import functools
+import collections
+import multiprocessing as mp
+
+import numpy as np
+import librosa
+import soundfile
+from absl import logging
+
+Record = collections.namedtuple('Record',
+                                ['class_name', 'duration', 'frames', 'mtime'])
+
+
+def npy_shape(filename):
+  ''' shape of array in .npy file, read from header only '''
+  with open(filename, 'rb') as fin:
+    version = np.lib.format.read_magic(fin)
+    if version == (1, 0):
+      shape, _, _ = np.lib.format.read_array_header_1_0(fin)
+    else:
+      shape, _, _ = np.lib.format.read_array_header_2_0(fin)
+  return shape
+
+
+def file_info(filename, sr, winstep):  #pylint: disable=invalid-name
+  '''
+  (frames, duration, mtime) of *.npy feature or *.wav file,
+    frames of feature or samples of wav, duration in second
+  '''
+  mtime = os.path.getmtime(filename)
+  if filename.endswith('.npy'):
+    frames = npy_shape(filename)[0]
+    duration = librosa.frames_to_time(frames, hop_length=winstep * sr, sr=sr)
+  elif filename.endswith('.wav'):
+    info = soundfile.info(filename)
+    frames = info.frames
+    duration = frames / info.samplerate
+  else:
+    raise ValueError("filename suffix not .npy or .wav: {}".format(
+        os.path.splitext(filename)[-1]))
+  return int(frames), float(duration), mtime
+
+
+def manifest_path(manifest_dir, data_path, suffix):
+  ''' path of the manifest of `suffix` files under `data_path` '''
+  digest = hashlib.md5(os.path.abspath(data_path).encode('utf-8')).hexdigest()
+  return os.path.join(manifest_dir, '{}{}.manifest.npz'.format(digest, suffix))
+
+
+def _join(strings):
+  return np.frombuffer('\n'.join(strings).encode('utf-8'), dtype=np.uint8)
+
+
+def _split(array):
+  if not array.size:
+    return []
+  return array.tobytes().decode('utf-8').split('\n')
+
+
+class DatasetManifest:
+  ''' records of files, in order of scan '''
+
+  def __init__(self, sr, winstep):  #pylint: disable=invalid-name
+    self.sr = sr  #pylint: disable=invalid-name
+    self.winstep = winstep
+    # filename -> Record
+    self._records = collections.OrderedDict()
+
+  def __len__(self):
+    return len(self._records)
+
+  def __contains__(self, filename):
+    return filename in self._records
+
+  def __getitem__(self, filename):
+    return self._records[filename]
+
+  def items(self):
+    ''' (filename, Record) '''
+    return self._records.items()
+
+  @classmethod
+  def load(cls, path):
+    ''' load manifest saved by `save` '''
+    with np.load(path) as data:
+      sr, winstep = data['meta']  #pylint: disable=invalid-name
+      manifest = cls(int(sr), float(winstep))
+      filenames = _split(data['filenames'])
+      classes = _split(data['classes'])
+      columns = zip(filenames, data['class_ids'].tolist(),
+                    data['durations'].tolist(), data['frames'].tolist(),
+                    data['mtimes'].tolist())
+    for filename, class_id, duration, frames, mtime in columns:
+      manifest._records[filename] = Record(classes[class_id], duration, frames,
+                                           mtime)
+    logging.info('load manifest: {}, {} files'.format(path, len(manifest)))
+    return manifest
+
+  def save(self, path):
+    ''' save as columns of arrays '''
+    classes = sorted({record.class_name for record in self._records.values()})
+    class_ids = {class_name: i for i, class_name in enumerate(classes)}
+    records = list(self._records.values())
+    dirname = os.path.dirname(path)
+    if dirname:
+      os.makedirs(dirname, exist_ok=True)
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as fout:
+      np.savez(
+          fout,
+          meta=np.array([self.sr, self.winstep], dtype=np.float64),
+          filenames=_join(self._records.keys()),
+          classes=_join(classes),
+          class_ids=np.array([class_ids[r.class_name] for r in records],
+                             dtype=np.int32),
+          durations=np.array([r.duration for r in records], dtype=np.float64),
+          frames=np.array([r.frames for r in records], dtype=np.int64),
+          mtimes=np.array([r.mtime for r in records], dtype=np.float64))
+    os.replace(tmp, path)
+    logging.info('save manifest: {}, {} files'.format(path, len(self)))
+
+  def update(self, filenames, class_fn, num_workers=0):
+    '''
+    sync with `filenames`, only new and modified files are scanned,
+      removed files are dropped.
+    class_fn: filename -> class name
+    return: whether the records changed, by scanned or removed files
+    '''
+    records = collections.OrderedDict()
+    stale = []
+    for filename in filenames:
+      record = self._records.get(filename)
+      if record is not None and record.mtime == os.path.getmtime(filename):
+        records[filename] = record
+      else:
+        records[filename] = None
+        stale.append(filename)
+
+    info_fn = functools.partial(file_info, sr=self.sr, winstep=self.winstep)
+    if num_workers and len(stale) > 1:
+      with mp.get_context('spawn').Pool(num_workers) as pool:
+        infos = pool.map(info_fn, stale, chunksize=256)
+    else:
+      infos = [info_fn(filename) for filename in stale]
+
+    for filename, (frames, duration, mtime) in zip(stale, infos):
+      records[filename] = Record(class_fn(filename), duration, frames, mtime)
+    num_removed = sum(
+        1 for filename in self._records if filename not in records)
+    self._records = records
+    logging.info('manifest: {} files, {} scanned, {} removed'.format(
+        len(records), len(stale), num_removed))
+    return bool(stale or num_removed)
@@ -0,0 +1,80 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+''' dataset manifest unittest '''
+import os
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+from delta.data.utils import manifest as manifest_lib
+
+
+class DatasetManifestTest(tf.test.TestCase):
+  ''' dataset manifest unittest '''
+
+  def setUp(self):
+    ''' set up '''
+    self.tmpdir = tempfile.mkdtemp()
+    self.filenames = []
+    for i, class_name in enumerate(['normal', 'conflict', 'normal']):
+      dirname = os.path.join(self.tmpdir, class_name)
+      os.makedirs(dirname, exist_ok=True)
+      filename = os.path.join(dirname, '{}.npy'.format(i))
+      np.save(filename, np.zeros([100 * (i + 1), 40, 1], dtype=np.float32))
+      self.filenames.append(filename)
+
+  @staticmethod
+  def _class_fn(filename):
+    return os.path.basename(os.path.dirname(filename))
+
+  def test_npy_shape(self):
+    ''' shape from header '''
+    self.assertEqual(manifest_lib.npy_shape(self.filenames[1]), (200, 40, 1))
+    frames, duration, _ = manifest_lib.file_info(
+        self.filenames[2], sr=8000, winstep=0.01)
+    self.assertEqual(frames, 300)
+    self.assertAllClose(duration, 3.0)
+
+  def test_update(self):
+    ''' save, load and update by mtime '''
+    path = manifest_lib.manifest_path(self.tmpdir, self.tmpdir, '.npy')
+    manifest = manifest_lib.DatasetManifest(8000, 0.01)
+    self.assertTrue(manifest.update(self.filenames, self._class_fn))
+    manifest.save(path)
+
+    manifest = manifest_lib.DatasetManifest.load(path)
+    self.assertEqual(list(dict(manifest.items())), self.filenames)
+    self.assertEqual(manifest[self.filenames[1]].class_name, 'conflict')
+    self.assertEqual(manifest[self.filenames[2]].frames, 300)
+    self.assertAllClose(manifest[self.filenames[0]].duration, 1.0)
+
+    # rewrite one file, remove one file
+    np.save(self.filenames[0], np.zeros([500, 40, 1], dtype=np.float32))
+    mtime = manifest[self.filenames[0]].mtime + 10
+    os.utime(self.filenames[0], (mtime, mtime))
+    self.assertTrue(manifest.update(self.filenames[:2], self._class_fn))
+    self.assertEqual(len(manifest), 2)
+    self.assertEqual(manifest[self.filenames[0]].frames, 500)
+
+    # only removed, then unchanged
+    self.assertTrue(manifest.update(self.filenames[:1], self._class_fn))
+    self.assertEqual(len(manifest), 1)
+    self.assertFalse(manifest.update(self.filenames[:1], self._class_fn))
+
+
+if __name__ == '__main__':
+  tf.test.main()
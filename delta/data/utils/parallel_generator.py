@@ -0,0 +1,271 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+''' Python data generator running in worker processes,
+    examples are passed back through shared memory. '''
+import time
+import queue
+import weakref
+import traceback
+import collections
+import multiprocessing as mp
+
+import numpy as np
+from absl import logging
+
+_ALIGN = 64
+
+# an array packed in slab
+SlabArray = collections.namedtuple('SlabArray', ['offset', 'dtype', 'shape'])
+
+DATA = 'data'
+DONE = 'done'
+ERROR = 'error'
+
+
+def _aligned(offset):
+  return offset + (-offset % _ALIGN)
+
+
+def example_nbytes(example):
+  ''' bytes of the arrays of one example when packed into slab '''
+  return sum(
+      _aligned(field.nbytes)
+      for field in example
+      if isinstance(field, np.ndarray))
+
+
+class SlabRing:
+  '''
+  A ring of preallocated shared memory slabs between worker processes and
+  the host process. A worker packs the arrays of some examples into a free
+  slab and passes only the slab index with the small fields, the host
+  copies the arrays out and frees the slab. At most `num_slabs` results are
+  in flight, a worker blocks until a slab is freed.
+  '''
+
+  def __init__(self, num_slabs, slab_bytes, ctx=None):
+    ctx = ctx or mp.get_context('spawn')
+    self.num_slabs = num_slabs
+    self.slab_bytes = slab_bytes
+    self._slabs = [ctx.RawArray('b', slab_bytes) for _ in range(num_slabs)]
+    self._free = ctx.Queue()
+    for slot in range(num_slabs):
+      self._free.put(slot)
+    self._ready = ctx.Queue()
+    self._views = {}
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['_views'] = {}
+    return state
+
+  def _view(self, slot):
+    if slot not in self._views:
+      self._views[slot] = np.frombuffer(self._slabs[slot], dtype=np.uint8)
+    return self._views[slot]
+
+  def put(self, tag, examples):
+    '''
+    worker side, pack examples into a free slab, blocks if there is none.
+    arrays which do not fit in the slab are sent inline.
+    '''
+    slot = self._free.get()
+    view = self._view(slot)
+    offset = 0
+    packed = []
+    for example in examples:
+      fields = []
+      for field in example:
+        if isinstance(field, np.ndarray) and not field.dtype.hasobject and \
+            _aligned(offset) + field.nbytes <= self.slab_bytes:
+          offset = _aligned(offset)
+          view[offset:offset + field.nbytes] = \
+              np.ascontiguousarray(field).reshape([-1]).view(np.uint8)
+          fields.append(SlabArray(offset, field.dtype.str, field.shape))
+          offset += field.nbytes
+        else:
+          fields.append(field)
+      packed.append(tuple(fields))
+    self._ready.put((DATA, tag, slot, packed))
+
+  def put_control(self, kind, tag, message=None):
+    ''' worker side, send a message without slab '''
+    self._ready.put((kind, tag, None, message))
+
+  def get(self, timeout=None):
+    '''
+    host side, return (kind, tag, payload),
+      payload is list of examples for DATA, otherwise the message.
+    '''
+    kind, tag, slot, payload = self._ready.get(timeout=timeout)
+    if slot is None:
+      return kind, tag, payload
+
+    view = self._view(slot)
+    examples = []
+    for fields in payload:
+      example = []
+      for field in fields:
+        if isinstance(field, SlabArray):
+          dtype = np.dtype(field.dtype)
+          nbytes = dtype.itemsize * int(np.prod(field.shape))
+          field = view[field.offset:field.offset + nbytes].view(dtype).reshape(
+              field.shape).copy()
+        example.append(field)
+      examples.append(tuple(example))
+    self._free.put(slot)
+    return kind, tag, examples
+
+
+def _worker_loop(task, method, requests, ring, cancelled):
+  '''
+  worker process, run `task.method(item)` for each requested item,
+    requests of tags up to `cancelled` are skipped
+  '''
+  generate = getattr(task, method)
+  while True:
+    request = requests.get()
+    if request is None:
+      break
+    tag, items = request
+    try:
+      examples, nbytes = [], 0
+      for item in items:
+        if tag <= cancelled.value:
+          examples = []
+          break
+        for example in generate(item):
+          size = example_nbytes(example)
+          if examples and nbytes + size > ring.slab_bytes:
+            ring.put(tag, examples)
+            examples, nbytes = [], 0
+          examples.append(example)
+          nbytes += size
+      if examples:
+        ring.put(tag, examples)
+    except Exception:  #pylint: disable=broad-except
+      ring.put_control(ERROR, tag, traceback.format_exc())
+    ring.put_control(DONE, tag)
+
+
+def _shutdown(workers, requests, ring, timeout=5):
+  ''' stop and join workers, results still in flight are dropped '''
+  for _ in workers:
+    requests.put(None)
+  deadline = time.time() + timeout
+  while any(worker.is_alive() for worker in workers) and \
+      time.time() < deadline:
+    # free slabs, workers blocked on a full ring can reach the sentinel
+    try:
+      ring.get(timeout=0.05)
+    except queue.Empty:
+      pass
+  for worker in workers:
+    worker.join(timeout=0.1)
+    if worker.is_alive():
+      worker.terminate()
+
+
+class ParallelGenerator:
+  '''
+  Yield examples of `task.<method>(item)` for items, the items are sharded
+  in chunks across `num_workers` spawned processes which hold a copy of
+  `task`. Items are dispatched in the given order, so a shuffle of items
+  before calling is kept up to the interleaving of workers. Requests of
+  a call which is not consumed to the end are cancelled.
+  '''
+
+  #pylint: disable=too-many-arguments
+  def __init__(self,
+               task,
+               method='generate_item',
+               num_workers=4,
+               queue_depth=8,
+               slab_bytes=16 << 20,
+               chunk_size=4):
+    self._task = task
+    self._method = method
+    self._num_workers = num_workers
+    self._queue_depth = queue_depth
+    self._slab_bytes = slab_bytes
+    self._chunk_size = chunk_size
+    self._ctx = mp.get_context('spawn')
+    self._workers = []
+    self._requests = None
+    self._ring = None
+    self._cancelled = None
+    self._tag = 0
+    self._finalizer = None
+
+  def start(self):
+    ''' spawn workers once, they are reused by every call '''
+    if self._workers:
+      return
+    logging.info('Starting {} generator workers, {} slabs of {} bytes'.format(
+        self._num_workers, self._queue_depth, self._slab_bytes))
+    self._ring = SlabRing(self._queue_depth, self._slab_bytes, self._ctx)
+    self._requests = self._ctx.Queue()
+    self._cancelled = self._ctx.Value('q', 0)
+    for _ in range(self._num_workers):
+      worker = self._ctx.Process(
+          target=_worker_loop,
+          args=(self._task, self._method, self._requests, self._ring,
+                self._cancelled),
+          daemon=True)
+      worker.start()
+      self._workers.append(worker)
+    self._finalizer = weakref.finalize(self, _shutdown, self._workers,
+                                       self._requests, self._ring)
+
+  def close(self):
+    ''' stop workers '''
+    if self._finalizer:
+      self._finalizer()
+    self._workers = []
+
+  def __call__(self, items):
+    ''' generator of examples of `items` '''
+    for examples in self.batches(items):
+      for example in examples:
+        yield example
+
+  def batches(self, items):
+    ''' generator of lists of examples of `items`, one list per slab '''
+    self.start()
+    # results of an abandoned call are dropped by tag
+    self._tag += 1
+    tag = self._tag
+
+    items = list(items)
+    pending = 0
+    for i in range(0, len(items), self._chunk_size):
+      self._requests.put((tag, items[i:i + self._chunk_size]))
+      pending += 1
+
+    try:
+      while pending:
+        kind, result_tag, payload = self._ring.get()
+        if result_tag != tag:
+          continue
+        if kind == ERROR:
+          raise RuntimeError('generator worker failed:\n{}'.format(payload))
+        if kind == DONE:
+          pending -= 1
+          continue
+        yield payload
+    finally:
+      if pending:
+        self._cancelled.value = tag
@@ -0,0 +1,84 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+''' parallel generator unittest '''
+import numpy as np
+import tensorflow as tf
+
+from delta.data.utils.parallel_generator import ParallelGenerator
+
+
+class _RangeTask:
+  ''' yields `item` examples of shape [item, 3] '''
+
+  def generate_item(self, item):
+    if item < 0:
+      raise ValueError('bad item {}'.format(item))
+    for i in range(item):
+      feat = np.full([item, 3], i, dtype=np.float32)
+      yield feat, np.int64(item), 'utt{}-{}'.format(item, i)
+
+
+class ParallelGeneratorTest(tf.test.TestCase):
+  ''' parallel generator unittest '''
+
+  def test_generate(self):
+    ''' all examples come back once, with arrays intact '''
+    items = list(range(1, 12))
+    # small slabs, examples of one chunk are split across slabs
+    generator = ParallelGenerator(
+        _RangeTask(), num_workers=2, queue_depth=2, slab_bytes=256)
+    try:
+      for _ in range(2):
+        examples = list(generator(items))
+        self.assertEqual(len(examples), sum(items))
+        keys = sorted(key for _, _, key in examples)
+        self.assertEqual(
+            keys, sorted('utt{}-{}'.format(n, i) for n in items
+                         for i in range(n)))
+        for feat, num, key in examples:
+          self.assertEqual(feat.dtype, np.float32)
+          self.assertAllEqual(feat.shape, [num, 3])
+          self.assertAllEqual(feat, np.full([num, 3], int(key.split('-')[1])))
+    finally:
+      generator.close()
+
+  def test_cancel(self):
+    ''' abandoned call is cancelled, workers exit on close '''
+    generator = ParallelGenerator(
+        _RangeTask(), num_workers=2, queue_depth=2, slab_bytes=256)
+    workers = []
+    try:
+      batches = generator.batches(list(range(1, 100)))
+      self.assertNotEmpty(next(batches))
+      batches.close()
+      self.assertLen(list(generator([3, 4])), 7)
+      workers = list(generator._workers)  #pylint: disable=protected-access
+    finally:
+      generator.close()
+    self.assertEqual([worker.exitcode for worker in workers], [0, 0])
+
+  def test_error(self):
+    ''' worker exceptions are raised in host '''
+    generator = ParallelGenerator(_RangeTask(), num_workers=1)
+    try:
+      with self.assertRaises(RuntimeError):
+        list(generator([1, -1, 2]))
+    finally:
+      generator.close()
+
+
+if __name__ == '__main__':
+  tf.test.main()
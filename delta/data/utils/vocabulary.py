@@ -14,14 +14,18 @@
 # limitations under the License.
 # ==============================================================================
 """Going to be deprecated"""
+import os
 import copy
+import itertools
+import functools
 import collections
+import multiprocessing as mp
 
 # pylint: disable=too-many-instance-attributes
 
 
 class Vocabulary:
-  ''' vocabulary '''
+  ''' vocabulary, ids are assigned in order of first occurrence '''
 
   def __init__(self, use_default_dict):
     self._padding_token = "<pad>"
@@ -39,39 +43,64 @@ class Vocabulary:
       self._slash_s_token: 5
     }
     self.use_default_dict = use_default_dict
+    self._reset()
+    self._freq = collections.Counter()
+
+  def _reset(self):
+    ''' mapping of default dict only '''
     if self.use_default_dict:
       self._mapping = copy.deepcopy(self._default_dict)
     else:
       self._mapping = {}
-    self._freq = collections.defaultdict(int)
+    # id -> word
+    self._words = sorted(self._mapping, key=self._mapping.get)
 
   def __getitem__(self, key):
     return self._mapping[key]
 
-  def add(self, word):
+  def __len__(self):
+    return len(self._words)
+
+  def _append(self, word):
+    self._mapping[word] = len(self._words)
+    self._words.append(word)
+
+  def add(self, word, count=1):
     ''' update vocab statis'''
     if word not in self._mapping:
-      self._mapping[word] = max(self._mapping.values()) + 1
-    self._freq[word] += 1
+      self._append(word)
+    self._freq[word] += count
 
-  def trim(self, min_frequency):
-    ''' trim word freq less than min_frequency'''
-    # sort by frequency
-    self._freq = sorted(self._freq.items(), key=lambda x: x[1], reverse=True)
-
-    if self.use_default_dict:
-      self._mapping = copy.deepcopy(self._default_dict)
-      idx = len(self._default_dict)
-    else:
-      self._mapping = {}
-      idx = 0
+  def update(self, counter):
+    ''' add words with counts of `counter`, e.g. result of `count_files` '''
+    for word, count in counter.items():
+      self.add(word, count)
 
-    for word, count in self._freq:
-      if count < min_frequency:
+  def trim(self, min_frequency=0, max_size=None):
+    '''
+    keep the `max_size` most frequent words with freq no less than
+      min_frequency, ids are reassigned by frequency.
+    '''
+    self._reset()
+    freq = collections.Counter()
+    # sort by frequency, ties in order of first occurrence
+    for word, count in self._freq.most_common():
+      if count < min_frequency or (max_size is not None and
+                                   len(freq) >= max_size):
         break
-      self._mapping[word] = idx
-      idx += 1
-    self._freq = dict(self._freq[:idx - 1])
+      freq[word] = count
+      if word not in self._mapping:
+        self._append(word)
+    self._freq = freq
+
+  def save(self, vocab_file_path):
+    ''' save vocabs in id order, a tab separated word and id per line '''
+    dirname = os.path.dirname(vocab_file_path)
+    if dirname and not os.path.exists(dirname):
+      os.makedirs(dirname)
+    with open(vocab_file_path, "w", encoding='utf-8') as out_f:
+      for _id, word in enumerate(self._words):
+        out_f.write("{}\t{}\n".format(word, _id))
 
   @property
   def freq(self):
@@ -82,3 +111,80 @@ class Vocabulary:
   def mapping(self):
     ''' candy _mapping'''
     return self._mapping
+
+  @property
+  def words(self):
+    ''' words in id order '''
+    return self._words
+
+
+def count_tokens(lines):
+  ''' token counts of whitespace tokenized lines '''
+  return collections.Counter(
+      itertools.chain.from_iterable(line.split() for line in lines))
+
+
+def file_chunks(paths, chunk_bytes=64 << 20):
+  ''' split files into (path, start, end) byte ranges '''
+  chunks = []
+  for path in paths:
+    size = os.path.getsize(path)
+    for start in range(0, size, chunk_bytes):
+      chunks.append((path, start, min(start + chunk_bytes, size)))
+  return chunks
+
+
+def iter_chunk_lines(chunk):
+  ''' bytes lines which start in (path, start, end) chunk '''
+  path, start, end = chunk
+  with open(path, 'rb') as in_f:
+    if start:
+      # the line across `start` belongs to the previous chunk
+      in_f.seek(start - 1)
+      in_f.readline()
+    while in_f.tell() < end:
+      line = in_f.readline()
+      if not line:
+        break
+      yield line
+
+
+def _chunk_texts(chunk, column=None, sep='\t'):
+  ''' text of lines which start in chunk '''
+  for line in iter_chunk_lines(chunk):
+    text = line.decode('utf-8').rstrip('\n')
+    if column is not None:
+      parts = text.split(sep)
+      if len(parts) <= column:
+        continue
+      text = parts[column]
+    yield text
+
+
+def count_chunk(chunk, column=None, sep='\t'):
+  '''
+  token counts of a chunk of file
+    column: count only the `column`th field of `sep` separated lines
+  '''
+  return count_tokens(_chunk_texts(chunk, column, sep))
+
+
+def count_files(paths, column=None, sep='\t', num_workers=0,
+                chunk_bytes=64 << 20):
+  '''
+  token counts of files, streamed in chunks of `chunk_bytes`,
+    counted in `num_workers` processes if it is set.
+  Counts are merged in chunk order, so the first occurrence order and
+    therefore the ids are the same with any `num_workers`.
+  '''
+  chunks = file_chunks(paths, chunk_bytes)
+  count_fn = functools.partial(count_chunk, column=column, sep=sep)
+  counter = collections.Counter()
+  if num_workers and len(chunks) > 1:
+    with mp.get_context('spawn').Pool(num_workers) as pool:
+      for chunk_counter in pool.imap(count_fn, chunks):
+        counter.update(chunk_counter)
+  else:
+    for chunk in chunks:
+      counter.update(count_fn(chunk))
+  return counter
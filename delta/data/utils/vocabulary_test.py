@@ -0,0 +1,93 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+''' vocabulary unittest '''
+import os
+import tempfile
+
+import tensorflow as tf
+
+from delta.data.utils.vocabulary import Vocabulary
+from delta.data.utils.vocabulary import count_files
+from delta.data.utils.vocabulary import count_tokens
+
+
+class VocabularyTest(tf.test.TestCase):
+  ''' vocabulary unittest '''
+
+  def setUp(self):
+    ''' set up '''
+    self.lines = [
+        "pos\tb a c a", "neg\td a b", "pos\tc a e", "neg\tb a", "pos\t你 好 a"
+    ]
+    self.texts = [line.split('\t')[1] for line in self.lines]
+    self.tmpdir = tempfile.mkdtemp()
+    self.path = os.path.join(self.tmpdir, 'train.txt')
+    with open(self.path, 'w', encoding='utf-8') as out_f:
+      for line in self.lines:
+        out_f.write(line + '\n')
+
+  def test_add(self):
+    ''' ids in order of first occurrence '''
+    vocab = Vocabulary(use_default_dict=True)
+    for text in self.texts:
+      for word in text.split():
+        vocab.add(word)
+    self.assertEqual(len(vocab), 13)
+    self.assertEqual(vocab['<pad>'], 0)
+    self.assertEqual(vocab['b'], 6)
+    self.assertEqual(vocab['好'], 12)
+    self.assertEqual(vocab.freq['a'], 6)
+
+  def test_trim(self):
+    ''' trim by frequency and size, ids by frequency '''
+    vocab = Vocabulary(use_default_dict=True)
+    vocab.update(count_tokens(self.texts))
+    vocab.trim(min_frequency=2)
+    self.assertEqual(vocab.words[6:], ['a', 'b', 'c'])
+    self.assertEqual(dict(vocab.freq), {'a': 6, 'b': 3, 'c': 2})
+
+    vocab = Vocabulary(use_default_dict=False)
+    vocab.update(count_tokens(self.texts))
+    vocab.trim(max_size=2)
+    self.assertEqual(vocab.mapping, {'a': 0, 'b': 1})
+
+  def test_count_files(self):
+    ''' chunked and parallel counting agree with counting lines '''
+    expected = count_tokens(self.texts)
+    for chunk_bytes in (1, 7, 1 << 20):
+      counter = count_files([self.path], column=1, chunk_bytes=chunk_bytes)
+      self.assertEqual(counter, expected)
+      self.assertEqual(list(counter), list(expected))
+    counter = count_files([self.path, self.path],
+                          column=0,
+                          num_workers=2,
+                          chunk_bytes=16)
+    self.assertEqual(counter, {'pos': 6, 'neg': 4})
+
+  def test_save(self):
+    ''' save in id order '''
+    vocab = Vocabulary(use_default_dict=False)
+    vocab.update(count_files([self.path], column=1))
+    vocab_path = os.path.join(self.tmpdir, 'vocab', 'text_vocab.txt')
+    vocab.save(vocab_path)
+    with open(vocab_path, encoding='utf-8') as in_f:
+      lines = in_f.read().splitlines()
+    self.assertEqual(lines[:3], ['b\t0', 'a\t1', 'c\t2'])
+    self.assertEqual(len(lines), 7)
+
+
+if __name__ == '__main__':
+  tf.test.main()
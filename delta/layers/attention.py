@@ -156,8 +156,8 @@ class MatchAttention(Layer):
   def call(self, tensors):
     """Attention layer."""
     left, right = tensors
-    len_left = left.shape[1]
-    len_right = right.shape[1]
+    len_left = tf.shape(left)[1]
+    len_right = tf.shape(right)[1]
     tensor_left = tf.expand_dims(left, axis=2)
     tensor_right = tf.expand_dims(right, axis=1)
     tensor_left = tf.tile(tensor_left, [1, 1, len_right, 1])
@@ -15,7 +15,11 @@
 # ==============================================================================
 """Main entrance of the program."""
 
+import os
+import time
 import random
+import functools
+import multiprocessing
 import numpy as np
 import tensorflow as tf
 from absl import flags
@@ -23,6 +27,7 @@ from absl import app
 from absl import logging
 
 from delta import utils
+from delta.data import feat as feat_lib
 from delta.utils.register import registers
 from delta.utils.register import import_all_modules_for_register
 
@@ -49,6 +54,82 @@ def set_seed(config):
   tf.set_random_seed(random_seed)
 
 
+#pylint: disable=too-many-locals
+def gen_feat(config, paths, dry_run=False):
+  """
+  Extract features of all wavs under `paths` with a process pool.
+  The file list is sharded across `gen_feat_workers` processes, each runs
+  TF with `gen_feat_threads` threads (default 1), wavs whose feature is
+  newer than themselves are skipped, so it can be resumed.
+  If `feat_archive` is set, each shard is packed into a part archive, and
+  the parts are appended to the existing archive at last, feats of removed
+  wavs are dropped from its index, `feat_archive_compact` rewrites it.
+  """
+  featconf = dict(config['data']['task']['audio'], dry_run=dry_run)
+  num_workers = featconf.get('gen_feat_workers') or os.cpu_count()
+  # one TF thread per worker, workers already use all cpus
+  featconf['gen_feat_threads'] = featconf.get('gen_feat_threads') or 1
+  shard_size = featconf.get('gen_feat_shard_size') or 64
+
+  wavpaths = []
+  for data_path in paths:
+    for root, dirnames, filenames in os.walk(data_path):
+      del dirnames
+      for filename in filenames:
+        if filename.endswith('.wav'):
+          wavpaths.append(os.path.join(root, filename))
+  wavpaths.sort()
+
+  nextract, nskip, seconds = 0, 0, 0.0
+  archive_path = featconf.get('feat_archive')
+  compact = featconf.get('feat_archive_compact', False)
+  removed = []
+  if archive_path:
+    removed = feat_lib.archive_removed(archive_path, wavpaths,
+                                       featconf.get('save_feat_path'))
+    todo = feat_lib.archive_pending(archive_path, wavpaths,
+                                    featconf.get('save_feat_path'))
+    nskip = len(wavpaths) - len(todo)
+    wavpaths = todo
+
+  shards = [
+      wavpaths[i:i + shard_size] for i in range(0, len(wavpaths), shard_size)
+  ]
+  logging.info("gen_feat: {} wavs, {} shards, {} workers".format(
+      len(wavpaths), len(shards), num_workers))
+
+  start = time.time()
+  # spawn, TF runtime is not fork safe
+  ctx = multiprocessing.get_context('spawn')
+  with ctx.Pool(
+      num_workers,
+      initializer=logging.set_verbosity,
+      initargs=(logging.get_verbosity(),)) as pool:
+    extract_fn = functools.partial(feat_lib.extract_shard, featconf=featconf)
+    for i, (shard_extract, shard_skip, shard_seconds) in enumerate(
+        pool.imap_unordered(extract_fn, shards)):
+      nextract += shard_extract
+      nskip += shard_skip
+      seconds += shard_seconds
+      elapsed = max(time.time() - start, 1e-6)
+      logging.info(
+          "gen_feat: shard {}/{}, extracted {}, skipped {}, "
+          "{:.2f} files/sec, {:.4f} audio-hours/sec".format(
+              i + 1, len(shards), nextract, nskip, nextract / elapsed,
+              seconds / 3600 / elapsed))
+
+  if archive_path and (shards or removed or compact) and not dry_run:
+    nutt = feat_lib.merge_shards(
+        archive_path, shards, excludes=set(removed), compact=compact)
+    logging.info("gen_feat: pack {} utts into {}, {} removed".format(
+        nutt, archive_path, len(removed)))
+
+  logging.info(
+      "gen_feat done: extracted {} files ({:.2f} audio hours), skipped {} "
+      "files, elapsed {:.1f}s".format(nextract, seconds / 3600, nskip,
+                                      time.time() - start))
+
+
 def main(argv):
   """
     main function
@@ -92,8 +173,7 @@ def main(argv):
     paths = []
     for mode in [utils.TRAIN, utils.EVAL, utils.INFER]:
       paths += config['data'][mode]['paths']
-    task = task_class(config, utils.INFER)
-    task.generate_feat(paths, dry_run=FLAGS.dry_run)
+    gen_feat(config, paths, dry_run=FLAGS.dry_run)
   elif FLAGS.cmd == 'gen_cmvn':
     logging.info(
         '''using infer pipeline to compute cmvn of train_paths, and stride must be 1'''
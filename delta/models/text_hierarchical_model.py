@@ -15,7 +15,6 @@
 # ==============================================================================
 """Hierarchical text classification models."""
 
-import pickle
 from absl import logging
 import tensorflow as tf
 
@@ -26,6 +25,7 @@ from delta.layers.utils import compute_doc_lens
 from delta.layers.utils import split_one_doc_to_true_len_sens
 from delta.models.text_cls_model import TextClassModel
 from delta.utils.register import registers
+from delta import utils
 
 # pylint: disable=abstract-method, too-many-ancestors, too-many-instance-attributes
 
@@ -44,7 +44,7 @@ class HierarchicalModel(TextClassModel):
       self.embedding_path = config['model']['embedding_path']
       tf.logging.info("Loading embedding file from: {}".format(
           self.embedding_path))
-      self._word_embedding_init = pickle.load(open(self.embedding_path, 'rb'))
+      self._word_embedding_init = utils.load_embedding(self.embedding_path)
       self.embed_initializer = tf.constant_initializer(
           self._word_embedding_init)
     else:
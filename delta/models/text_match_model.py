@@ -15,12 +15,12 @@
 # ==============================================================================
 """Match texts with Rnn models."""
 
-import pickle
 from absl import logging
 import tensorflow as tf
 from delta.models.base_model import Model
 import delta.layers
 from delta.utils.register import registers
+from delta import utils
 
 
 # pylint: disable=too-few-public-methods, abstract-method
@@ -38,7 +38,7 @@ class MatchRnn(Model):
       self.embedding_path = config['model']['embedding_path']
       tf.logging.info("Loading embedding file from: {}".format(
           self.embedding_path))
-      self._word_embedding_init = pickle.load(open(self.embedding_path, 'rb'))
+      self._word_embedding_init = utils.load_embedding(self.embedding_path)
       self.embed_initializer = tf.constant_initializer(
           self._word_embedding_init)
     else:
@@ -15,12 +15,12 @@
 # ==============================================================================
 ''' bilstmcrf model '''
 
-import pickle
 import tensorflow as tf
 from absl import logging
 
 from delta.models.text_cls_model import TextClassModel
 from delta.utils.register import registers
+from delta import utils
 
 # pylint: disable=too-many-ancestors, too-many-instance-attributes, abstract-method
 
@@ -37,7 +37,7 @@ class SeqclassModel(TextClassModel):
       self.embedding_path = config['model']['embedding_path']
       logging.info("Loading embedding file from: {}".format(
         self.embedding_path))
-      self._word_embedding_init = pickle.load(open(self.embedding_path, 'rb'))
+      self._word_embedding_init = utils.load_embedding(self.embedding_path)
       self.embed_initializer = tf.constant_initializer(
         self._word_embedding_init)
     else:
@@ -70,7 +70,6 @@ class BilstmCrfModel(SeqclassModel):
       input_dim=self.vocab_size,
       output_dim=self.embedding_size,
       mask_zero=True,
-      input_length=self.max_len,
       embeddings_initializer=self.embed_initializer,
       trainable=True)
 
@@ -15,7 +15,6 @@
 # ==============================================================================
 """Sequence model for text classification."""
 
-import pickle
 import tensorflow as tf
 from absl import logging
 
@@ -40,7 +39,7 @@ class SeqclassModel(TextClassModel):
       self.embedding_path = config['model']['embedding_path']
       logging.info("Loading embedding file from: {}".format(
           self.embedding_path))
-      self._word_embedding_init = pickle.load(open(self.embedding_path, 'rb'))
+      self._word_embedding_init = utils.load_embedding(self.embedding_path)
       self.embed_initializer = tf.constant_initializer(
           self._word_embedding_init)
     else:
@@ -83,11 +82,8 @@ class SeqclassCNNModel(SeqclassModel):
           bias_initializer=tf.constant_initializer(value=0.0),
           padding='valid',
           name='conv_{}'.format(i))
-      pool = tf.keras.layers.MaxPool2D(
-          pool_size=(self.sequence_length - filter_size + 1, 1),
-          strides=(1, 1),
-          padding='valid',
-          name='name_{}'.format(i))
+      # max over all steps, inputs may be shorter than `max_seq_len`
+      pool = tf.keras.layers.GlobalMaxPool2D(name='name_{}'.format(i))
       self.conv2ds.append(conv2d)
       self.pools.append(pool)
 
@@ -104,6 +100,9 @@ class SeqclassCNNModel(SeqclassModel):
     input_x = inputs["input_x"]
     if self.use_dense_task:
       dense_input = inputs["input_dense"]
+    # at least one window of the widest filter
+    pad_len = tf.maximum(max(self.filter_sizes) - tf.shape(input_x)[1], 0)
+    input_x = tf.pad(input_x, [[0, 0], [0, pad_len]])
     embed = self.embed(input_x)
     embed_expand = tf.expand_dims(embed, axis=-1)
     conv_outs = [conv2d(embed_expand) for conv2d in self.conv2ds]
@@ -175,12 +174,14 @@ class RnnAttentionModel(SeqclassModel):
     if self.use_dense_task:
       dense_input = inputs["input_dense"]
 
+    # steps of batch, `max_len` or less
+    max_len = tf.shape(input_x)[1]
     # [batch_size]
-    lens = self.compute_lens(input_x, self.max_len)
+    lens = self.compute_lens(input_x, max_len)
 
     # [batch_size, max_len, 1]
     mask = tf.expand_dims(
-        tf.sequence_mask(lens, self.max_len, dtype=tf.float32), axis=-1)
+        tf.sequence_mask(lens, max_len, dtype=tf.float32), axis=-1)
 
     # [batch_size, max_len, embed_len]
     out = self.embed(input_x)
@@ -14,8 +14,14 @@
 # limitations under the License.
 # ==============================================================================
 '''Teacher module'''
+import os
+import queue
+import hashlib
+import threading
+
 import numpy as np
 import tensorflow as tf
+from absl import logging
 
 from delta.serving.base_frozen_model import FrozenModel
 from delta.utils.register import registers
@@ -46,10 +52,201 @@ class Teacher(FrozenModel):
 
   def __call__(self, feat):
     ''' generate soft labels per example '''
-    # shape [1, T, D, C]
-    inputs = feat[np.newaxis, :, :, :]
+    return self.batch([feat])[0]
+
+  def batch(self, feats):
+    ''' generate soft labels of equal shape examples in one run '''
+    # shape [B, T, D, C]
+    inputs = np.stack(feats)
     validate_feed = {
         self.audio_ph: inputs,
     }
-    soft_label = self.sess.run(self.soft_label, feed_dict=validate_feed)
-    return soft_label[0]
+    return self.sess.run(self.soft_label, feed_dict=validate_feed)
+
+
+def teacher_fingerprint(model):
+  '''
+  identity of teacher model, changes when the model is rewritten
+     model: saved model dir, ckpt dir or frozen_graph_pb path
+  '''
+  path = model
+  if os.path.isdir(model):
+    if tf.saved_model.maybe_saved_model_directory(model):
+      path = os.path.join(model, 'saved_model.pb')
+    else:
+      path = tf.train.latest_checkpoint(model) + '.index'
+  stat = os.stat(path)
+  key = '{}:{}:{}'.format(os.path.abspath(path), stat.st_size, stat.st_mtime)
+  return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+
+class SoftLabelCache:
+  '''
+  soft labels of (filename, clip_id), on disk under `cache_dir`,
+    one append only file per teacher model:
+    `filename \t clip_id \t comma separated float32`
+  '''
+
+  def __init__(self, cache_dir, model):
+    os.makedirs(cache_dir, exist_ok=True)
+    self._path = os.path.join(cache_dir,
+                              teacher_fingerprint(model) + '.soft_labels')
+    self._labels = {}
+    if os.path.exists(self._path):
+      self._load()
+    self._fobj = open(self._path, 'a', encoding='utf-8')
+
+  def _load(self):
+    with open(self._path, 'r', encoding='utf-8') as fobj:
+      for line in fobj:
+        parts = line.rstrip('\n').split('\t')
+        # a torn last line of an interrupted run
+        if len(parts) != 3 or not parts[2]:
+          continue
+        filename, clip_id, values = parts
+        self._labels[(filename, int(clip_id))] = np.array(
+            values.split(','), dtype=np.float32)
+    logging.info('load soft labels: {}, {} clips'.format(
+        self._path, len(self._labels)))
+
+  def __len__(self):
+    return len(self._labels)
+
+  def get(self, key):
+    ''' soft label of (filename, clip_id), None if not cached '''
+    return self._labels.get(key)
+
+  def put(self, keys, soft_labels):
+    ''' cache soft labels of keys '''
+    for (filename, clip_id), soft_label in zip(keys, soft_labels):
+      soft_label = np.asarray(soft_label, dtype=np.float32)
+      self._labels[(filename, clip_id)] = soft_label
+      self._fobj.write('{}\t{}\t{}\n'.format(
+          filename, clip_id, ','.join(repr(float(v)) for v in soft_label)))
+    self._fobj.flush()
+
+  def close(self):
+    ''' close cache file '''
+    self._fobj.close()
+
+
+class _StageError:
+  ''' exception raised in a stage thread, passed to consumer '''
+
+  def __init__(self, error):
+    self.error = error
+
+
+class TeacherStage:
+  '''
+  Join soft labels of teacher to examples.
+    Examples are collected into batches by a feeder thread,
+    the teacher runs batches in another thread, so data generation,
+    teacher inference and training overlap. The order of examples is kept.
+  '''
+
+  def __init__(self, teacher, batch_size=32, queue_depth=4, cache=None):
+    '''
+     teacher: object with `batch(feats)` returning soft labels
+     batch_size: max examples per teacher run
+     queue_depth: batches in flight between threads
+     cache: SoftLabelCache or None
+    '''
+    self.teacher = teacher
+    self.batch_size = batch_size
+    self.queue_depth = queue_depth
+    self.cache = cache
+
+  def _feed(self, items, batches, stop):
+    ''' feeder thread, batch (key, feat, example) items '''
+    try:
+      batch = []
+      for item in items:
+        batch.append(item)
+        if len(batch) == self.batch_size:
+          if not self._put(batches, batch, stop):
+            return
+          batch = []
+      if batch:
+        self._put(batches, batch, stop)
+    except Exception as error:  #pylint: disable=broad-except
+      self._put(batches, _StageError(error), stop)
+    self._put(batches, None, stop)
+
+  def _infer(self, batches, results, stop):
+    ''' teacher thread, soft labels of batches '''
+    while not stop.is_set():
+      try:
+        batch = batches.get(timeout=0.1)
+      except queue.Empty:
+        continue
+      if batch is None or isinstance(batch, _StageError):
+        self._put(results, batch, stop)
+        return
+      try:
+        self._put(results, (batch, self._soft_labels(batch)), stop)
+      except Exception as error:  #pylint: disable=broad-except
+        self._put(results, _StageError(error), stop)
+        return
+
+  @staticmethod
+  def _put(que, item, stop):
+    ''' put unless consumer has gone '''
+    while not stop.is_set():
+      try:
+        que.put(item, timeout=0.1)
+        return True
+      except queue.Full:
+        continue
+    return False
+
+  def _soft_labels(self, batch):
+    ''' soft labels of batch, from cache or teacher '''
+    labels = [None] * len(batch)
+    if self.cache is not None:
+      labels = [self.cache.get(key) for key, _, _ in batch]
+    misses = [i for i, label in enumerate(labels) if label is None]
+    if not misses:
+      return labels
+
+    # one teacher run for each feature shape
+    by_shape = {}
+    for i in misses:
+      by_shape.setdefault(np.shape(batch[i][1]), []).append(i)
+    for indexes in by_shape.values():
+      soft_labels = self.teacher.batch([batch[i][1] for i in indexes])
+      for i, soft_label in zip(indexes, soft_labels):
+        labels[i] = soft_label
+      if self.cache is not None:
+        self.cache.put([batch[i][0] for i in indexes], soft_labels)
+    return labels
+
+  def __call__(self, items):
+    '''
+    items: iterable of ((filename, clip_id), feat, example)
+    yield: (example, soft_label)
+    '''
+    stop = threading.Event()
+    batches = queue.Queue(self.queue_depth)
+    results = queue.Queue(self.queue_depth)
+    threads = [
+        threading.Thread(
+            target=self._feed, args=(items, batches, stop), daemon=True),
+        threading.Thread(
+            target=self._infer, args=(batches, results, stop), daemon=True),
+    ]
+    for thread in threads:
+      thread.start()
+
+    try:
+      while True:
+        result = results.get()
+        if result is None:
+          break
+        if isinstance(result, _StageError):
+          raise result.error
+        batch, soft_labels = result
+        for (_, _, example), soft_label in zip(batch, soft_labels):
+          yield example, soft_label
+    finally:
+      stop.set()
@@ -0,0 +1,94 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+''' teacher stage unittest '''
+import os
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+from delta.serving.knowledge_distilling import SoftLabelCache
+from delta.serving.knowledge_distilling import TeacherStage
+
+
+class _MeanTeacher:
+  ''' soft label is [mean, 1 - mean] of feat '''
+
+  def __init__(self):
+    self.batch_sizes = []
+
+  def batch(self, feats):
+    self.batch_sizes.append(len(feats))
+    means = np.array([np.mean(feat) for feat in feats], dtype=np.float32)
+    return np.stack([means, 1 - means], axis=1)
+
+
+def _items(num):
+  for i in range(num):
+    feat = np.full([4, 3, 1], i / num, dtype=np.float32)
+    yield ('utt{}.npy'.format(i // 2), i % 2), feat, i
+
+
+class TeacherStageTest(tf.test.TestCase):
+  ''' teacher stage unittest '''
+
+  def test_batch(self):
+    ''' soft labels joined in order, teacher runs batches '''
+    teacher = _MeanTeacher()
+    stage = TeacherStage(teacher, batch_size=4)
+    results = list(stage(_items(10)))
+    self.assertEqual([example for example, _ in results], list(range(10)))
+    for example, soft_label in results:
+      self.assertAllClose(soft_label, [example / 10, 1 - example / 10])
+    self.assertEqual(teacher.batch_sizes, [4, 4, 2])
+
+  def test_cache(self):
+    ''' cached clips do not run teacher again '''
+    tmpdir = tempfile.mkdtemp()
+    model = os.path.join(tmpdir, 'frozen_graph.pb')
+    with open(model, 'wb') as fobj:
+      fobj.write(b'graph')
+    cache_dir = os.path.join(tmpdir, 'cache')
+
+    teacher = _MeanTeacher()
+    cache = SoftLabelCache(cache_dir, model)
+    expected = list(TeacherStage(teacher, batch_size=4, cache=cache)(_items(6)))
+    cache.close()
+    self.assertEqual(sum(teacher.batch_sizes), 6)
+
+    teacher = _MeanTeacher()
+    cache = SoftLabelCache(cache_dir, model)
+    self.assertEqual(len(cache), 6)
+    results = list(TeacherStage(teacher, batch_size=4, cache=cache)(_items(8)))
+    cache.close()
+    self.assertEqual(teacher.batch_sizes, [2])
+    for (example, soft_label), (_, expected_label) in zip(results, expected):
+      self.assertEqual(soft_label.dtype, np.float32)
+      self.assertAllEqual(soft_label, expected_label)
+
+  def test_error(self):
+    ''' errors of data or teacher are raised to consumer '''
+
+    def _bad_items():
+      yield ('utt0.npy', 0), np.zeros([4, 3, 1], dtype=np.float32), 0
+      raise ValueError('bad data')
+
+    with self.assertRaises(ValueError):
+      list(TeacherStage(_MeanTeacher(), batch_size=4)(_bad_items()))
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -135,7 +135,9 @@ class CrfLoss(Loss):
            label_length=None,
            soft_labels=None):
 
-    tags_scores = tf.reshape(logits, [-1, self.max_seq_len, self.num_classes], name="scores")
+    # steps of batch, `max_seq_len` or less
+    tags_scores = tf.reshape(
+        logits, [-1, tf.shape(labels)[1], self.num_classes], name="scores")
     loss, _ = crf_log_likelihood(tags_scores, labels, input_length, self.transitions)
 
     return loss
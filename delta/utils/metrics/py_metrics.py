@@ -15,6 +15,7 @@
 # ==============================================================================
 ''' sklearn metrics '''
 import abc
+import numpy as np
 from sklearn import metrics
 from seqeval.metrics import classification_report as seq_classification_report
 from delta.utils.register import registers
@@ -54,6 +55,11 @@ class AccuracyCal(Metric):
     ''' compute metric '''
     return metrics.accuracy_score(y_true, y_pred, normalize=True)
 
+  def call_confusion(self, confusion, arguments=None):
+    ''' compute metric from confusion matrix '''
+    del arguments
+    return np.trace(confusion) / max(np.sum(confusion), 1)
+
 
 @registers.metric.register
 class F1ScoreCal(Metric):
@@ -68,6 +74,11 @@ class F1ScoreCal(Metric):
     average = arguments['average'].lower()
     return metrics.f1_score(y_true, y_pred, average=average)
 
+  def call_confusion(self, confusion, arguments=None):
+    ''' compute metric from confusion matrix '''
+    average = arguments['average'].lower()
+    return confusion_scores(confusion, average)[2]
+
 
 @registers.metric.register
 class PrecisionCal(Metric):
@@ -82,6 +93,11 @@ class PrecisionCal(Metric):
     average = arguments['average'].lower()
     return metrics.precision_score(y_true, y_pred, average=average)
 
+  def call_confusion(self, confusion, arguments=None):
+    ''' compute metric from confusion matrix '''
+    average = arguments['average'].lower()
+    return confusion_scores(confusion, average)[0]
+
 
 @registers.metric.register
 class RecallCal(Metric):
@@ -97,6 +113,11 @@ class RecallCal(Metric):
     average = arguments['average'].lower()
     return metrics.recall_score(y_true, y_pred, average=average)
 
+  def call_confusion(self, confusion, arguments=None):
+    ''' compute metric from confusion matrix '''
+    average = arguments['average'].lower()
+    return confusion_scores(confusion, average)[1]
+
 
 @registers.metric.register
 class ConfusionMatrixCal(Metric):
@@ -111,6 +132,12 @@ class ConfusionMatrixCal(Metric):
     del arguments
     return metrics.confusion_matrix(y_true, y_pred)
 
+  def call_confusion(self, confusion, arguments=None):
+    ''' compute metric from confusion matrix '''
+    del arguments
+    present = present_labels(confusion)
+    return confusion[present][:, present]
+
 
 @registers.metric.register
 class ClassReportCal(Metric):
@@ -140,10 +167,67 @@ class CrfCal(Metric):
                                  ids_to_sentences(y_pred, label_path_file))
 
 
-def get_metrics(config, y_true=None, y_pred=None):
+CONFUSION_AVERAGES = ('binary', 'micro', 'macro', 'weighted')
+
+
+def present_labels(confusion):
+  ''' labels in y_true or y_pred of `confusion`, as sklearn '''
+  return np.flatnonzero(np.sum(confusion, 0) + np.sum(confusion, 1))
+
+
+def confusion_scores(confusion, average, pos_label=1):
+  '''
+  (precision, recall, f1) of `confusion`, [true, pred] of class ids,
+    same as sklearn with `average` and the default `pos_label`.
+  '''
+  labels = present_labels(confusion)
+  if average == 'binary':
+    if len(labels) > 2:
+      raise ValueError("Target is multiclass but average='binary'.")
+    if len(labels) == 2 and pos_label not in labels:
+      raise ValueError('pos_label={} is not a valid label: {}'.format(
+          pos_label, labels))
+    labels = [pos_label] if pos_label < len(confusion) else []
+  confusion = np.asarray(confusion, dtype=np.float64)
+  true_pos = np.diag(confusion)[labels]
+  num_true = np.sum(confusion, 1)[labels]
+  num_pred = np.sum(confusion, 0)[labels]
+  if average == 'micro':
+    true_pos, num_true, num_pred = [
+        np.sum(x, keepdims=True) for x in (true_pos, num_true, num_pred)
+    ]
+
+  def _div(num, den):
+    return np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+
+  scores = [
+      _div(true_pos, num_pred),
+      _div(true_pos, num_true),
+      _div(2 * true_pos, num_true + num_pred)
+  ]
+  if not scores[0].size:
+    return 0.0, 0.0, 0.0
+  weights = num_true if average == 'weighted' else None
+  if weights is not None and not np.sum(weights):
+    return 0.0, 0.0, 0.0
+  return tuple(float(np.average(score, weights=weights)) for score in scores)
+
+
+def support_confusion(config):
+  ''' whether all metrics of config can be computed from confusion matrix '''
+  for metric in config['solver']['metrics']['cals']:
+    if not hasattr(registers.metric[metric['name']], 'call_confusion'):
+      return False
+    arguments = metric['arguments'] or {}
+    if arguments.get('average', 'binary').lower() not in CONFUSION_AVERAGES:
+      return False
+  return True
+
+
+def get_metrics(config, y_true=None, y_pred=None, confusion=None):
   ''' candies function of metrics
-      calc metrics through `y_true` and `y_pred` or
-      `confusion` will be deprecated
+      calc metrics through `y_true` and `y_pred`, or `confusion`,
+      [num_class, num_class] of [true, pred] counts, see `support_confusion`
   '''
   metrics_list_config = config['solver']['metrics']['cals']
   score = dict()
@@ -151,6 +235,10 @@ def get_metrics(config, y_true=None, y_pred=None):
     metric_name = metric['name']
     calculator = registers.metric[metric_name](config)
     arguments = metric['arguments']
-    metric_score = calculator(y_true=y_true, y_pred=y_pred, arguments=arguments)
+    if confusion is not None:
+      metric_score = calculator.call_confusion(confusion, arguments=arguments)
+    else:
+      metric_score = calculator(
+          y_true=y_true, y_pred=y_pred, arguments=arguments)
     score[metric_name] = metric_score
   return score
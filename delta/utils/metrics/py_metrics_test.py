@@ -89,6 +89,38 @@ class MetricTest(tf.test.TestCase):
     self.assertEqual(0.0, metrics2['RecallCal'])
     self.assertEqual(0.0, metrics2['F1ScoreCal'])
 
+  def test_confusion_metrics(self):
+    ''' metrics from confusion matrix same as from labels '''
+    config = utils.load_config(self.conf_file)
+    self.assertTrue(metrics.support_confusion(config))
+    y_true = np.random.randint(0, 4, size=[200])
+    y_pred = np.random.randint(1, 5, size=[200])
+    confusion = np.zeros([6, 6], dtype=np.int64)
+    np.add.at(confusion, (y_true, y_pred), 1)
+
+    for average in ('micro', 'macro', 'weighted'):
+      for cal in config['solver']['metrics']['cals'][2:]:
+        cal['arguments']['average'] = average
+      expected = metrics.get_metrics(config, y_true=y_true, y_pred=y_pred)
+      scores = metrics.get_metrics(config, confusion=confusion)
+      self.assertAllEqual(expected['ConfusionMatrixCal'],
+                          scores.pop('ConfusionMatrixCal'))
+      for name, score in scores.items():
+        self.assertAllClose(expected[name], score)
+
+    y_true, y_pred = y_true % 2, y_pred % 2
+    confusion = np.zeros([2, 2], dtype=np.int64)
+    np.add.at(confusion, (y_true, y_pred), 1)
+    for cal in config['solver']['metrics']['cals'][2:]:
+      cal['arguments']['average'] = 'binary'
+    expected = metrics.get_metrics(config, y_true=y_true, y_pred=y_pred)
+    scores = metrics.get_metrics(config, confusion=confusion)
+    for name in ('AccuracyCal', 'PrecisionCal', 'RecallCal', 'F1ScoreCal'):
+      self.assertAllClose(expected[name], scores[name])
+
+    config['solver']['metrics']['cals'][2]['arguments']['average'] = 'samples'
+    self.assertFalse(metrics.support_confusion(config))
+
   def test_crf_metrics(self):
     ''' test crf metrics '''
     config = utils.load_config(self.config_file_crf)
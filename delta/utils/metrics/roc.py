@@ -0,0 +1,207 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+'''
+ROC, PR and DET curves and EER of scores
+
+  all curves come from one sort of the scores and cumulative sums of
+  the labels, every distinct score is a threshold
+'''
+import collections
+
+import numpy as np
+import pandas as pd
+
+Scores = collections.namedtuple('Scores', ['files', 'labels', 'scores'])
+
+Curve = collections.namedtuple(
+    'Curve', ['thresholds', 'tps', 'fps', 'num_pos', 'num_neg'])
+
+# columns of `curve_table`
+CURVE_COLUMNS = ['threshold', 'tp', 'fp', 'fpr', 'tpr', 'precision', 'fnr']
+
+
+def load_scores(path, with_files=False):
+  '''
+  load score file of lines `filepath, clipid, label, score[, score...]`,
+    as written by speech postprocess
+  return: Scores of files (category codes, None if not `with_files`),
+    labels [N] and scores [N, num_scores]
+  '''
+  with open(path) as fin:
+    num_columns = len(fin.readline().split(','))
+  usecols = ([0] if with_files else []) + list(range(2, num_columns))
+  dtype = {column: np.float64 for column in range(3, num_columns)}
+  dtype[2] = np.int64
+  if with_files:
+    dtype[0] = 'category'
+  data = pd.read_csv(
+      path,
+      sep=',',
+      header=None,
+      usecols=usecols,
+      dtype=dtype,
+      skipinitialspace=True,
+      engine='c')
+  files = data[0].cat.codes.values if with_files else None
+  scores = data[list(range(3, num_columns))].values
+  return Scores(files, data[2].values, scores)
+
+
+def aggregate_files(files, labels, scores, reduce='max'):
+  '''
+  scores of clips to scores of files,
+    files: file code of clips [N], scores: [N, num_scores]
+    reduce: `max` or `mean` of clip scores of a file
+  return: labels [num_files] (max of clips), scores [num_files, num_scores]
+  '''
+  order = np.argsort(files, kind='mergesort')
+  files = files[order]
+  starts = np.flatnonzero(np.r_[True, files[1:] != files[:-1]])
+  file_labels = np.maximum.reduceat(labels[order], starts)
+  if reduce == 'max':
+    file_scores = np.maximum.reduceat(scores[order], starts, axis=0)
+  elif reduce == 'mean':
+    counts = np.diff(np.r_[starts, len(files)])
+    file_scores = np.add.reduceat(scores[order], starts, axis=0)
+    file_scores /= counts[:, None]
+  else:
+    raise ValueError('reduce not `max` or `mean`: {}'.format(reduce))
+  return file_labels, file_scores
+
+
+def curve(positive, scores):
+  '''
+  positive: bool [N], scores: [N]
+  return: Curve, with tps and fps of predicting score >= threshold,
+    thresholds from high to low
+  '''
+  order = np.argsort(-scores, kind='mergesort')
+  scores = scores[order]
+  positive = positive[order]
+  # last index of each distinct score
+  ends = np.r_[np.flatnonzero(np.diff(scores)), len(scores) - 1]
+  tps = np.cumsum(positive, dtype=np.int64)[ends]
+  fps = ends + 1 - tps
+  num_pos = int(tps[-1]) if len(tps) else 0
+  return Curve(scores[ends], tps, fps, num_pos, len(scores) - num_pos)
+
+
+def _rate(count, total):
+  return count / total if total else np.zeros_like(count, dtype=np.float64)
+
+
+def roc(result):
+  ''' fpr, tpr, thresholds, starting from (0, 0) '''
+  fpr = np.r_[0.0, _rate(result.fps, result.num_neg)]
+  tpr = np.r_[0.0, _rate(result.tps, result.num_pos)]
+  thresholds = np.r_[np.inf, result.thresholds]
+  return fpr, tpr, thresholds
+
+
+def precision_recall(result):
+  ''' precision, recall, thresholds '''
+  precision = result.tps / (result.tps + result.fps)
+  recall = _rate(result.tps, result.num_pos)
+  return precision, recall, result.thresholds
+
+
+def det(result):
+  ''' fpr, fnr, thresholds '''
+  fpr = _rate(result.fps, result.num_neg)
+  fnr = 1.0 - _rate(result.tps, result.num_pos)
+  return fpr, fnr, result.thresholds
+
+
+def auc(result):
+  ''' area under ROC curve '''
+  fpr, tpr, _ = roc(result)
+  return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+
+def average_precision(result):
+  ''' area under PR curve, by steps of recall '''
+  precision, recall, _ = precision_recall(result)
+  return float(np.sum(np.diff(np.r_[0.0, recall]) * precision))
+
+
+def eer(result):
+  ''' equal error rate and its threshold, interpolated between thresholds '''
+  fpr, fnr, thresholds = det(result)
+  # fpr increases and fnr decreases with lower thresholds
+  index = int(np.argmax(fpr >= fnr))
+  if index == 0:
+    return float(fpr[0] + fnr[0]) / 2, float(thresholds[0])
+  gap_prev = fnr[index - 1] - fpr[index - 1]
+  gap = fpr[index] - fnr[index]
+  weight = gap_prev / (gap_prev + gap) if gap_prev + gap else 0.0
+  rate = fpr[index - 1] + weight * (fpr[index] - fpr[index - 1])
+  threshold = thresholds[index - 1] + weight * (
+      thresholds[index] - thresholds[index - 1])
+  return float(rate), float(threshold)
+
+
+def summary(result):
+  ''' scalar metrics of a curve '''
+  eer_rate, eer_threshold = eer(result)
+  return collections.OrderedDict([
+      ('num_pos', result.num_pos),
+      ('num_neg', result.num_neg),
+      ('auc', auc(result)),
+      ('average_precision', average_precision(result)),
+      ('eer', eer_rate),
+      ('eer_threshold', eer_threshold),
+  ])
+
+
+def downsample(result, num_points):
+  ''' at most `num_points` thresholds of curve, evenly spaced, ends kept '''
+  if num_points <= 0 or len(result.thresholds) <= num_points:
+    return result
+  index = np.unique(
+      np.linspace(0, len(result.thresholds) - 1, num=num_points).astype(
+          np.int64))
+  return result._replace(
+      thresholds=result.thresholds[index],
+      tps=result.tps[index],
+      fps=result.fps[index])
+
+
+def curve_table(result):
+  '''
+  [num_thresholds, len(CURVE_COLUMNS)] table of
+    threshold, tp, fp, fpr, tpr (recall), precision, fnr
+  '''
+  fpr, fnr, _ = det(result)
+  precision, recall, _ = precision_recall(result)
+  columns = [
+      result.thresholds, result.tps, result.fps, fpr, recall, precision, fnr
+  ]
+  return np.stack(columns, axis=1)
+
+
+def class_curves(labels, scores, pos_label=1):
+  '''
+  curves of each class, one-vs-rest
+    scores: [N, 1] score of `pos_label`, or [N, num_class] scores
+  return: OrderedDict of class id -> Curve
+  '''
+  if scores.shape[1] == 1:
+    positive = labels == pos_label
+    return collections.OrderedDict([(pos_label, curve(positive, scores[:, 0]))])
+  return collections.OrderedDict([
+      (class_id, curve(labels == class_id, scores[:, class_id]))
+      for class_id in range(scores.shape[1])
+  ])
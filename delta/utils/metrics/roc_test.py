@@ -0,0 +1,92 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+''' roc unittest '''
+import os
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+from sklearn import metrics
+
+from delta.utils.metrics import roc as roc_lib
+
+
+class RocTest(tf.test.TestCase):
+  ''' roc unittest'''
+
+  def setUp(self):
+    ''' set up '''
+    rng = np.random.RandomState(0)
+    self.labels = (rng.rand(1000) < 0.3).astype(np.int64)
+    # rounded, with tied scores
+    self.scores = np.round(rng.rand(1000) * 0.6 + self.labels * 0.3, 2)
+    self.result = roc_lib.curve(self.labels == 1, self.scores)
+
+  def test_curve(self):
+    ''' same curves as sklearn '''
+    fpr, tpr, _ = roc_lib.roc(self.result)
+    expected_fpr, expected_tpr, expected_ths = metrics.roc_curve(
+        self.labels, self.scores, drop_intermediate=False)
+    self.assertAllClose(fpr, expected_fpr)
+    self.assertAllClose(tpr, expected_tpr)
+    self.assertAllClose(self.result.thresholds, expected_ths[1:])
+    self.assertAllClose(
+        roc_lib.auc(self.result), metrics.roc_auc_score(self.labels,
+                                                        self.scores))
+    self.assertAllClose(
+        roc_lib.average_precision(self.result),
+        metrics.average_precision_score(self.labels, self.scores))
+
+  def test_eer(self):
+    ''' fpr and fnr meet at eer '''
+    fpr, fnr, _ = roc_lib.det(self.result)
+    rate, threshold = roc_lib.eer(self.result)
+    index = np.argmin(np.abs(fpr - fnr))
+    self.assertNear(rate, (fpr[index] + fnr[index]) / 2, 0.01)
+    self.assertBetween(threshold, self.scores.min(), self.scores.max())
+
+  def test_aggregate_files(self):
+    ''' max and mean of clips per file '''
+    files = np.array([1, 0, 1, 2, 0])
+    labels = np.array([1, 0, 1, 0, 0])
+    scores = np.array([[0.2], [0.4], [0.6], [0.1], [0.8]])
+    file_labels, file_scores = roc_lib.aggregate_files(files, labels, scores)
+    self.assertAllEqual(file_labels, [0, 1, 0])
+    self.assertAllClose(file_scores, [[0.8], [0.6], [0.1]])
+    _, file_scores = roc_lib.aggregate_files(
+        files, labels, scores, reduce='mean')
+    self.assertAllClose(file_scores, [[0.6], [0.4], [0.1]])
+
+  def test_load_scores(self):
+    ''' score file of speech postprocess '''
+    path = os.path.join(tempfile.mkdtemp(), 'predict_scores.txt')
+    with open(path, 'w') as fout:
+      for i, (label, score) in enumerate(zip(self.labels, self.scores)):
+        fout.write('{}, {}, {}, {}\n'.format('utt{}.wav'.format(i // 4), i % 4,
+                                             label, score))
+    data = roc_lib.load_scores(path, with_files=True)
+    self.assertAllEqual(data.labels, self.labels)
+    self.assertAllClose(data.scores[:, 0], self.scores)
+    self.assertLen(np.unique(data.files), 250)
+
+    curves = roc_lib.class_curves(data.labels, data.scores)
+    self.assertEqual(list(curves.keys()), [1])
+    table = roc_lib.curve_table(roc_lib.downsample(curves[1], 10))
+    self.assertAllEqual(table.shape, [10, len(roc_lib.CURVE_COLUMNS)])
+
+
+if __name__ == '__main__':
+  tf.test.main()
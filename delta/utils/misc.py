@@ -15,8 +15,11 @@
 # ==============================================================================
 ''' utils for delta '''
 import os
+import json
+import pickle
 from absl import logging
 
+import numpy as np
 import tensorflow as tf
 #pylint: disable=no-name-in-module,no-member
 from tensorflow.python.client import device_lib
@@ -134,6 +137,88 @@ def get_distribution_strategy(num_gpus, all_reduce_alg='nccl'):
       return tf.contrib.distribute.MirroredStrategy(num_gpus=num_gpus)
 
 
+def tf_config():
+  ''' TF_CONFIG of the environment as dict, empty if not set '''
+  return json.loads(os.environ.get('TF_CONFIG') or '{}')
+
+
+def set_tf_config(multi_worker_conf):
+  '''
+  set TF_CONFIG by `cluster`, `task_type` and `task_index` of config,
+    when it is not set by the launcher in the environment
+  '''
+  if os.environ.get('TF_CONFIG') or not multi_worker_conf.get('cluster'):
+    return
+  os.environ['TF_CONFIG'] = json.dumps({
+      'cluster': multi_worker_conf['cluster'],
+      'task': {
+          'type': multi_worker_conf.get('task_type', 'chief'),
+          'index': multi_worker_conf.get('task_index', 0)
+      }
+  })
+
+
+def num_train_workers():
+  '''
+  num of the chief and the workers of TF_CONFIG, which train on the data,
+    the same on all tasks, 1 for a single process
+  '''
+  cluster = tf_config().get('cluster', {})
+  num_workers = len(cluster.get('chief', [])) + len(cluster.get('worker', []))
+  return max(num_workers, 1)
+
+
+def worker_shard():
+  '''
+  (num of shards, index of shard) of the train data to read by this task
+    of TF_CONFIG. The chief and the workers read one shard each,
+    other tasks and a single process read all data, as (1, 0).
+  '''
+  conf = tf_config()
+  cluster = conf.get('cluster', {})
+  task = conf.get('task', {})
+  num_chief = len(cluster.get('chief', []))
+  num_shards = num_train_workers()
+  if task.get('type') == 'chief':
+    return num_shards, 0
+  if task.get('type') == 'worker':
+    return num_shards, num_chief + task.get('index', 0)
+  return 1, 0
+
+
+def is_chief_task():
+  ''' whether this task of TF_CONFIG is the chief, True for a single process '''
+  conf = tf_config()
+  task = conf.get('task')
+  if not task or task.get('type') == 'chief':
+    return True
+  # worker 0 is the chief when there is no chief task
+  return ('chief' not in conf.get('cluster', {}) and
+          task.get('type') == 'worker' and task.get('index', 0) == 0)
+
+
+def get_multi_worker_strategy(num_gpus, strategy='collective'):
+  """Return a DistributionStrategy for training across the workers of
+  TF_CONFIG.
+
+  Args:
+    num_gpus: Number of GPUs of each worker, 0 to run on CPU.
+    strategy: `collective` for all-reduce between workers,
+      `parameter_server` for variables placed on the `ps` tasks.
+
+  Returns:
+    tf.contrib.distribute.DistibutionStrategy object.
+  """
+  if strategy == 'collective':  #pylint: disable=no-else-return
+    return tf.contrib.distribute.CollectiveAllReduceStrategy(
+        num_gpus_per_worker=num_gpus)
+  elif strategy == 'parameter_server':
+    return tf.contrib.distribute.ParameterServerStrategy(
+        num_gpus_per_worker=num_gpus)
+  else:
+    raise ValueError("Not support multi-worker strategy: {}".format(strategy))
+
+
 def per_device_batch_size(batch_size, num_gpus):
   """For multi-gpu, batch-size must be a multiple of the number of GPUs.
 
@@ -251,6 +336,19 @@ def walk(path='.', depth=None):
           yield os.path.join(dirpath, filename)
 
 
+def load_embedding(embedding_path):
+  '''
+  load embedding matrix of `prepare_embedding`,
+    a .npy file is memory mapped, a pickle is for old outputs.
+  '''
+  with open(embedding_path, 'rb') as in_f:
+    magic = in_f.read(len(np.lib.format.MAGIC_PREFIX))
+  if magic == np.lib.format.MAGIC_PREFIX:
+    return np.load(embedding_path, mmap_mode='r')
+  with open(embedding_path, 'rb') as in_f:
+    return pickle.load(in_f)
+
+
 # 'train', 'eval', 'infer'
 TRAIN = tf.estimator.ModeKeys.TRAIN
 EVAL = tf.estimator.ModeKeys.EVAL
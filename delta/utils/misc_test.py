@@ -14,6 +14,10 @@
 # limitations under the License.
 # ==============================================================================
 ''' misc.py unittest'''
+import os
+import json
+from unittest import mock
+
 import numpy as np
 import tensorflow as tf
 
@@ -68,6 +72,45 @@ class MiscTest(tf.test.TestCase):
       batch_size, ngpus = 32, 3
       batch_per_dev = misc.per_device_batch_size(batch_size, ngpus)
 
+  def test_worker_shard(self):
+    ''' worker shard of TF_CONFIG unittest'''
+    cluster = {
+        'chief': ['localhost:2222'],
+        'worker': ['localhost:2223', 'localhost:2224'],
+        'evaluator': ['localhost:2225'],
+    }
+    with mock.patch.dict(os.environ, {'TF_CONFIG': ''}):
+      self.assertEqual(misc.worker_shard(), (1, 0))
+      self.assertEqual(misc.num_train_workers(), 1)
+      self.assertTrue(misc.is_chief_task())
+
+      # set by config
+      misc.set_tf_config({
+          'cluster': cluster,
+          'task_type': 'worker',
+          'task_index': 1
+      })
+      self.assertEqual(misc.tf_config()['task'], {'type': 'worker', 'index': 1})
+      self.assertEqual(misc.worker_shard(), (3, 2))
+
+      # environment set by launcher is kept
+      misc.set_tf_config({'cluster': cluster, 'task_type': 'chief'})
+      self.assertEqual(misc.worker_shard(), (3, 2))
+
+      self.assertFalse(misc.is_chief_task())
+
+      for task, shard in [('chief', (3, 0)), ('evaluator', (1, 0))]:
+        os.environ['TF_CONFIG'] = json.dumps({
+            'cluster': cluster,
+            'task': {
+                'type': task,
+                'index': 0
+            }
+        })
+        self.assertEqual(misc.worker_shard(), shard)
+        self.assertEqual(misc.is_chief_task(), task == 'chief')
+        self.assertEqual(misc.num_train_workers(), 3)
+
   def test_generate_synthetic_data(self):
     ''' generate sythetic data unittest'''
     input_shape = tf.TensorShape([2, 3])
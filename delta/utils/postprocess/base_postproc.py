@@ -40,3 +40,29 @@ class PostProc(PostProcABC):
 
   def __call__(self, *args, **kwargs):
     return self.call(*args, **kwargs)
+
+
+class StreamPostProc(PostProc):
+  '''
+  base class of postprocess consuming predictions batch by batch,
+    `begin`, `update` of each batch, then `end`
+  '''
+
+  def begin(self):
+    ''' called before the first batch '''
+
+  def update(self, predictions):
+    ''' consume predictions of one batch '''
+    raise NotImplementedError()
+
+  def end(self):
+    ''' called after the last batch '''
+
+  #pylint: disable=arguments-differ, unused-argument
+  def call(self, predictions, log_verbose=False):
+    ''' predictions of all examples as one batch '''
+    self.begin()
+    try:
+      self.update(predictions)
+    finally:
+      self.end()
@@ -0,0 +1,168 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+''' streaming metrics of classification predictions '''
+import numpy as np
+
+from delta import utils
+
+
+class GrowableArray:
+  ''' 1-D array appended in batches, capacity doubles when full '''
+
+  def __init__(self, dtype, capacity=1024):
+    self._data = np.empty([capacity], dtype=dtype)
+    self._size = 0
+
+  def __len__(self):
+    return self._size
+
+  def extend(self, values):
+    ''' append 1-D `values` '''
+    values = np.asarray(values).reshape([-1])
+    end = self._size + values.size
+    if end > self._data.size:
+      capacity = max(end, 2 * self._data.size)
+      data = np.empty([capacity], dtype=self._data.dtype)
+      data[:self._size] = self._data[:self._size]
+      self._data = data
+    self._data[self._size:end] = values
+    self._size = end
+
+  @property
+  def array(self):
+    ''' view of appended values '''
+    return self._data[:self._size]
+
+
+class MetricsAccumulator:
+  '''
+  Accumulate true and predicted labels of batches of predictions,
+    and the confusion matrix of them.
+  '''
+
+  def __init__(self, num_class):
+    self.num_class = num_class
+    self.y_true = GrowableArray(np.int64)
+    self.y_pred = GrowableArray(np.int64)
+    self.confusion = np.zeros((num_class, num_class), dtype=np.int64)
+
+  def __len__(self):
+    return len(self.y_true)
+
+  def update(self, labels, scores):
+    '''
+    labels: true label of one example or a batch, [] or [batch]
+    scores: class scores, [num_class] or [batch, num_class]
+    '''
+    y_true = np.asarray(labels, dtype=np.int64).reshape([-1])
+    y_pred = np.argmax(scores, -1).astype(np.int64).reshape([-1])
+    if y_true.shape != y_pred.shape:
+      raise ValueError('labels shape {} does not match predictions {}'.format(
+          y_true.shape, y_pred.shape))
+    self.y_true.extend(y_true)
+    self.y_pred.extend(y_pred)
+
+    # labels out of range are not counted, as `sklearn` confusion_matrix
+    valid = (y_true >= 0) & (y_true < self.num_class)
+    index = y_true[valid] * self.num_class + y_pred[valid]
+    self.confusion += np.bincount(
+        index, minlength=self.num_class * self.num_class).reshape(
+            self.num_class, self.num_class)
+
+  @property
+  def stats(self):
+    ''' [true labels, pred labels], float as the labels appended to `[]` '''
+    return [
+        self.y_true.array.astype(np.float64),
+        self.y_pred.array.astype(np.float64)
+    ]
+
+  def get_metrics(self, config):
+    ''' metrics of `solver.metrics` in config '''
+    y_true, y_pred = self.stats
+    return utils.metrics.get_metrics(config, y_true=y_true, y_pred=y_pred)
+
+
+class LabelAccumulator:
+  '''
+  Accumulate true and predicted labels of batches, of examples of any
+    shape, e.g. [batch] of classes or [batch, time] of tags.
+  If all metrics of `config` can be computed from the confusion matrix,
+    only the confusion matrix of class ids is accumulated, else the labels.
+  '''
+
+  def __init__(self, config=None):
+    self.keep_labels = config is None or not utils.metrics.support_confusion(
+        config)
+    if self.keep_labels:
+      self.y_true = GrowableArray(np.int64)
+      self.y_pred = GrowableArray(np.int64)
+    self.confusion = np.zeros((0, 0), dtype=np.int64)
+    self.example_shape = None
+    self.num_examples = 0
+
+  def __len__(self):
+    return self.num_examples
+
+  def update(self, y_true, y_pred):
+    ''' y_true, y_pred: labels of a batch, [batch, ...] '''
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    if y_true.shape != y_pred.shape:
+      raise ValueError('labels shape {} does not match predictions {}'.format(
+          y_true.shape, y_pred.shape))
+    if self.example_shape is None:
+      self.example_shape = list(y_true.shape[1:])
+    elif list(y_true.shape[1:]) != self.example_shape:
+      raise ValueError('example shape {} does not match former {}'.format(
+          list(y_true.shape[1:]), self.example_shape))
+    self.num_examples += len(y_true)
+    if self.keep_labels:
+      self.y_true.extend(y_true)
+      self.y_pred.extend(y_pred)
+    else:
+      self._update_confusion(y_true.reshape([-1]), y_pred.reshape([-1]))
+
+  def _update_confusion(self, y_true, y_pred):
+    ''' add [true, pred] counts of class ids, grows with the max id '''
+    if not y_true.size:
+      return
+    if min(y_true.min(), y_pred.min()) < 0:
+      raise ValueError('negative class id of labels or predictions')
+    num_class = max(len(self.confusion), int(y_true.max()) + 1,
+                    int(y_pred.max()) + 1)
+    if num_class > len(self.confusion):
+      confusion = np.zeros((num_class, num_class), dtype=np.int64)
+      confusion[:len(self.confusion), :len(self.confusion)] = self.confusion
+      self.confusion = confusion
+    index = y_true.astype(np.int64) * num_class + y_pred.astype(np.int64)
+    self.confusion += np.bincount(
+        index, minlength=num_class * num_class).reshape(num_class, num_class)
+
+  @property
+  def stats(self):
+    ''' [true labels, pred labels], [examples, ...] '''
+    if not self.keep_labels:
+      raise ValueError('labels are not kept, use `confusion`')
+    shape = [-1] + (self.example_shape or [])
+    return [self.y_true.array.reshape(shape), self.y_pred.array.reshape(shape)]
+
+  def get_metrics(self, config):
+    ''' metrics of `solver.metrics` in config '''
+    if not self.keep_labels:
+      return utils.metrics.get_metrics(config, confusion=self.confusion)
+    y_true, y_pred = self.stats
+    return utils.metrics.get_metrics(config, y_true=y_true, y_pred=y_pred)
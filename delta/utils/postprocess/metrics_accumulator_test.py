@@ -0,0 +1,106 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+''' metrics accumulator unittest '''
+import numpy as np
+import tensorflow as tf
+from sklearn.metrics import confusion_matrix
+
+from delta import utils
+from delta.utils.postprocess.metrics_accumulator import GrowableArray
+from delta.utils.postprocess.metrics_accumulator import LabelAccumulator
+from delta.utils.postprocess.metrics_accumulator import MetricsAccumulator
+
+
+class MetricsAccumulatorTest(tf.test.TestCase):
+  ''' metrics accumulator unittest '''
+
+  def test_growable_array(self):
+    ''' values kept across growth '''
+    array = GrowableArray(np.int64, capacity=2)
+    for i in range(5):
+      array.extend(np.arange(i))
+    self.assertLen(array, 10)
+    self.assertAllEqual(array.array, [0, 0, 1, 0, 1, 2, 0, 1, 2, 3])
+
+  def test_update(self):
+    ''' same labels and confusion as appending per batch '''
+    num_class = 3
+    labels = np.random.randint(0, num_class, size=[1000])
+    scores = np.random.rand(1000, num_class)
+    metrics = MetricsAccumulator(num_class)
+    for i in range(0, 990, 33):
+      metrics.update(labels[i:i + 33], scores[i:i + 33])
+    # single examples
+    for i in range(990, 1000):
+      metrics.update(labels[i], scores[i])
+
+    y_true, y_pred = metrics.stats
+    self.assertEqual(y_true.dtype, np.float64)
+    self.assertAllEqual(y_true, labels)
+    self.assertAllEqual(y_pred, np.argmax(scores, -1))
+    self.assertAllEqual(
+        metrics.confusion,
+        confusion_matrix(labels, np.argmax(scores, -1), labels=[0, 1, 2]))
+
+
+  def test_label_accumulator(self):
+    ''' labels of batches of [batch, time] '''
+    labels = np.random.randint(0, 5, size=[100, 7])
+    preds = np.random.randint(0, 5, size=[100, 7])
+    accumulator = LabelAccumulator()
+    for i in range(0, 100, 32):
+      accumulator.update(labels[i:i + 32], preds[i:i + 32])
+    self.assertLen(accumulator, 100)
+    y_true, y_pred = accumulator.stats
+    self.assertAllEqual(y_true, labels)
+    self.assertAllEqual(y_pred, preds)
+
+    with self.assertRaises(ValueError):
+      accumulator.update(labels[:2, :3], preds[:2, :3])
+
+  def test_label_accumulator_confusion(self):
+    ''' only confusion matrix is kept for classification metrics '''
+    config = {
+        'solver': {
+            'metrics': {
+                'pos_label': 1,
+                'cals': [{
+                    'name': 'AccuracyCal',
+                    'arguments': None
+                }, {
+                    'name': 'F1ScoreCal',
+                    'arguments': {
+                        'average': 'macro'
+                    }
+                }]
+            }
+        }
+    }
+    labels = np.random.randint(0, 3, size=[100])
+    preds = np.random.randint(0, 5, size=[100])
+    accumulator = LabelAccumulator(config)
+    self.assertFalse(accumulator.keep_labels)
+    for i in range(0, 100, 32):
+      accumulator.update(labels[i:i + 32], preds[i:i + 32])
+    self.assertLen(accumulator, 100)
+    self.assertAllEqual(accumulator.confusion,
+                        confusion_matrix(labels, preds, labels=range(5)))
+    expected = utils.metrics.get_metrics(config, y_true=labels, y_pred=preds)
+    for name, score in accumulator.get_metrics(config).items():
+      self.assertAllClose(expected[name], score)
+
+if __name__ == '__main__':
+  tf.test.main()
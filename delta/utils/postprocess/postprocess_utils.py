@@ -14,19 +14,30 @@
 # limitations under the License.
 # ==============================================================================
 ''' postprocess utils '''
+import numpy as np
 from absl import logging
 
+# bytes of .npy header of `NpyWriter`, room for any shape of a few dims
+_NPY_HEADER_BYTES = 256
 
-def ids_to_sentences(ids, vocab_file_path):
-  """
-  transform array of numbers to array of tags/words
-  ids:  [[1,2],[3,4]...]
-  """
+
+def load_id_to_vocab(vocab_file_path):
+  """ id -> tag/word of vocab file """
   # TODO import error
   from delta.data.preprocess.utils import load_vocab_dict
 
   vocab_dict = load_vocab_dict(vocab_file_path)
-  id_to_vocab = {int(v): k for k, v in vocab_dict.items()}
+  return {int(v): k for k, v in vocab_dict.items()}
+
+
+def ids_to_sentences(ids, vocab_file_path, id_to_vocab=None):
+  """
+  transform array of numbers to array of tags/words
+  ids:  [[1,2],[3,4]...]
+  id_to_vocab: loaded vocab, instead of loading `vocab_file_path`
+  """
+  if id_to_vocab is None:
+    id_to_vocab = load_id_to_vocab(vocab_file_path)
 
   sentences = []
   for sent in ids:
@@ -39,3 +50,54 @@ def ids_to_sentences(ids, vocab_file_path):
     sentences.append(sent_char)
   assert len(sentences) == len(ids)
   return sentences
+
+
+class NpyWriter:
+  '''
+  write an .npy file by appending rows of batches,
+    shape of the header is written when closed
+  '''
+
+  def __init__(self, path, dtype):
+    self.path = path
+    self.dtype = np.dtype(dtype)
+    self.row_shape = None
+    self.rows = 0
+    self._file = open(path, 'wb')
+    self._file.write(b'\0' * _NPY_HEADER_BYTES)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def append(self, batch):
+    ''' append rows of `batch`, [batch, ...] '''
+    batch = np.ascontiguousarray(batch, dtype=self.dtype)
+    if self.row_shape is None:
+      self.row_shape = batch.shape[1:]
+    elif batch.shape[1:] != self.row_shape:
+      raise ValueError('row shape {} does not match former {}'.format(
+          batch.shape[1:], self.row_shape))
+    self._file.write(batch.tobytes())
+    self.rows += len(batch)
+
+  def close(self):
+    ''' write the header of rows appended '''
+    if self._file.closed:
+      return
+    header = {
+        'descr': np.lib.format.dtype_to_descr(self.dtype),
+        'fortran_order': False,
+        'shape': (self.rows,) + tuple(self.row_shape or ()),
+    }
+    # magic, version 1.0 and uint16 length, header padded with spaces
+    prefix = np.lib.format.magic(1, 0)
+    header_len = _NPY_HEADER_BYTES - len(prefix) - 2
+    header = repr(header).encode('latin1').ljust(header_len - 1) + b'\n'
+    self._file.seek(0)
+    self._file.write(prefix)
+    self._file.write(np.uint16(header_len).astype('<u2').tobytes())
+    self._file.write(header)
+    self._file.close()
@@ -16,9 +16,11 @@
 ''' metrics utils unittest '''
 import os
 from pathlib import Path
+import numpy as np
 import tensorflow as tf
 from delta import utils
 from delta.utils.postprocess.postprocess_utils import ids_to_sentences
+from delta.utils.postprocess.postprocess_utils import NpyWriter
 
 
 
@@ -42,5 +44,18 @@ class PostprocessUtilsTest(tf.test.TestCase):
     self.assertAllEqual(sents, [["I-PER", "B-LOC", "B-PER"]])
 
 
+  def test_npy_writer(self):
+    ''' rows appended by batches, loaded as one array '''
+    path = os.path.join(self.get_temp_dir(), 'logits.npy')
+    logits = np.random.rand(10, 3).astype(np.float32)
+    with NpyWriter(path, np.float32) as writer:
+      writer.append(logits[:4])
+      writer.append(logits[4:])
+    self.assertAllEqual(np.load(path, mmap_mode='r'), logits)
+
+    with NpyWriter(path, np.int64):
+      pass
+    self.assertEqual(np.load(path).shape, (0,))
+
 if __name__ == "__main__":
   tf.test.main()
@@ -19,10 +19,10 @@ import collections
 import pickle
 from absl import logging
 import numpy as np
-from sklearn.metrics import confusion_matrix
 
-from delta import utils
 from delta.utils.postprocess.base_postproc import PostProc
+from delta.utils.postprocess.metrics_accumulator import MetricsAccumulator
+from delta.utils.postprocess import threshold_sweep
 from delta.utils.register import registers
 
 #pylint: disable=too-many-instance-attributes
@@ -55,12 +55,11 @@ class SpeakerPostProc(PostProc):
     self.eval = postconf['eval']
     self.infer = postconf['infer']
 
-    self.thresholds = postconf['thresholds']
+    self.thresholds = threshold_sweep.get_thresholds(postconf)
     self.smoothing = postconf['smoothing']['enable']
     self.smoothing_cnt = postconf['smoothing']['count']
 
-    self.stats = None
-    self.confusion = None
+    self.metrics = None
     self.pred_results = None
 
     if self.infer:
@@ -71,30 +70,14 @@ class SpeakerPostProc(PostProc):
       self.pred_metrics_path = os.path.join(self.output_dir, 'metrics.txt')
 
   #pylint: disable=no-self-use
-  def update_stats(self, prediction, stats):
-    ''' update true label and pred label'''
-    y_true = prediction['labels']
-    y_pred = np.argmax(prediction['softmax'], -1)
-    stats[0] = np.append(stats[0], y_true)
-    stats[1] = np.append(stats[1], y_pred)
-    return stats
-
-  def update_metrics(self, prediction, confusion):
-    ''' update confusion'''
-    conf = confusion_matrix(
-        y_true=prediction['labels'],
-        y_pred=np.argmax(prediction['softmax'], -1),
-        labels=list(range(self.num_class)))
-    if conf.shape != (self.num_class, self.num_class):
-      raise ValueError('Warning: confusion matrix shape error, shape {}'.format(
-          conf.shape))
-    confusion += conf
-    return confusion
-
-  def log_metrics(self, stats):
+  def update_metrics(self, prediction, metrics):
+    ''' update true label, pred label and confusion'''
+    metrics.update(prediction['labels'], prediction['softmax'])
+    return metrics
+
+  def log_metrics(self, metrics):
     ''' compute metrics'''
-    socres = utils.metrics.get_metrics(
-        self.config, y_true=stats[0], y_pred=stats[1])
+    socres = metrics.get_metrics(self.config)
     with open(self.pred_metrics_path, 'w') as fp_out:
       for key, val in socres.items():
         logging.info("{}: {}".format(key, val))
@@ -117,68 +100,19 @@ class SpeakerPostProc(PostProc):
       })
 
   def post_proc_results(self, results, thresholds=None):
-    ''' smoothing score and predict label '''
-    thresholds = thresholds or np.linspace(0, 1, num=10, endpoint=False)
-    for threshold in thresholds:
-      output_path = os.path.join(self.output_dir,
-                                 'predict_ths_%3f.txt' % (threshold))
-      with open(output_path, 'w') as predfile:
-        # history len `maxlen`
-        smoothing = self.smoothing
-        maxlen = self.smoothing_cnt
-        history = collections.deque(maxlen=maxlen)
-        vote_all = collections.deque(maxlen=maxlen)
-
-        for path in results:  # filepath
-          # sort file clips by `clipid`
-          clips = results[path]
-          clips.sort(key=lambda e: e['clipid'])
-          pos_cnt = 0
-
-          for clip in clips:  # clipid
-            clipid = clip['clipid']
-            label = clip['label']
-            score = clip['softmax']
-
-            # append history deque
-            y_pos = score[self.positive_id]
-            history.append(y_pos)
-
-            hist = list(history)
-            if smoothing:
-              # smoothing
-              y_pos = np.mean(hist)
-            else:
-              pass
-
-            # predict result for file
-            if y_pos > threshold:
-              y_pred = self.positive_id
-            else:
-              y_pred = 1 - self.positive_id
-
-            if y_pred == self.positive_id:
-              pos_cnt += 1
-              vote_all.append(True)
-            logging.info('file {}, clipid {}, label {}, pred {}'.format(
-                path, clipid, label, y_pred))
-
-          #sentence_pred = pos_cnt >= FLAGS.threshold
-          sentence_pred = all(list(vote_all))
-          sentence_label = self.positive_id if 'conflict' in str(path) else (
-              1 - self.positive_id)
-
-          logging.info("file ths_{}: {} {} {}".format(threshold, path, pos_cnt,
-                                                      sentence_pred))
-
-          predfile.write("{} {} {}\n".format(path, sentence_label, pos_cnt))
+    ''' smoothing score and count positive clips of files per threshold '''
+    if thresholds is None:
+      thresholds = self.thresholds
+    output_path = os.path.join(self.output_dir, 'predict_thresholds.txt')
+    return threshold_sweep.sweep(results, self.positive_id, thresholds,
+                                 self.smoothing, self.smoothing_cnt,
+                                 output_path)
 
   # pylint: disable=arguments-differ
   def call(self, predictions, log_verbose=False):
     ''' Implementation of postprocessing. '''
-    # [true_label, pred_label]
-    self.stats = [np.array([]), np.array([])]
-    self.confusion = np.zeros((self.num_class, self.num_class), dtype=np.int32)
+    # true_label, pred_label and confusion
+    self.metrics = MetricsAccumulator(self.num_class)
 
     self.pred_results = collections.defaultdict(list)
 
@@ -195,8 +129,7 @@ class SpeakerPostProc(PostProc):
             logging.info("{}: val: {} type: {}".format(key, val, type(val)))
 
         if self.eval:
-          self.confusion = self.update_metrics(sample, self.confusion)
-          self.stats = self.update_stats(sample, self.stats)
+          self.metrics = self.update_metrics(sample, self.metrics)
 
         if self.infer:
           self.collect_results(sample, self.pred_results, score_file)
@@ -205,7 +138,7 @@ class SpeakerPostProc(PostProc):
         pickle.dump(self.pred_results, result_file)
 
     if self.eval:
-      self.log_metrics(self.stats)
+      self.log_metrics(self.metrics)
 
     if self.infer:
       self.post_proc_results(self.pred_results, self.thresholds)
@@ -15,32 +15,70 @@
 # ==============================================================================
 ''' Speech Postprocess '''
 import os
+import numpy as np
 from absl import logging
 
-from delta.utils.postprocess.base_postproc import PostProc
+from delta.utils.postprocess.base_postproc import StreamPostProc
+from delta.utils.postprocess.postprocess_utils import NpyWriter
 from delta.utils.register import registers
 
 
 #pylint: disable=too-many-instance-attributes, too-few-public-methods
 @registers.postprocess.register
-class SavePredPostProc(PostProc):
-  '''Save the result of inference.'''
-
-  #pylint: disable=arguments-differ, unused-argument
-  def call(self, predictions, log_verbose=False):
-    ''' main func entrypoint'''
-    logits = predictions["logits"]
-    preds = predictions["preds"]
-    res_file = self.config["solver"]["postproc"].get("res_file", "")
-    if res_file == "":
+class SavePredPostProc(StreamPostProc):
+  '''
+  Save the result of inference, batch by batch.
+    res_format `text`: lines of `logits\tpred`,
+    `npy`: `res_file`.logits.npy and `res_file`.preds.npy
+  '''
+
+  def __init__(self, config):
+    super().__init__(config)
+    postconf = self.config["solver"]["postproc"]
+    self.res_file = postconf.get("res_file", "")
+    self.res_format = postconf.get("res_format", "text")
+    if self.res_format not in ("text", "npy"):
+      raise ValueError("res_format not `text` or `npy`: {}".format(
+          self.res_format))
+    self._writers = None
+
+  def begin(self):
+    if self.res_file == "":
       logging.info(
           "Infer res not saved. You can check 'res_file' in your config.")
       return
-    res_dir = os.path.dirname(res_file)
-    if not os.path.exists(res_dir):
+    res_dir = os.path.dirname(self.res_file)
+    if res_dir and not os.path.exists(res_dir):
       os.makedirs(res_dir)
-    logging.info("Save inference result to: {}".format(res_file))
-    with open(res_file, "w") as in_f:
-      for logit, pred in zip(logits, preds):
-        in_f.write(" ".join(["{:.3f}".format(num) for num in logit]) +
-                   "\t{}\n".format(pred))
+    logging.info("Save inference result to: {}".format(self.res_file))
+    if self.res_format == "npy":
+      self._writers = (NpyWriter(self.res_file + ".logits.npy", np.float32),
+                       NpyWriter(self.res_file + ".preds.npy", np.int64))
+    else:
+      self._writers = (open(self.res_file, "w"),)
+
+  def update(self, predictions):
+    if self._writers is None:
+      return
+    logits = np.asarray(predictions["logits"])
+    preds = np.asarray(predictions["preds"])
+    if self.res_format == "npy":
+      self._writers[0].append(logits)
+      self._writers[1].append(preds)
+      return
+
+    # one format string of the batch, as `{:.3f}` of logits and `{}` of pred
+    logits = logits.reshape([len(logits), -1])
+    line = " ".join(["%.3f"] * logits.shape[1]) + "\t%d\n"
+    values = np.concatenate(
+        [logits.astype(np.float64),
+         preds.reshape([-1, 1]).astype(np.float64)], axis=1)
+    text = (line * len(values)) % tuple(values.ravel().tolist())
+    self._writers[0].write(text)
+
+  def end(self):
+    if self._writers is None:
+      return
+    for writer in self._writers:
+      writer.close()
+    self._writers = None
@@ -0,0 +1,71 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+''' text cls postprocess unittest '''
+import os
+import numpy as np
+import tensorflow as tf
+
+from delta.utils.postprocess.text_cls_proc import SavePredPostProc
+
+
+class SavePredPostProcTest(tf.test.TestCase):
+  ''' text cls postprocess unittest '''
+
+  def setUp(self):
+    ''' set up '''
+    self.res_file = os.path.join(self.get_temp_dir(), 'res', 'infer_res.txt')
+    self.logits = np.random.randn(10, 3).astype(np.float32)
+    self.preds = np.argmax(self.logits, axis=-1)
+
+  def config(self, res_format):
+    return {
+        'solver': {
+            'postproc': {
+                'res_file': self.res_file,
+                'res_format': res_format
+            }
+        }
+    }
+
+  def test_text(self):
+    ''' batches written as lines of the whole predictions '''
+    postproc = SavePredPostProc(self.config('text'))
+    postproc.begin()
+    for i in range(0, 10, 4):
+      postproc.update({
+          'logits': self.logits[i:i + 4],
+          'preds': self.preds[i:i + 4]
+      })
+    postproc.end()
+
+    with open(self.res_file) as fin:
+      lines = fin.readlines()
+    desire = [
+        " ".join(["{:.3f}".format(num) for num in logit]) +
+        "\t{}\n".format(pred) for logit, pred in zip(self.logits, self.preds)
+    ]
+    self.assertEqual(lines, desire)
+
+  def test_npy(self):
+    ''' all predictions at once, as columns of npy '''
+    postproc = SavePredPostProc(self.config('npy'))
+    postproc({'logits': self.logits, 'preds': self.preds})
+    self.assertAllEqual(np.load(self.res_file + '.logits.npy'), self.logits)
+    self.assertAllEqual(np.load(self.res_file + '.preds.npy'), self.preds)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -17,60 +17,80 @@
 import os
 from absl import logging
 from seqeval.metrics.sequence_labeling import get_entities
-from delta.utils.postprocess.base_postproc import PostProc
+from delta.utils.postprocess.base_postproc import StreamPostProc
 from delta.utils.register import registers
 from delta.utils.postprocess.postprocess_utils import ids_to_sentences
+from delta.utils.postprocess.postprocess_utils import load_id_to_vocab
 
 #pylint: disable=too-many-instance-attributes, too-few-public-methods, too-many-locals
 @registers.postprocess.register
-class SavePredEntityPostProc(PostProc):
-  '''Save the result of inference.'''
+class SavePredEntityPostProc(StreamPostProc):
+  '''Save the result of inference, batch by batch.'''
 
-  #pylint: disable=arguments-differ, unused-argument
-  def call(self, predictions, log_verbose=False):
-    ''' main func entrypoint'''
-    preds = predictions["preds"]
+  def __init__(self, config):
+    super().__init__(config)
+    self.res_file = self.config["solver"]["postproc"].get("res_file", "")
+    self._texts = None
+    self._id_to_vocab = None
+    self._file = None
+
+  def read_texts(self):
+    ''' infer text lines, padded with "unk" or cut to max_seq_len '''
     paths = self.config["data"]["infer"]["paths"]
     max_seq_len = self.config["data"]["task"]["max_seq_len"]
-
-    text = []
     counter = 0
     for path in paths:
       with open(path, 'r', encoding='utf8') as file_input:
-        for line in file_input.readlines():
+        for line in file_input:
           line = list(line.strip())
           if line:
             if len(line) >= max_seq_len:
               line = line[:max_seq_len]
             else:
               line.extend(["unk"]*(max_seq_len-len(line)))
-            text.append("".join(line))
             counter += 1
+            yield "".join(line)
       logging.info("Load {} lines from {}.".format(str(counter), path))
 
-    res_file = self.config["solver"]["postproc"].get("res_file", "")
-    if res_file == "":
+  def begin(self):
+    if self.res_file == "":
       logging.info("Infer res not saved. You can check 'res_file' in your config.")
       return
-    res_dir = os.path.dirname(res_file)
+    res_dir = os.path.dirname(self.res_file)
     if not os.path.exists(res_dir):
       os.makedirs(res_dir)
-    logging.info("Save inference result to: {}".format(res_file))
+    logging.info("Save inference result to: {}".format(self.res_file))
     label_path_file = self.config["data"]["task"]["label_vocab"]
-    preds = ids_to_sentences(preds, label_path_file)
+    self._id_to_vocab = load_id_to_vocab(label_path_file)
+    self._texts = self.read_texts()
+    self._file = open(self.res_file, "w", encoding="utf-8")
 
-    assert len(text) == len(preds)
+  def update(self, predictions):
+    if self._file is None:
+      return
+    preds = ids_to_sentences(
+        predictions["preds"], None, id_to_vocab=self._id_to_vocab)
 
-    with open(res_file, "w", encoding="utf-8") as in_f:
-      for i, pre in enumerate(preds):
-        entity_dict = {}
-        entities = get_entities(pre)  # [('PER', 0, 1), ('LOC', 3, 3)]
+    for pre in preds:
+      text = next(self._texts, None)
+      if text is None:
+        raise ValueError("more predictions than infer text lines")
+      entity_dict = {}
+      entities = get_entities(pre)  # [('PER', 0, 1), ('LOC', 3, 3)]
 
-        for entity_tuple in entities:
-          entity = "".join([text[i][j] for j in range(entity_tuple[1], entity_tuple[2] + 1)])
-          if entity_tuple[0] in entity_dict:
-            entity_dict[entity_tuple[0]].append(entity)
-          else:
-            entity_dict[entity_tuple[0]] = [entity]
-        in_f.write(str(entity_dict))
-        in_f.write("\n")
+      for entity_tuple in entities:
+        entity = "".join([text[j] for j in range(entity_tuple[1], entity_tuple[2] + 1)])
+        if entity_tuple[0] in entity_dict:
+          entity_dict[entity_tuple[0]].append(entity)
+        else:
+          entity_dict[entity_tuple[0]] = [entity]
+      self._file.write(str(entity_dict))
+      self._file.write("\n")
+
+  def end(self):
+    if self._file is None:
+      return
+    self._file.close()
+    self._file = None
+    if next(self._texts, None) is not None:
+      raise ValueError("less predictions than infer text lines")
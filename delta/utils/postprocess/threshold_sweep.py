@@ -0,0 +1,120 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+'''
+sweep of decision thresholds over the clip scores of files
+
+  clip scores of files are padded into [files, clips], smoothed by
+  moving average and compared with all thresholds at once
+'''
+import numpy as np
+from absl import logging
+
+# elements of one [files, clips, thresholds] comparison
+_SWEEP_ELEMENTS = 1 << 24
+
+
+def get_thresholds(postconf):
+  '''
+  thresholds of `solver.postproc`,
+    `threshold_grid` {start, stop, num} gives a dense grid,
+    otherwise the `thresholds` list, default 0.0, 0.1, ..., 0.9
+  '''
+  grid = postconf.get('threshold_grid')
+  if grid:
+    return np.linspace(
+        grid.get('start', 0.0),
+        grid.get('stop', 1.0),
+        num=grid['num'],
+        endpoint=grid.get('endpoint', False))
+  thresholds = postconf.get('thresholds')
+  if not thresholds:
+    return np.linspace(0, 1, num=10, endpoint=False)
+  return np.asarray(thresholds, dtype=np.float64)
+
+
+def pad_file_scores(results, positive_id):
+  '''
+  results: filepath -> list of {'clipid', 'label', 'softmax'}
+  return: paths, positive scores [files, max clips] in order of `clipid`
+    zero padded, num of clips [files]
+  '''
+  paths = list(results.keys())
+  lengths = np.array([len(results[path]) for path in paths], dtype=np.int64)
+  scores = np.zeros([len(paths), max(lengths, default=0)], dtype=np.float64)
+  for i, path in enumerate(paths):
+    clips = results[path]
+    clips.sort(key=lambda entry: entry['clipid'])
+    scores[i, :len(clips)] = [clip['softmax'][positive_id] for clip in clips]
+  return paths, scores, lengths
+
+
+def moving_average(scores, window):
+  '''
+  mean of each clip score and up to `window - 1` previous clips of the file,
+    scores: [files, clips]
+  '''
+  num_clips = scores.shape[1]
+  cumsum = np.zeros([scores.shape[0], num_clips + 1], dtype=np.float64)
+  np.cumsum(scores, axis=1, out=cumsum[:, 1:])
+  end = np.arange(1, num_clips + 1)
+  begin = np.maximum(end - window, 0)
+  return (cumsum[:, end] - cumsum[:, begin]) / (end - begin)
+
+
+def count_positive(scores, lengths, thresholds):
+  '''
+  num of clips with score > threshold of each file,
+    return: [files, thresholds]
+  '''
+  thresholds = np.asarray(thresholds, dtype=np.float64)
+  num_files, num_clips = scores.shape
+  valid = np.arange(num_clips)[None, :] < lengths[:, None]
+  # padding never passes a threshold
+  scores = np.where(valid, scores, -np.inf)
+  counts = np.zeros([num_files, len(thresholds)], dtype=np.int64)
+  step = max(_SWEEP_ELEMENTS // max(num_clips * len(thresholds), 1), 1)
+  for i in range(0, num_files, step):
+    counts[i:i + step] = np.sum(
+        scores[i:i + step, :, None] > thresholds[None, None, :], axis=1)
+  return counts
+
+
+#pylint: disable=too-many-arguments
+def sweep(results, positive_id, thresholds, smoothing, window, output_path):
+  '''
+  count positive clips of each file under each threshold,
+    written as one table of `path label count@threshold...`,
+    label of file is positive if 'conflict' in its path
+  '''
+  paths, scores, lengths = pad_file_scores(results, positive_id)
+  if smoothing:
+    scores = moving_average(scores, window)
+  counts = count_positive(scores, lengths, thresholds)
+
+  with open(output_path, 'w') as predfile:
+    predfile.write('path label {}\n'.format(' '.join(
+        'ths_{:f}'.format(threshold) for threshold in thresholds)))
+    for path, file_counts in zip(paths, counts):
+      sentence_label = positive_id if 'conflict' in str(path) else (
+          1 - positive_id)
+      predfile.write('{} {} {}\n'.format(path, sentence_label,
+                                         ' '.join(map(str, file_counts))))
+
+  for threshold, positive_files in zip(thresholds,
+                                       np.sum(counts > 0, axis=0)):
+    logging.info('ths_{:f}: {} of {} files with positive clips'.format(
+        threshold, positive_files, len(paths)))
+  return counts
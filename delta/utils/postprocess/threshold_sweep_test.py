@@ -0,0 +1,92 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+''' threshold sweep unittest '''
+import os
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+from delta.utils.postprocess import threshold_sweep
+
+
+class ThresholdSweepTest(tf.test.TestCase):
+  ''' threshold sweep unittest '''
+
+  def setUp(self):
+    ''' set up '''
+    rng = np.random.RandomState(0)
+    self.results = {}
+    for i in range(20):
+      num_clips = rng.randint(1, 10)
+      path = 'conflict/{}.wav'.format(i) if i % 2 else 'normal/{}.wav'.format(i)
+      self.results[path] = [{
+          'clipid': clipid,
+          'label': 0,
+          'softmax': rng.rand(2)
+      } for clipid in rng.permutation(num_clips)]
+    self.thresholds = np.linspace(0, 1, num=10, endpoint=False)
+
+  def _expected(self, window):
+    ''' clip by clip sweep '''
+    counts = []
+    for clips in self.results.values():
+      scores = [clip['softmax'][1] for clip in sorted(
+          clips, key=lambda clip: clip['clipid'])]
+      smoothed = [
+          np.mean(scores[max(0, i + 1 - window):i + 1])
+          for i in range(len(scores))
+      ]
+      counts.append([np.sum(np.array(smoothed) > threshold)
+                     for threshold in self.thresholds])
+    return np.array(counts)
+
+  def test_moving_average(self):
+    ''' cumsum moving average '''
+    scores = np.array([[1., 2., 3., 4.]])
+    self.assertAllClose(
+        threshold_sweep.moving_average(scores, 2), [[1., 1.5, 2.5, 3.5]])
+
+  def test_sweep(self):
+    ''' counts of all thresholds, one table '''
+    output_path = os.path.join(tempfile.mkdtemp(), 'predict_thresholds.txt')
+    for smoothing, window in ((True, 3), (False, 1)):
+      counts = threshold_sweep.sweep(self.results, 1, self.thresholds,
+                                     smoothing, window, output_path)
+      self.assertAllEqual(counts, self._expected(window))
+
+    with open(output_path) as fin:
+      lines = fin.read().splitlines()
+    self.assertLen(lines, len(self.results) + 1)
+    self.assertLen(lines[0].split(), len(self.thresholds) + 2)
+    path, label = lines[2].split()[:2]
+    self.assertEqual((path, label), ('conflict/1.wav', '1'))
+
+  def test_get_thresholds(self):
+    ''' dense grid overrides list '''
+    self.assertAllClose(
+        threshold_sweep.get_thresholds({'thresholds': [0.5]}), [0.5])
+    self.assertLen(
+        threshold_sweep.get_thresholds({
+            'thresholds': [0.5],
+            'threshold_grid': {
+                'num': 100
+            }
+        }), 100)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -30,6 +30,7 @@ from tensorflow.keras.callbacks import TensorBoard
 
 from delta import utils
 from delta.utils.solver.base_solver import Solver
+from delta.utils.solver.solver_utils import get_session_conf
 from delta.utils.register import registers
 
 
@@ -57,6 +58,10 @@ class AsrSolver(Solver):
 
     _, self._ngpu = utils.gpu_device_names()
 
+    tfconf = self._solver['run_config']
+    if tfconf.get('xla', False) or self.mixed_precision:
+      K.set_session(tf.Session(config=get_session_conf(config)))
+
     #model
     self._model = None
     self._parallel_model = None
@@ -135,7 +140,11 @@ class AsrSolver(Solver):
     loss = self.get_ctc_loss()
     multitask = self.config['solver']['optimizer']['multitask']
     optimizer = self.get_optimizer(multitask)
-    optimizer = Adam()
+    if self.mixed_precision:
+      # loss scaling wraps tf.train optimizers only
+      optimizer = self.loss_scale_optimizer(tf.train.AdamOptimizer())
+    else:
+      optimizer = Adam()
 
     run_opts, run_metas = self.get_run_opts_metas()
 
@@ -112,6 +112,8 @@ class Solver(ABCSolver):
     super().__init__()
     self._config = self.process_config(config)
     self._task = None
+    # whether to apply the accumulated gradients at this step
+    self._accum_apply = None
 
   @property
   def config(self):
@@ -144,6 +146,12 @@ class Solver(ABCSolver):
     """Get the loss function."""
     return utils.misc.loss(self.config)
 
+  @property
+  def mixed_precision(self):
+    """Whether training in automatic mixed precision."""
+    tfconf = self.config['solver'].get('run_config', {})
+    return tfconf.get('mixed_precision', False)
+
   def get_learning_rate(self):
     """Get the learning rate."""
     lrconf = self.config['solver']['optimizer']['learning_rate']
@@ -206,7 +214,21 @@ class Solver(ABCSolver):
       logging.info("Using multi-task optimizer")
     return opt
 
-  #pylint: disable=no-self-use
+  def loss_scale_optimizer(self, opt):
+    """Wrap the optimizer with dynamic loss scaling under mixed precision."""
+    if not self.mixed_precision:
+      return opt
+    tfconf = self.config['solver']['run_config']
+    #pylint: disable=line-too-long
+    loss_scale_manager = tf.contrib.mixed_precision.ExponentialUpdateLossScaleManager(
+        init_loss_scale=tfconf.get('init_loss_scale', 2**15),
+        incr_every_n_steps=tfconf.get('incr_loss_scale_every_n_steps', 1000))
+    if not tf.executing_eagerly():
+      tf.summary.scalar('loss_scale', loss_scale_manager.get_loss_scale())
+    logging.info("Using dynamic loss scaling")
+    return tf.contrib.mixed_precision.LossScaleOptimizer(
+        opt, loss_scale_manager)
+
   def clip_gradients(self, grads_and_vars, clip_ratio, multitask=False):
     """Clip the gradients."""
     is_zip_obj = False
@@ -217,6 +239,11 @@ class Solver(ABCSolver):
     with tf.variable_scope('grad'):
       for grad, var in grads_and_vars:
         if grad is not None:
+          if self.mixed_precision:
+            # gradients of the steps skipped by loss scaling are inf or nan
+            if isinstance(grad, tf.IndexedSlices):
+              grad = grad.values
+            grad = tf.where(tf.is_finite(grad), grad, tf.zeros_like(grad))
           if tf.executing_eagerly():
             tf.contrib.summary.histogram(var.name[:-2], grad)
           else:
@@ -248,18 +275,78 @@ class Solver(ABCSolver):
 
   def get_apply_gradients_op(self, loss, multitask, global_step=None):
     """Get Apply gradients operator."""
-    opt = self.get_optimizer(multitask)
+    opt = self.loss_scale_optimizer(self.get_optimizer(multitask))
     grads_and_vars = opt.compute_gradients(loss)
+    global_step = global_step or tf.train.get_or_create_global_step()
 
-    # clip gradient
     optconf = self.config['solver']['optimizer']
+    accum_steps = optconf.get('accum_steps', 1)
+    if accum_steps > 1:
+      grads_and_vars, accums = self.accumulate_gradients(
+          grads_and_vars, accum_steps)
+    else:
+      self._accum_apply = None
+
+    # clip gradient
     global_norm = optconf['clip_global_norm']
     grads_and_vars = self.clip_gradients(grads_and_vars, global_norm, multitask)
 
-    apply_gradient_op = opt.apply_gradients(
-        grads_and_vars,
-        global_step=global_step or tf.train.get_or_create_global_step())
-    return apply_gradient_op
+    if self._accum_apply is None:
+      return opt.apply_gradients(grads_and_vars, global_step=global_step)
+
+    grads_and_vars = list(grads_and_vars)
+
+    def _apply():
+      apply_gradient_op = opt.apply_gradients(
+          grads_and_vars, global_step=global_step)
+      with tf.control_dependencies([apply_gradient_op]):
+        return tf.group(
+            *[accum.assign(tf.zeros_like(accum)) for accum in accums])
+
+    return tf.cond(self._accum_apply, _apply, tf.no_op)
+
+  def accumulate_gradients(self, grads_and_vars, accum_steps):
+    """
+    Accumulate gradients of micro batches in non-trainable variables,
+      returns the mean gradients of the last `accum_steps` micro batches
+      with their vars, and the accumulators.
+    The global step counts the applied steps, so that the learning rate
+      schedules and the model average go by them.
+    """
+    if tf.distribute.get_strategy().num_replicas_in_sync > 1:
+      raise ValueError("Not support accum_steps with multiple replicas")
+    logging.info("Accumulate gradients of {} steps".format(accum_steps))
+
+    grads_and_vars = [(grad, var)
+                      for grad, var in grads_and_vars
+                      if grad is not None]
+    accums, accum_ops = [], []
+    with tf.variable_scope('grad_accum'):
+      for grad, var in grads_and_vars:
+        accum = tf.get_variable(
+            var.op.name,
+            shape=var.shape,
+            dtype=var.dtype.base_dtype,
+            initializer=tf.zeros_initializer(),
+            trainable=False)
+        if isinstance(grad, tf.IndexedSlices):
+          accum_ops.append(tf.scatter_add(accum, grad.indices, grad.values))
+        else:
+          accum_ops.append(tf.assign_add(accum, grad))
+        accums.append(accum)
+      accum_step = tf.get_variable(
+          'step', [],
+          dtype=tf.int64,
+          initializer=tf.zeros_initializer(),
+          trainable=False)
+
+      with tf.control_dependencies(accum_ops):
+        step = tf.assign_add(accum_step, 1)
+        mean_grads = [accum.read_value() / accum_steps for accum in accums]
+    self._accum_apply = tf.equal(tf.mod(step, accum_steps), 0)
+
+    variables = [var for _, var in grads_and_vars]
+    return list(zip(mean_grads, variables)), accums
 
   def get_var_avg_ema(self, decay, global_step=None):
     ''' make var average ema '''
@@ -287,7 +374,15 @@ class Solver(ABCSolver):
     var_avg_model = model_avg_conf['enable']
     if var_avg_model:
       var_avg_decay = model_avg_conf['var_avg_decay']
-      variable_averages = self.get_var_avg_ema(var_avg_decay, global_step)
+      if self._accum_apply is None:
+        variable_averages = self.get_var_avg_ema(var_avg_decay, global_step)
+      else:
+        # averages move only at the steps applying accumulated gradients
+        step = tf.cast(global_step or tf.train.get_or_create_global_step(),
+                       tf.float32)
+        decay = tf.minimum(var_avg_decay, (1.0 + step) / (10.0 + step))
+        decay = tf.where(self._accum_apply, decay, 1.0)
+        variable_averages = tf.train.ExponentialMovingAverage(decay)
       apply_op = variable_averages.apply(tf.trainable_variables())
       tf.add_to_collection(tf.GraphKeys.UPDATE_OPS, apply_op)
       utils.log_vars('Avg Trainable Vars', tf.trainable_variables())
@@ -0,0 +1,109 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Test for base solver."""
+
+import numpy as np
+import tensorflow as tf
+
+from delta.utils.solver.base_solver import Solver
+
+# pylint: disable=missing-docstring
+
+
+class MockSolver(Solver):
+
+  def process_config(self, config):
+    return config
+
+  def train(self):
+    pass
+
+  def eval(self):
+    pass
+
+  def infer(self):
+    pass
+
+  def train_and_eval(self):
+    pass
+
+  def export_model(self):
+    pass
+
+
+class SolverTest(tf.test.TestCase):
+
+  def config(self, accum_steps):
+    return {
+        'solver': {
+            'optimizer': {
+                'name': 'gradientdecent',
+                'learning_rate': {
+                    'rate': 1.0,
+                    'type': 'const'
+                },
+                'clip_global_norm': None,
+                'accum_steps': accum_steps,
+            },
+            'quantization': {
+                'enable': False
+            },
+            'model_average': {
+                'enable': True,
+                'var_avg_decay': 0.5
+            },
+            'run_config': {},
+        }
+    }
+
+  def test_accumulate_gradients(self):
+    solver = MockSolver(self.config(accum_steps=2))
+    inputs = tf.placeholder(tf.float32, [2])
+    weight = tf.get_variable(
+        'weight', initializer=tf.constant([1.0, 2.0]), trainable=True)
+    loss = tf.reduce_sum(weight * inputs)
+    global_step = tf.train.get_or_create_global_step()
+    train_op = solver.get_train_op(loss, False, global_step)
+    ema = tf.train.ExponentialMovingAverage(0.5)
+    shadow = [
+        var for var in tf.global_variables()
+        if var.op.name == ema.average_name(weight)
+    ][0]
+
+    with self.cached_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      # micro batch, not applied
+      sess.run(train_op, feed_dict={inputs: [1.0, 1.0]})
+      self.assertAllClose(sess.run(weight), [1.0, 2.0])
+      self.assertAllClose(sess.run(shadow), [1.0, 2.0])
+      self.assertEqual(sess.run(global_step), 0)
+
+      # applied with mean of the gradients
+      sess.run(train_op, feed_dict={inputs: [3.0, 5.0]})
+      self.assertAllClose(sess.run(weight), [-1.0, -1.0])
+      self.assertEqual(sess.run(global_step), 1)
+
+      # accumulators are reset
+      sess.run(train_op, feed_dict={inputs: [1.0, 1.0]})
+      sess.run(train_op, feed_dict={inputs: [1.0, 1.0]})
+      self.assertAllClose(sess.run(weight), [-2.0, -2.0])
+      self.assertEqual(sess.run(global_step), 2)
+      self.assertAllClose(np.zeros([2]),
+                          sess.run(tf.global_variables('grad_accum/weight')[0]))
+
+
+if __name__ == '__main__':
+  tf.test.main()
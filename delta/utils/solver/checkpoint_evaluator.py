@@ -0,0 +1,177 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Evaluate new checkpoints in background while training."""
+
+import os
+import glob
+import json
+import shutil
+import threading
+
+import numpy as np
+import tensorflow as tf
+from absl import logging
+
+BEST_DIR = 'best'
+BEST_RECORD = 'best_checkpoint.json'
+
+
+def checkpoint_step(model_path):
+  """Global step in the name of checkpoint `model_path`."""
+  return int(model_path.rsplit('-', 1)[-1])
+
+
+def scalar_metrics(metrics):
+  """Scalar values of `metrics`, as float."""
+  return {
+      key: float(val)
+      for key, val in metrics.items()
+      if np.ndim(val) == 0 and np.issubdtype(np.asarray(val).dtype, np.number)
+  }
+
+
+class CheckpointEvaluator(threading.Thread):
+  """
+  Watch `checkpoint_dir` for new checkpoints and evaluate the latest one by
+    `eval_fn(model_path) -> metrics dict`, writing the scalar metrics as
+    summaries under `checkpoint_dir`/eval. The best checkpoint by
+    `best_metric` is copied to `checkpoint_dir`/best with a json record.
+  """
+
+  #pylint: disable=too-many-arguments
+  def __init__(self,
+               eval_fn,
+               checkpoint_dir,
+               poll_secs=10,
+               best_metric='loss',
+               best_mode='min'):
+    super().__init__(name='checkpoint_evaluator', daemon=True)
+    if best_mode not in ('min', 'max'):
+      raise ValueError('best_mode not `min` or `max`: {}'.format(best_mode))
+    self.eval_fn = eval_fn
+    self.checkpoint_dir = checkpoint_dir
+    self.poll_secs = poll_secs
+    self.best_metric = best_metric
+    self.best_mode = best_mode
+    self.best_dir = os.path.join(checkpoint_dir, BEST_DIR)
+    self.best = self.load_best()
+    self.last_path = None
+    self._stop_event = threading.Event()
+    self._writer = tf.summary.FileWriter(os.path.join(checkpoint_dir, 'eval'))
+
+  def load_best(self):
+    """Best record of a former run of `best_metric`, None if not found."""
+    path = os.path.join(self.best_dir, BEST_RECORD)
+    if not os.path.exists(path):
+      return None
+    with open(path) as fin:
+      best = json.load(fin)
+    return best if best['metric'] == self.best_metric else None
+
+  def run(self):
+    while True:
+      stopping = self._stop_event.wait(self.poll_secs)
+      try:
+        self.evaluate_latest()
+      except Exception:  #pylint: disable=broad-except
+        # keep polling, a failed checkpoint must not stop the evaluation
+        logging.exception('eval checkpoint failed: {}'.format(self.last_path))
+      if stopping:
+        return
+
+  def stop(self):
+    """Evaluate the last checkpoint and stop."""
+    self._stop_event.set()
+    self.join()
+    self._writer.close()
+
+  def evaluate_latest(self):
+    """Evaluate the latest checkpoint if it is not evaluated."""
+    model_path = tf.train.latest_checkpoint(self.checkpoint_dir)
+    if model_path is None or model_path == self.last_path:
+      return None
+    self.last_path = model_path
+    try:
+      metrics = self.eval_fn(model_path)
+    except (tf.errors.NotFoundError, FileNotFoundError, ValueError):
+      # removed by `max_to_keep` before restored
+      logging.warning('checkpoint removed before eval: {}'.format(model_path))
+      return None
+    if not metrics:
+      return None
+
+    step = checkpoint_step(model_path)
+    scalars = scalar_metrics(metrics)
+    summary = tf.Summary()
+    for key, val in sorted(scalars.items()):
+      summary.value.add(tag='eval/{}'.format(key), simple_value=val)
+    self._writer.add_summary(summary, step)
+    self._writer.flush()
+    self.update_best(model_path, step, scalars)
+    return scalars
+
+  def is_better(self, value):
+    """Whether `value` of `best_metric` is better than the best."""
+    if self.best is None:
+      return True
+    if self.best_mode == 'min':
+      return value < self.best['value']
+    return value > self.best['value']
+
+  def update_best(self, model_path, step, scalars):
+    """Copy `model_path` to the best dir if it is the best."""
+    if self.best_metric not in scalars:
+      logging.warning('best_metric {} not in eval metrics: {}'.format(
+          self.best_metric, sorted(scalars.keys())))
+      return False
+    value = scalars[self.best_metric]
+    if not self.is_better(value):
+      return False
+
+    os.makedirs(self.best_dir, exist_ok=True)
+    best_path = os.path.join(self.best_dir, os.path.basename(model_path))
+    try:
+      filenames = glob.glob(model_path + '.*')
+      if not filenames:
+        raise FileNotFoundError(model_path)
+      for filename in filenames:
+        shutil.copy(filename, self.best_dir)
+    except FileNotFoundError:
+      # removed by `max_to_keep` while copying, the former best is kept
+      logging.warning('checkpoint removed before copy: {}'.format(model_path))
+      for filename in glob.glob(best_path + '.*'):
+        os.remove(filename)
+      return False
+    for filename in glob.glob(os.path.join(self.best_dir, 'model.ckpt-*')):
+      if not filename.startswith(best_path + '.'):
+        os.remove(filename)
+    tf.train.update_checkpoint_state(self.best_dir, best_path)
+
+    self.best = {
+        'model_path': best_path,
+        'step': step,
+        'metric': self.best_metric,
+        'value': value,
+        'metrics': scalars,
+    }
+    record = os.path.join(self.best_dir, BEST_RECORD)
+    tmp = '{}.{}.tmp'.format(record, os.getpid())
+    with open(tmp, 'w') as fout:
+      json.dump(self.best, fout, indent=2)
+    os.replace(tmp, record)
+    logging.info('best checkpoint of {} {:g}: {}'.format(
+        self.best_metric, value, best_path))
+    return True
@@ -0,0 +1,155 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Test for checkpoint evaluator."""
+
+import os
+import glob
+import json
+import time
+import numpy as np
+import tensorflow as tf
+
+from delta.utils.solver import checkpoint_evaluator
+
+# pylint: disable=missing-docstring
+
+
+class CheckpointEvaluatorTest(tf.test.TestCase):
+
+  def setUp(self):
+    self.checkpoint_dir = self.get_temp_dir()
+    self.losses = {10: 0.5, 20: 0.7, 30: 0.3}
+    self.evaluated = []
+
+  def save_checkpoint(self, step):
+    model_path = os.path.join(self.checkpoint_dir, 'model.ckpt-{}'.format(step))
+    for suffix in ('.index', '.meta', '.data-00000-of-00001'):
+      with open(model_path + suffix, 'w') as fout:
+        fout.write(str(step))
+    tf.train.update_checkpoint_state(self.checkpoint_dir, model_path)
+    return model_path
+
+  def eval_fn(self, model_path):
+    self.evaluated.append(model_path)
+    step = checkpoint_evaluator.checkpoint_step(model_path)
+    return {
+        'loss': self.losses[step],
+        'AccuracyCal': 1.0 - self.losses[step],
+        'ConfusionMatrixCal': np.eye(2),
+    }
+
+  def test_best(self):
+    evaluator = checkpoint_evaluator.CheckpointEvaluator(
+        self.eval_fn, self.checkpoint_dir, best_metric='loss', best_mode='min')
+    self.assertIsNone(evaluator.evaluate_latest())
+
+    path_10 = self.save_checkpoint(10)
+    scalars = evaluator.evaluate_latest()
+    self.assertEqual(sorted(scalars.keys()), ['AccuracyCal', 'loss'])
+    # evaluated once
+    self.assertIsNone(evaluator.evaluate_latest())
+    self.assertEqual(self.evaluated, [path_10])
+    self.assertEqual(evaluator.best['step'], 10)
+
+    self.save_checkpoint(20)
+    evaluator.evaluate_latest()
+    self.assertEqual(evaluator.best['step'], 10)
+
+    self.save_checkpoint(30)
+    evaluator.evaluate_latest()
+    best_dir = os.path.join(self.checkpoint_dir, checkpoint_evaluator.BEST_DIR)
+    self.assertEqual(
+        sorted(os.listdir(best_dir)), [
+            checkpoint_evaluator.BEST_RECORD, 'checkpoint',
+            'model.ckpt-30.data-00000-of-00001', 'model.ckpt-30.index',
+            'model.ckpt-30.meta'
+        ])
+    self.assertEqual(
+        tf.train.latest_checkpoint(best_dir),
+        os.path.join(best_dir, 'model.ckpt-30'))
+    with open(os.path.join(best_dir, checkpoint_evaluator.BEST_RECORD)) as fin:
+      record = json.load(fin)
+    self.assertEqual(record['step'], 30)
+    self.assertAllClose(record['value'], 0.3)
+
+    # best record of a former run
+    evaluator = checkpoint_evaluator.CheckpointEvaluator(
+        self.eval_fn, self.checkpoint_dir)
+    self.assertEqual(evaluator.best['step'], 30)
+    evaluator = checkpoint_evaluator.CheckpointEvaluator(
+        self.eval_fn,
+        self.checkpoint_dir,
+        best_metric='AccuracyCal',
+        best_mode='max')
+    self.assertIsNone(evaluator.best)
+
+  def test_removed_before_copy(self):
+    evaluator = checkpoint_evaluator.CheckpointEvaluator(
+        self.eval_fn, self.checkpoint_dir, best_metric='loss', best_mode='min')
+    self.save_checkpoint(10)
+    evaluator.evaluate_latest()
+
+    # removed by `max_to_keep` after eval
+    path_30 = self.save_checkpoint(30)
+    eval_fn = evaluator.eval_fn
+
+    def _eval_and_remove(model_path):
+      metrics = eval_fn(model_path)
+      for filename in glob.glob(path_30 + '.*'):
+        os.remove(filename)
+      return metrics
+
+    evaluator.eval_fn = _eval_and_remove
+    evaluator.evaluate_latest()
+    self.assertEqual(evaluator.best['step'], 10)
+    best_dir = os.path.join(self.checkpoint_dir, checkpoint_evaluator.BEST_DIR)
+    self.assertEqual(
+        tf.train.latest_checkpoint(best_dir),
+        os.path.join(best_dir, 'model.ckpt-10'))
+    self.assertEqual(glob.glob(os.path.join(best_dir, 'model.ckpt-30*')), [])
+
+  def test_thread(self):
+    evaluator = checkpoint_evaluator.CheckpointEvaluator(
+        self.eval_fn, self.checkpoint_dir, poll_secs=100)
+    evaluator.start()
+    path_20 = self.save_checkpoint(20)
+    # the last checkpoint is evaluated when stopping
+    evaluator.stop()
+    self.assertFalse(evaluator.is_alive())
+    self.assertEqual(self.evaluated, [path_20])
+
+  def test_thread_eval_error(self):
+    path_10 = self.save_checkpoint(10)
+
+    def _eval_fn(model_path):
+      if model_path == path_10:
+        raise RuntimeError('eval failed')
+      return self.eval_fn(model_path)
+
+    evaluator = checkpoint_evaluator.CheckpointEvaluator(
+        _eval_fn, self.checkpoint_dir, poll_secs=0.01)
+    evaluator.start()
+    while evaluator.last_path != path_10:
+      time.sleep(0.01)
+    # still polling after the failed checkpoint
+    self.assertTrue(evaluator.is_alive())
+    path_20 = self.save_checkpoint(20)
+    evaluator.stop()
+    self.assertEqual(self.evaluated, [path_20])
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -15,6 +15,7 @@
 # ==============================================================================
 ''' Estimator base class for classfication '''
 import os
+import math
 from absl import logging
 import tensorflow as tf
 from tensorflow.python import debug as tf_debug  #pylint: disable=no-name-in-module
@@ -27,6 +28,7 @@ from delta import utils
 from delta.utils import metrics as metrics_lib
 from delta.utils.register import registers
 from delta.utils.solver.base_solver import ABCEstimatorSolver
+from delta.utils.solver.solver_utils import get_session_conf
 
 
 #pylint: disable=abstract-method
@@ -42,13 +44,42 @@ class EstimatorSolver(ABCEstimatorSolver):
       os.makedirs(self.eval_path)
     self.eval_metrics_path = os.path.join(self.eval_path, 'metrics.txt')
 
+    # data parallel training across the workers of TF_CONFIG
+    self.multi_worker_conf = config['solver']['run_config'].get(
+        'multi_worker', {})
+    if self.multi_worker:
+      utils.set_tf_config(self.multi_worker_conf)
+
+  @property
+  def multi_worker(self):
+    ''' whether training on multiple workers '''
+    return self.multi_worker_conf.get('enable', False)
+
   def input_fn(self, mode):
     ''' return input_fn '''
     super().input_fn(mode)
     batch_size = self.config['solver']['optimizer']['batch_size']
     num_epoch = self.config['solver']['optimizer']['epochs']
+    if self.multi_worker and mode == utils.TRAIN:
+      # shards of workers end at different steps, which would block the
+      # all-reduce of the others, so the data repeats until `max_steps`
+      num_epoch = None
     return self.task.input_fn(mode, batch_size, num_epoch)
 
+  def multi_worker_max_steps(self):
+    ''' train steps of all epochs of `multi_worker.train_data_size` '''
+    data_size = self.multi_worker_conf.get('train_data_size')
+    if not data_size:
+      raise ValueError(
+          "multi_worker.train_data_size is required to stop after epochs")
+    optimizer_conf = self.config['solver']['optimizer']
+    global_batch_size = optimizer_conf['batch_size']
+    if self.multi_worker_conf.get('strategy', 'collective') == 'collective':
+      # one synchronous step runs a batch on each worker
+      global_batch_size *= utils.num_train_workers()
+    return int(
+        math.ceil(optimizer_conf['epochs'] * data_size / global_batch_size))
+
   def get_scaffold(self, mode, global_step=None):
     if mode != utils.TRAIN:
       # for model average
@@ -163,18 +194,18 @@ class EstimatorSolver(ABCEstimatorSolver):
 
     # multi-gpus
     devices, num_gpu = utils.gpu_device_names()
-    distribution = utils.get_distribution_strategy(num_gpu)
+    if self.multi_worker:
+      distribution = utils.get_multi_worker_strategy(
+          num_gpu, self.multi_worker_conf.get('strategy', 'collective'))
+      logging.info('TF_CONFIG: {}'.format(utils.tf_config()))
+    else:
+      distribution = utils.get_distribution_strategy(num_gpu)
     logging.info('Device: {}/{}'.format(num_gpu, devices))
 
     # run config
     tfconf = self.config['solver']['run_config']
     saverconf = self.config['solver']['saver']
-    session_config = tf.ConfigProto(
-        allow_soft_placement=tfconf['allow_soft_placement'],
-        log_device_placement=tfconf['log_device_placement'],
-        intra_op_parallelism_threads=tfconf['intra_op_parallelism_threads'],
-        inter_op_parallelism_threads=tfconf['inter_op_parallelism_threads'],
-        gpu_options=tf.GPUOptions(allow_growth=tfconf['allow_growth']))
+    session_config = get_session_conf(self.config)
 
     run_config = tf.estimator.RunConfig(  #pylint: disable=no-member
         tf_random_seed=tfconf['tf_random_seed'],
@@ -337,6 +368,8 @@ class EstimatorSolver(ABCEstimatorSolver):
 
   def train(self):
     ''' only train '''
+    if self.multi_worker:
+      raise ValueError("Multi-worker training only runs by train_and_eval")
     nn = self.create_estimator()  #pylint: disable=invalid-name
 
     num_epochs = self.config['solver']['optimizer']['epochs']
@@ -379,8 +412,12 @@ class EstimatorSolver(ABCEstimatorSolver):
   #pylint: disable=invalid-name
   def train_and_eval_one_epoch(self, nn, train_spec, eval_spec):
     ''' train and eval for one epoch '''
-    eval_result, export_result = tf.estimator.train_and_evaluate(  #pylint: disable=no-member
+    result = tf.estimator.train_and_evaluate(  #pylint: disable=no-member
         nn, train_spec, eval_spec)
+    if result is None:
+      # multi-worker, evaluated and exported by the evaluator task
+      return
+    eval_result, export_result = result
     logging.info("Export result:{}".format(export_result))
     self.log_eval_metrics(eval_result)
 
@@ -390,8 +427,10 @@ class EstimatorSolver(ABCEstimatorSolver):
     #logging.info("Vars: {}".format(nn.get_variable_names()))
 
     #pylint: disable=no-member
+    # the evaluator exports and exits at `max_steps` of multi-worker
+    max_steps = self.multi_worker_max_steps() if self.multi_worker else None
     train_spec = tf.estimator.TrainSpec(
-        input_fn=self.input_fn(utils.TRAIN), max_steps=None, hooks=None)
+        input_fn=self.input_fn(utils.TRAIN), max_steps=max_steps, hooks=None)
 
     #pylint: disable=no-member
     eval_spec = tf.estimator.EvalSpec(
@@ -420,6 +459,11 @@ class EstimatorSolver(ABCEstimatorSolver):
         start_delay_secs=60,
         throttle_secs=600)
 
+    if self.multi_worker:
+      # servers of the cluster start once, trained until `max_steps`
+      self.train_and_eval_one_epoch(nn, train_spec, eval_spec)
+      return
+
     num_epochs = self.config['solver']['optimizer']['epochs']
     for epoch in range(num_epochs):
       logging.info("epoch: {}".format(epoch + 1))
@@ -442,6 +486,9 @@ class EstimatorSolver(ABCEstimatorSolver):
     return self.postproc_fn()(predictions, log_verbose=False)
 
   def export_model(self):
+    if not utils.is_chief_task():
+      logging.info("Export model by the chief only")
+      return
     saver_conf = self.config['solver']['saver']
     nn = self.create_estimator()  #pylint: disable=invalid-name
     nn.export_savedmodel(
@@ -79,7 +79,7 @@ class KerasSolver(Solver):
     loss_fn = self.get_loss_fn()
 
     multitask = self.config['solver']['optimizer']['multitask']
-    optimizer = self.get_optimizer(multitask)
+    optimizer = self.loss_scale_optimizer(self.get_optimizer(multitask))
 
     self.model.compile(optimizer=optimizer, loss=loss_fn, metrics=self.metrics)
 
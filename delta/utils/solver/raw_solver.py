@@ -23,8 +23,10 @@ from absl import logging
 from delta.utils.solver.base_solver import Solver
 
 from delta import utils
-from delta.utils import metrics
+from delta.utils.postprocess.base_postproc import StreamPostProc
+from delta.utils.postprocess.metrics_accumulator import LabelAccumulator
 from delta.utils.register import registers
+from delta.utils.solver.checkpoint_evaluator import CheckpointEvaluator
 from delta.utils.solver.solver_utils import get_checkpoint_dir
 from delta.utils.solver.solver_utils import get_ckpt_state
 from delta.utils.solver.solver_utils import get_session_conf
@@ -121,6 +123,9 @@ class RawSolver(Solver):
     model.iterator = inputs["iterator"]
     model.input_x_dict = inputs["input_x_dict"]
     model.input_x_len = inputs["input_x_len"]
+    # batches may have various sizes with length bucketing
+    model.batch_examples = tf.shape(
+        next(iter(model.input_x_dict.values())))[0]
     model.loss_fn = self.get_loss_fn()
     if mode != utils.INFER or not self.infer_no_label:
       input_y = inputs["input_y_dict"]["input_y"]
@@ -187,17 +192,22 @@ class RawSolver(Solver):
     self.eval_or_infer_core(model, mode)
     model.sess.close()
 
-  def eval_or_infer_core(self, model, mode):  # pylint: disable=too-many-locals, too-many-branches
-    """The core part of evaluation."""
+  def eval_or_infer_core(self, model, mode, model_path=None):  # pylint: disable=too-many-locals, too-many-branches
+    """
+    The core part of evaluation.
+    Restore `model_path`, default the model path of `mode`,
+    return the metrics and loss of evaluation.
+    """
 
     if mode == utils.EVAL or not self.infer_no_label:
       self.do_eval = True
     else:
       self.do_eval = False
-    model_path = self.get_model_path(mode)
+    if model_path is None:
+      model_path = self.get_model_path(mode)
     if model_path is None:
       logging.warning("model_path is None!")
-      return
+      return None
 
     with model.sess.graph.as_default():
       model.saver.restore(model.sess, save_path=model_path)
@@ -211,61 +221,75 @@ class RawSolver(Solver):
       data_size = self.config["data"]['{}_data_size'.format(mode)]
       num_batch_every_epoch = int(math.ceil(data_size / self.batch_size))
 
-      y_ground_truth = []
+      # labels of eval and predictions of stream postproc are consumed
+      # batch by batch, others are concatenated at the end
+      labels = LabelAccumulator(self.config) if self.do_eval else None
+      postproc = self.postproc_fn() if mode == utils.INFER else None
+      stream = isinstance(postproc, StreamPostProc)
       y_logits = []
       y_preds = []
 
+      fetches = {"preds": model.preds}
+      if mode == utils.INFER:
+        fetches["logits"] = model.logits
+      if self.do_eval:
+        fetches["loss"] = model.loss
+        fetches["y_ground_truth"] = model.y_ground_truth
+
       logging.info("Total eval data size: {},"
                    "batch num per epoch: {}".format(data_size, num_batch_every_epoch))
 
-      for i in range(num_batch_every_epoch):
-
-        if self.do_eval:
-          loss_val, \
-          batch_logits, \
-          batch_preds, \
-          batch_y_ground_truth = model.sess.run(
-              [model.loss, model.logits,
-               model.preds, model.y_ground_truth])
-        else:
-          batch_logits, batch_preds = model.sess.run(
-              [model.logits, model.preds])
-
-        end_id = (i + 1) * self.batch_size
-
-        if data_size < end_id:
-          act_end_id = self.batch_size - end_id + data_size
-          batch_logits = batch_logits[:act_end_id]
-          batch_preds = batch_preds[:act_end_id]
-          if self.do_eval:
-            batch_y_ground_truth = batch_y_ground_truth[:act_end_id]
-
-        y_logits.append(batch_logits)
-        y_preds.append(batch_preds)
+      if stream:
+        postproc.begin()
+      try:
+        for i in range(num_batch_every_epoch):
+          batch = model.sess.run(fetches)
 
-        if self.do_eval:
-          y_ground_truth.append(batch_y_ground_truth)
-          total_loss += loss_val
+          end_id = (i + 1) * self.batch_size
 
-        if i % 10 == 0 or i == num_batch_every_epoch - 1:
-          logging.info("Evaluation rate of "
-                       "progress: [ {:.2%} ]".format(
-                           i / (num_batch_every_epoch - 1)))
+          if data_size < end_id:
+            act_end_id = self.batch_size - end_id + data_size
+            for key in ("logits", "preds", "y_ground_truth"):
+              if key in batch:
+                batch[key] = batch[key][:act_end_id]
 
-      y_logits = np.concatenate(y_logits, axis=0)
-      y_preds = np.concatenate(y_preds, axis=0)
+          if self.do_eval:
+            labels.update(batch["y_ground_truth"], batch["preds"])
+            total_loss += batch["loss"]
+
+          if stream:
+            postproc.update({
+                "logits": batch["logits"],
+                "preds": batch["preds"]
+            })
+          elif mode == utils.INFER:
+            y_logits.append(batch["logits"])
+            y_preds.append(batch["preds"])
+
+          if i % 10 == 0 or i == num_batch_every_epoch - 1:
+            logging.info("Evaluation rate of "
+                         "progress: [ {:.2%} ]".format(
+                             i / (num_batch_every_epoch - 1)))
+      finally:
+        # finish the written predictions even if interrupted
+        if stream:
+          postproc.end()
+
+      metcs = None
       if self.do_eval:
-        y_ground_truth = np.concatenate(y_ground_truth, axis=0)
-
-        metcs = metrics.get_metrics(
-            config=self.config, y_pred=y_preds, y_true=y_ground_truth)
+        metcs = labels.get_metrics(self.config)
+        metcs['loss'] = total_loss / num_batch_every_epoch
         logging.info("Evaluation on %s:" % mode)
         # add sort function to make sequence of metrics identical.
         for key in sorted(metcs.keys()):
           logging.info(key + ":" + str(metcs[key]))
-      if mode == utils.INFER:
-        predictions = {"logits": y_logits, "preds": y_preds}
-        self.postproc_fn()(predictions, log_verbose=False)
+      if not stream and mode == utils.INFER:
+        predictions = {
+            "logits": np.concatenate(y_logits, axis=0),
+            "preds": np.concatenate(y_preds, axis=0)
+        }
+        postproc(predictions, log_verbose=False)
+      return metcs
 
   def export_model(self):
     """Export a model to tensorflow SavedModel."""
@@ -311,16 +335,21 @@ class RawSolver(Solver):
         # Training loop. For each batch...
         data_size = self.config['data']['train_data_size']
         num_epochs = self.config["data"]["task"]['epochs']
-        num_batch = int(math.ceil(data_size * num_epochs / self.batch_size))
-        num_batch_per_epoch = int(data_size / self.batch_size)
-
-        for i in range(num_batch):
-          _, _, out_loss = sess.run([train_op, global_step, train_model.loss])
-          if i % self.print_every == 0 or i == num_batch - 1:
+        total_examples = data_size * num_epochs
+
+        i, num_examples = 0, 0
+        while num_examples < total_examples:
+          _, _, out_loss, batch_examples = sess.run([
+              train_op, global_step, train_model.loss,
+              train_model.batch_examples
+          ])
+          num_examples += batch_examples
+          if i % self.print_every == 0 or num_examples >= total_examples:
             logging.info(
                 "Training for epoch {}: [ {:.2%} ] loss is {:g}".format(
-                    int(i / num_batch_per_epoch),
-                    (i % num_batch_per_epoch) / num_batch_per_epoch, out_loss))
+                    num_examples // data_size,
+                    (num_examples % data_size) / data_size, out_loss))
+          i += 1
 
   def train_and_eval(self):  # pylint: disable=too-many-locals
     """Train and evaluate the model."""
@@ -329,9 +358,11 @@ class RawSolver(Solver):
     with g_train.as_default():
       logging.info("Compiling train model ...")
       train_model = self.build(utils.TRAIN)
-    # eval related
+    # eval related, in background on `device` with async eval
+    async_conf = self.config['solver']['saver'].get('async_eval') or {}
+    async_eval = async_conf.get('enable', False)
     g_eval = tf.Graph()
-    with g_eval.as_default():
+    with g_eval.as_default(), tf.device(async_conf.get('device')):
       logging.info("Compiling eval model ...")
       eval_model = self.build(utils.EVAL)
       eval_model.sess = tf.Session(config=self.session_conf, graph=g_eval)
@@ -353,6 +384,17 @@ class RawSolver(Solver):
         scaffold = self.get_scaffold(global_step,
                                      train_model.iterator.initializer)
 
+        evaluator = None
+        if async_eval:
+          evaluator = CheckpointEvaluator(
+              lambda model_path: self.eval_or_infer_core(
+                  eval_model, utils.EVAL, model_path=model_path),
+              checkpoint_dir,
+              poll_secs=async_conf.get('poll_secs', 10),
+              best_metric=async_conf.get('best_metric', 'loss'),
+              best_mode=async_conf.get('best_mode', 'min'))
+          evaluator.start()
+
         with tf.train.MonitoredTrainingSession(
             checkpoint_dir=checkpoint_dir,
             scaffold=scaffold,
@@ -361,22 +403,35 @@ class RawSolver(Solver):
 
           # Training loop. For each batch...
           train_data_size = self.config['data']['train_data_size']
-          num_batch = int(train_data_size * self.num_epochs / self.batch_size)
-          num_batch_per_epoch = int(train_data_size / self.batch_size)
-          logging.info("Total data size: {}, batch num: {}, "
-                       "batch num per epoch: {}".format(train_data_size,
-                                                        num_batch,
-                                                        num_batch_per_epoch))
-          for i in range(0, num_batch):
-            if i % self.save_checkpoint_steps == 0 and i != 0:
+          # the last batch is dropped as before, with fixed batch size
+          total_examples = (
+              train_data_size * self.num_epochs // self.batch_size *
+              self.batch_size)
+          logging.info("Total data size: {}, examples to train: {}, "
+                       "batch size: {}".format(train_data_size,
+                                               total_examples,
+                                               self.batch_size))
+          i, num_examples = 0, 0
+          while num_examples < total_examples:
+            if not async_eval and i % self.save_checkpoint_steps == 0 and \
+                i != 0:
               self.eval_or_infer_core(eval_model, utils.EVAL)
-            _, _, out_loss = sess.run([train_op, global_step, train_model.loss])
-            if i % 10 == 0 or i == num_batch - 1 or (
-                i +
-                1) % num_batch_per_epoch == 0 or i % num_batch_per_epoch == 0:
+            epoch = num_examples // train_data_size
+            _, _, out_loss, batch_examples = sess.run([
+                train_op, global_step, train_model.loss,
+                train_model.batch_examples
+            ])
+            num_examples += batch_examples
+            if i % 10 == 0 or num_examples >= total_examples or \
+                num_examples // train_data_size != epoch:
               logging.info(
                   "Training for epoch {}: [ {:.2%} ] loss is {:g}".format(
-                      int(i / num_batch_per_epoch),
-                      (i % num_batch_per_epoch) / num_batch_per_epoch,
+                      num_examples // train_data_size,
+                      (num_examples % train_data_size) / train_data_size,
                       out_loss))
+            i += 1
+
+        # the last checkpoint is saved when the session closes
+        if evaluator is not None:
+          evaluator.stop()
     eval_model.sess.close()
@@ -18,6 +18,7 @@
 import os
 import tensorflow as tf
 from absl import logging
+from tensorflow.core.protobuf import rewriter_config_pb2
 
 
 def get_checkpoint_dir(config):
@@ -43,6 +44,21 @@ def get_session_conf(config):
       intra_op_parallelism_threads=tfconf['intra_op_parallelism_threads'],
       inter_op_parallelism_threads=tfconf['inter_op_parallelism_threads'],
       gpu_options=tf.GPUOptions(allow_growth=tfconf['allow_growth']))
+
+  # XLA JIT compilation of the graph
+  if tfconf.get('xla', False):
+    logging.info('XLA JIT compilation enabled')
+    session_conf.graph_options.optimizer_options.global_jit_level = (
+        tf.OptimizerOptions.ON_1)
+
+  # float16 graph rewrite, with loss scaling by `loss_scale_optimizer`
+  if tfconf.get('mixed_precision', False):
+    rewrite_options = session_conf.graph_options.rewrite_options
+    if not hasattr(rewrite_options, 'auto_mixed_precision'):
+      raise ValueError('mixed_precision needs tensorflow >= 1.14')
+    logging.info('automatic mixed precision enabled')
+    rewrite_options.auto_mixed_precision = (
+        rewriter_config_pb2.RewriterConfig.ON)
   return session_conf
 
 
@@ -0,0 +1,59 @@
+# Copyright (C) 2017 Beijing Didi Infinity Technology and Development Co.,Ltd.
+# All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Test for solver utilities."""
+
+import tensorflow as tf
+from tensorflow.core.protobuf import rewriter_config_pb2
+
+from delta.utils.solver.solver_utils import get_session_conf
+
+# pylint: disable=missing-docstring
+
+
+class SolverUtilsTest(tf.test.TestCase):
+
+  def config(self, **kwargs):
+    run_config = {
+        'allow_soft_placement': True,
+        'log_device_placement': False,
+        'intra_op_parallelism_threads': 10,
+        'inter_op_parallelism_threads': 10,
+        'allow_growth': True,
+    }
+    run_config.update(kwargs)
+    return {'solver': {'run_config': run_config}}
+
+  def test_session_conf(self):
+    session_conf = get_session_conf(self.config())
+    self.assertTrue(session_conf.gpu_options.allow_growth)
+    graph_options = session_conf.graph_options
+    self.assertEqual(graph_options.optimizer_options.global_jit_level,
+                     tf.OptimizerOptions.DEFAULT)
+    self.assertEqual(graph_options.rewrite_options.auto_mixed_precision,
+                     rewriter_config_pb2.RewriterConfig.DEFAULT)
+
+  def test_xla_mixed_precision(self):
+    session_conf = get_session_conf(
+        self.config(xla=True, mixed_precision=True))
+    graph_options = session_conf.graph_options
+    self.assertEqual(graph_options.optimizer_options.global_jit_level,
+                     tf.OptimizerOptions.ON_1)
+    self.assertEqual(graph_options.rewrite_options.auto_mixed_precision,
+                     rewriter_config_pb2.RewriterConfig.ON)
+
+
+if __name__ == '__main__':
+  tf.test.main()